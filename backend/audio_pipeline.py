@@ -0,0 +1,177 @@
+"""
+Audio decode/encode helpers for V-Tool API.
+The audio pipeline downloads the native bestaudio stream (opus/m4a), decodes
+it once with ffmpeg into float32 PCM, and feeds that buffer to the
+user-facing MP3 encode, the stem fingerprint and the separation worker - no
+intermediate MP3 generation, no repeated decodes.
+
+The PCM lives in a memory-mapped file in PCM_DIR rather than in /dev/shm:
+at 44.1 kHz stereo float32 a track takes ~353 KB per second, which would
+exhaust Docker's default 64 MB /dev/shm within minutes of audio. The page
+cache keeps it just as fast to share, and it can spill to disk.
+"""
+
+import mmap
+import os
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from config import PCM_DIR
+
+
+# Format Demucs models expect (htdemucs: 44.1 kHz stereo)
+PCM_SAMPLE_RATE = 44100
+PCM_CHANNELS = 2
+_BYTES_PER_SAMPLE = 4  # float32
+
+_READ_CHUNK = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SharedAudio:
+    """Picklable description of decoded PCM in a memory-mapped file."""
+    pcm_path: str
+    frames: int
+    channels: int = PCM_CHANNELS
+    sample_rate: int = PCM_SAMPLE_RATE
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames * self.channels * _BYTES_PER_SAMPLE
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+
+class DecodedAudio:
+    """Owner of a decoded track's PCM file and its mapping (deleted on close)."""
+
+    def __init__(self, mapping: mmap.mmap, spec: SharedAudio):
+        self._mapping = mapping
+        self.spec = spec
+
+    @property
+    def pcm(self) -> memoryview:
+        """Interleaved float32 little-endian samples."""
+        return memoryview(self._mapping)[:self.spec.nbytes]
+
+    def close(self):
+        try:
+            os.unlink(self.spec.pcm_path)
+        except FileNotFoundError:
+            pass
+        try:
+            self._mapping.close()
+        except BufferError:
+            # A view handed to a thread is still alive; the mapping goes with it
+            pass
+
+    def __enter__(self) -> "DecodedAudio":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def decode_audio(
+    path: str,
+    expected_seconds: Optional[float] = None,
+    sample_rate: int = PCM_SAMPLE_RATE,
+    channels: int = PCM_CHANNELS
+) -> DecodedAudio:
+    """
+    Decode the first audio stream of a file into a memory-mapped PCM file.
+
+    Args:
+        path: Media file (any container/codec ffmpeg reads)
+        expected_seconds: Duration hint used to size the segment up front
+        sample_rate: Output sample rate
+        channels: Output channel count
+
+    Raises:
+        Exception: If ffmpeg fails
+    """
+    frame_bytes = channels * _BYTES_PER_SAMPLE
+    capacity = int(((expected_seconds or 300) + 5) * sample_rate) * frame_bytes
+    fd, pcm_path = tempfile.mkstemp(suffix=".f32", dir=PCM_DIR)
+    # Sparse until written: disk is only used for decoded samples
+    os.ftruncate(fd, capacity)
+    mapping = mmap.mmap(fd, capacity)
+    process = subprocess.Popen(
+        [
+            "ffmpeg", "-v", "error", "-i", path,
+            "-map", "0:a:0",
+            "-ac", str(channels),
+            "-ar", str(sample_rate),
+            "-f", "f32le", "-"
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    written = 0
+    try:
+        while True:
+            if written == capacity:
+                # Duration hint was short - grow the file (no copy needed)
+                mapping.close()
+                capacity *= 2
+                os.ftruncate(fd, capacity)
+                mapping = mmap.mmap(fd, capacity)
+            with memoryview(mapping) as view, view[written:written + _READ_CHUNK] as target:
+                count = process.stdout.readinto(target)
+            if not count:
+                break
+            written += count
+        stderr = process.stderr.read()
+        if process.wait() != 0 or written < frame_bytes:
+            raise Exception(f"Audio decode failed: {stderr.decode(errors='replace')[-500:]}")
+    except BaseException:
+        process.kill()
+        mapping.close()
+        os.unlink(pcm_path)
+        raise
+    finally:
+        # The mapping keeps the file open
+        os.close(fd)
+
+    spec = SharedAudio(pcm_path, written // frame_bytes, channels, sample_rate)
+    return DecodedAudio(mapping, spec)
+
+
+def purge_stale_pcm(max_age_seconds: int) -> int:
+    """Delete PCM files left behind by a crashed process. Returns how many."""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(PCM_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def encode_mp3(pcm, path: str, bitrate: int, sample_rate: int = PCM_SAMPLE_RATE, channels: int = PCM_CHANNELS):
+    """
+    Encode interleaved float32 PCM (any bytes-like object) to an MP3 file.
+    Runs ffmpeg in its own process, so several encodes run in parallel
+    from threads.
+    """
+    result = subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+            "-codec:a", "libmp3lame", "-b:a", f"{bitrate}k",
+            path
+        ],
+        input=pcm,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        raise Exception(f"MP3 encode failed: {result.stderr.decode(errors='replace')[-500:]}")
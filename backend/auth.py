@@ -2,14 +2,32 @@
 Authentication module for V-Tool API.
 Provides optional JWT validation using Supabase.
 Anonymous users are allowed but get stricter rate limits.
+
+Tokens are verified locally (SUPABASE_JWT_SECRET for HS256, or the
+project's cached JWKS for asymmetric keys) and validated tokens are cached
+until they expire, so the request path makes no network call. The remote
+/auth/v1/user endpoint is only used as a fallback when local verification
+is not possible, and in the background to refresh the premium flag.
 """
 
-from typing import Optional
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
 from fastapi import Request, HTTPException
 from dataclasses import dataclass
 import jwt
 import httpx
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+from config import (
+    SUPABASE_URL,
+    SUPABASE_SERVICE_KEY,
+    SUPABASE_JWT_SECRET,
+    SUPABASE_JWT_AUDIENCE,
+    AUTH_TOKEN_CACHE_SIZE,
+    AUTH_JWKS_TTL,
+    AUTH_PREMIUM_REFRESH_SECONDS,
+)
+from http_clients import http_clients
 
 
 @dataclass
@@ -20,6 +38,94 @@ class User:
     is_premium: bool = False
 
 
+class TokenCache:
+    """Bounded LRU of validated tokens; entries drop out at the token's exp."""
+
+    def __init__(self, max_entries: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[User, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: User, expires_at: float):
+        if expires_at <= time.time():
+            return
+        self._entries[token] = (user, expires_at)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class JWKSCache:
+    """Signing keys from {SUPABASE_URL}/auth/v1/.well-known/jwks.json, refreshed after AUTH_JWKS_TTL."""
+
+    # Don't refetch more often than this when an unknown kid shows up
+    MIN_REFRESH_INTERVAL = 60
+
+    def __init__(self, ttl_seconds: int = AUTH_JWKS_TTL):
+        self.ttl_seconds = ttl_seconds
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self):
+        response = await http_clients.get("supabase").get(
+            f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+            headers={"apikey": SUPABASE_SERVICE_KEY}
+        )
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            try:
+                keys[jwk.get("kid", "")] = jwt.PyJWK(jwk)
+            except jwt.PyJWTError as e:
+                print(f"Skipping unusable JWKS key {jwk.get('kid')}: {e}")
+        self._keys = keys
+        self._fetched_at = time.time()
+
+    async def get_key(self, kid: str) -> Optional[jwt.PyJWK]:
+        """Key for a kid, refreshing the set when stale or when the kid is unknown."""
+        age = time.time() - self._fetched_at
+        if age > self.ttl_seconds or (kid not in self._keys and age > self.MIN_REFRESH_INTERVAL):
+            async with self._lock:
+                age = time.time() - self._fetched_at
+                if age > self.ttl_seconds or (kid not in self._keys and age > self.MIN_REFRESH_INTERVAL):
+                    await self._refresh()
+        return self._keys.get(kid)
+
+
+token_cache = TokenCache()
+jwks_cache = JWKSCache()
+
+# user id -> (is_premium or None if the fetch failed, fetched_at) from the remote user endpoint
+_premium_flags: "OrderedDict[str, Tuple[Optional[bool], float]]" = OrderedDict()
+_premium_refreshing: Set[str] = set()
+
+
 async def get_current_user(request: Request) -> Optional[User]:
     """
     Extract and validate user from Authorization header.
@@ -44,15 +150,37 @@ async def get_current_user(request: Request) -> Optional[User]:
     if not token:
         return None
     
+    user = token_cache.get(token)
+    if user:
+        return _with_premium_flag(user, token)
+    
+    try:
+        claims = await verify_token_locally(token)
+        if claims is not None:
+            user = _user_from_claims(claims)
+            token_cache.put(token, user, claims["exp"])
+            return _with_premium_flag(user, token)
+    except jwt.PyJWTError as e:
+        # Invalid signature, expired, wrong audience... - no point asking Supabase
+        print(f"Auth validation error: {e}")
+        return None
+    except Exception as e:
+        print(f"Local token verification unavailable: {e}")
+    
     try:
-        # Validate token with Supabase
+        # Fall back to validating the token with Supabase
         user_data = await validate_supabase_token(token)
         if user_data:
-            return User(
+            user = User(
                 id=user_data.get("id", user_data.get("sub", "")),
                 email=user_data.get("email"),
                 is_premium=user_data.get("is_premium", False)
             )
+            _set_premium_flag(user.id, user.is_premium)
+            expires_at = _unverified_exp(token)
+            if expires_at:
+                token_cache.put(token, user, expires_at)
+            return user
     except Exception as e:
         print(f"Auth validation error: {e}")
         # Don't fail - allow as anonymous
@@ -61,9 +189,112 @@ async def get_current_user(request: Request) -> Optional[User]:
     return None
 
 
+async def verify_token_locally(token: str) -> Optional[dict]:
+    """
+    Verify a Supabase JWT without calling Supabase.
+    
+    Args:
+        token: JWT token from client
+        
+    Returns:
+        Verified claims, or None if no local key is available for the token's
+        algorithm (caller should fall back to remote validation)
+        
+    Raises:
+        jwt.PyJWTError: If the token is invalid or expired
+    """
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg", "")
+    
+    if algorithm == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key = SUPABASE_JWT_SECRET
+    elif algorithm in ("RS256", "ES256", "EdDSA") and SUPABASE_URL:
+        key = await jwks_cache.get_key(header.get("kid", ""))
+        if key is None:
+            return None
+    else:
+        return None
+    
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=SUPABASE_JWT_AUDIENCE or None,
+        options={"require": ["exp", "sub"], "verify_aud": bool(SUPABASE_JWT_AUDIENCE)}
+    )
+
+
+def _user_from_claims(claims: dict) -> User:
+    """Build a User from verified JWT claims (premium flag from user/app metadata)."""
+    user_metadata = claims.get("user_metadata") or {}
+    app_metadata = claims.get("app_metadata") or {}
+    return User(
+        id=claims["sub"],
+        email=claims.get("email"),
+        is_premium=bool(app_metadata.get("is_premium", user_metadata.get("is_premium", False)))
+    )
+
+
+def _unverified_exp(token: str) -> Optional[float]:
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        return float(exp) if exp else None
+    except jwt.PyJWTError:
+        return None
+
+
+def _with_premium_flag(user: User, token: str) -> User:
+    """
+    Apply the last remotely fetched premium flag and schedule a background
+    refresh when it is older than AUTH_PREMIUM_REFRESH_SECONDS (claims only
+    change when the client refreshes its token).
+    """
+    flag = _premium_flags.get(user.id)
+    if flag is None or time.time() - flag[1] > AUTH_PREMIUM_REFRESH_SECONDS:
+        if user.id not in _premium_refreshing and SUPABASE_URL and SUPABASE_SERVICE_KEY:
+            _premium_refreshing.add(user.id)
+            asyncio.create_task(_refresh_premium_flag(user.id, token))
+    if flag is None or flag[0] is None or flag[0] == user.is_premium:
+        return user
+    return User(id=user.id, email=user.email, is_premium=flag[0])
+
+
+def _set_premium_flag(user_id: str, is_premium: Optional[bool]):
+    _premium_flags[user_id] = (is_premium, time.time())
+    _premium_flags.move_to_end(user_id)
+    while len(_premium_flags) > AUTH_TOKEN_CACHE_SIZE:
+        _premium_flags.popitem(last=False)
+
+
+async def _refresh_premium_flag(user_id: str, token: str):
+    is_premium = None
+    try:
+        user_data = await validate_supabase_token(token)
+        if user_data:
+            is_premium = user_data.get("is_premium", False)
+    finally:
+        # A failed fetch is recorded too, so it is retried after the refresh interval
+        previous = _premium_flags.get(user_id)
+        if is_premium is None and previous is not None:
+            is_premium = previous[0]
+        _set_premium_flag(user_id, is_premium)
+        _premium_refreshing.discard(user_id)
+
+
+def get_auth_stats() -> dict:
+    """Token cache counters for health/debug endpoints."""
+    return {
+        "local_verification": bool(SUPABASE_JWT_SECRET) or bool(jwks_cache._keys),
+        "token_cache": token_cache.get_stats(),
+        "premium_flags": len(_premium_flags),
+    }
+
+
 async def validate_supabase_token(token: str) -> Optional[dict]:
     """
-    Validate a Supabase JWT token.
+    Validate a Supabase JWT token remotely.
     
     Args:
         token: JWT token from client
@@ -76,29 +307,28 @@ async def validate_supabase_token(token: str) -> Optional[dict]:
         return None
     
     try:
-        # Call Supabase to validate the token
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{SUPABASE_URL}/auth/v1/user",
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "apikey": SUPABASE_SERVICE_KEY
-                },
-                timeout=5.0
-            )
+        # Call Supabase to validate the token (pooled keep-alive client)
+        client = http_clients.get("supabase")
+        response = await client.get(
+            f"{SUPABASE_URL}/auth/v1/user",
+            headers={
+                "Authorization": f"Bearer {token}",
+                "apikey": SUPABASE_SERVICE_KEY
+            }
+        )
+        
+        if response.status_code == 200:
+            user_data = response.json()
+            
+            # Check if user has premium subscription
+            # This could be extended to check user_metadata or a subscriptions table
+            is_premium = user_data.get("user_metadata", {}).get("is_premium", False)
             
-            if response.status_code == 200:
-                user_data = response.json()
-                
-                # Check if user has premium subscription
-                # This could be extended to check user_metadata or a subscriptions table
-                is_premium = user_data.get("user_metadata", {}).get("is_premium", False)
-                
-                return {
-                    "id": user_data.get("id"),
-                    "email": user_data.get("email"),
-                    "is_premium": is_premium
-                }
+            return {
+                "id": user_data.get("id"),
+                "email": user_data.get("email"),
+                "is_premium": is_premium
+            }
     except httpx.RequestError as e:
         print(f"Supabase request error: {e}")
     except Exception as e:
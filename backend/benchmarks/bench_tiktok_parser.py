@@ -0,0 +1,141 @@
+"""
+Micro-benchmark for the TikTok slideshow page parser.
+
+Compares tiktok_parser.parse_slideshow_page with the regex scan it replaced,
+over saved HTML fixtures in benchmarks/fixtures/ (see README there) plus a
+generated page of realistic size, and checks that the parser output
+matches each fixture's expected-output sidecar.
+
+Usage (from backend/):
+    python benchmarks/bench_tiktok_parser.py [fixtures_dir] [-n ITERATIONS]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tiktok_parser import parse_slideshow_page  # noqa: E402
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def legacy_regex_parse(html: str) -> list:
+    """The whole-document regex scan previously used in process_slideshow."""
+    images = []
+    image_section = re.search(r'"imagePost":\s*\{"images":\s*\[(.*?)\]\s*,', html, re.DOTALL)
+    if image_section:
+        for encoded_url in re.findall(r'\{"imageURL":\s*\{"urlList":\s*\["([^"]+)"', image_section.group(1)):
+            decoded_url = encoded_url.replace('\\u002F', '/').replace('\\/', '/')
+            if decoded_url and 'tiktokcdn' in decoded_url:
+                images.append(decoded_url)
+    return list(dict.fromkeys(images))
+
+
+def synthetic_page(image_count: int = 12, padding_kb: int = 400) -> str:
+    """A photo-post page shaped like TikTok's, padded to a realistic size."""
+    images = [
+        {
+            "imageURL": {"urlList": [
+                f"https://p16-sign-va.tiktokcdn.com/obj/photo-{i}.jpeg?x-expires=1",
+                f"https://p19-sign-va.tiktokcdn.com/obj/photo-{i}.webp?x-expires=1",
+            ]},
+            "imageWidth": 1080,
+            "imageHeight": 1440,
+        }
+        for i in range(image_count)
+    ]
+    state = {
+        "__DEFAULT_SCOPE__": {
+            "webapp.app-context": {"filler": "x" * (padding_kb * 512)},
+            "webapp.video-detail": {"itemInfo": {"itemStruct": {
+                "id": "7300000000000000000",
+                "imagePost": {"images": images, "title": "demo"},
+                "music": {"playUrl": "https://sf16-ies-music-va.tiktokcdn.com/obj/music.mp3"},
+            }}},
+        }
+    }
+    # TikTok escapes "/" as \u002F inside the JSON block
+    payload = json.dumps(state).replace("/", "\\u002F")
+    head = "<html><head>" + "<meta name='x' content='" + "y" * (padding_kb * 512) + "'>"
+    return (
+        f'{head}</head><body><script id="__UNIVERSAL_DATA_FOR_REHYDRATION__" '
+        f'type="application/json">{payload}</script></body></html>'
+    )
+
+
+def page_output(html: str) -> dict:
+    """Parser result in the shape of the fixture sidecars."""
+    page = parse_slideshow_page(html)
+    if page is None:
+        return {"item_id": None, "images": [], "audio_url": None}
+    return {"item_id": page.item_id, "images": page.image_urls, "audio_url": page.audio_url}
+
+
+def load_fixtures(directory: str) -> list:
+    synthetic = {
+        "item_id": "7300000000000000000",
+        "images": [f"https://p16-sign-va.tiktokcdn.com/obj/photo-{i}.jpeg?x-expires=1" for i in range(12)],
+        "audio_url": "https://sf16-ies-music-va.tiktokcdn.com/obj/music.mp3",
+    }
+    fixtures = [("synthetic", synthetic_page(), synthetic)]
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        expected = None
+        sidecar = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(sidecar):
+            with open(sidecar) as f:
+                expected = json.load(f)
+        fixtures.append((os.path.basename(path), html, expected))
+    return fixtures
+
+
+def bench(fn, html: str, iterations: int) -> float:
+    """Median milliseconds per call."""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(html)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures_dir", nargs="?", default=FIXTURES_DIR)
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'fixture':<32} {'size KB':>8} {'parser ms':>10} {'regex ms':>10} {'images':>7} {'regex':>6} {'audio':>6}  check")
+    for name, html, expected in load_fixtures(args.fixtures_dir):
+        output = page_output(html)
+        found = len(output["images"])
+        has_audio = bool(output["audio_url"])
+
+        check = "-"
+        if expected is not None:
+            ok = output == expected
+            check = "ok" if ok else "FAIL"
+            failures += not ok
+
+        print(
+            f"{name:<32} {len(html) / 1024:>8.0f} "
+            f"{bench(parse_slideshow_page, html, args.iterations):>10.2f} "
+            f"{bench(legacy_regex_parse, html, args.iterations):>10.2f} "
+            f"{found:>7} {len(legacy_regex_parse(html)):>6} {str(has_audio):>6}  {check}"
+        )
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
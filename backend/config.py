@@ -6,9 +6,17 @@ load_dotenv()
 # Supabase Configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", "")
+# Project JWT secret (HS256). Without it, asymmetric tokens are verified via JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
 
 # OpenAI Configuration (for AI Summary)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# Any OpenAI-compatible endpoint (e.g. a local stub server); empty = api.openai.com
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "1000"))
 
 # Server Configuration
 HOST = os.getenv("HOST", "0.0.0.0")
@@ -18,6 +26,22 @@ PORT = int(os.getenv("PORT", "8000"))
 DOWNLOAD_DIR = os.path.join(os.path.dirname(__file__), "downloads")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
+# Persistent state (SQLite databases)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(__file__), "data"))
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Decoded PCM of tracks being processed (memory-mapped, see audio_pipeline)
+PCM_DIR = os.getenv("PCM_DIR", os.path.join(DATA_DIR, "pcm"))
+os.makedirs(PCM_DIR, exist_ok=True)
+
+# Content-addressed store of finished downloads (task files hardlink into it)
+DOWNLOAD_STORE_DIR = os.path.join(DOWNLOAD_DIR, "store")
+os.makedirs(DOWNLOAD_STORE_DIR, exist_ok=True)
+
+# Separated stems keyed by audio content fingerprint (task files hardlink into it)
+STEM_CACHE_DIR = os.path.join(DOWNLOAD_DIR, "stems")
+os.makedirs(STEM_CACHE_DIR, exist_ok=True)
+
 # CORS Origins - add production domain from environment
 CORS_ORIGINS = [
     "http://localhost:3000",
@@ -34,3 +58,141 @@ if PRODUCTION_DOMAIN:
         f"http://{PRODUCTION_DOMAIN}",
     ])
 
+
+# Video info cache (yt-dlp extraction results)
+# Media URLs inside info dicts expire (YouTube ~6h, TikTok CDN much sooner),
+# so per-platform TTLs stay well below that.
+VIDEO_INFO_CACHE_MAX_ENTRIES = int(os.getenv("VIDEO_INFO_CACHE_MAX_ENTRIES", "512"))
+VIDEO_INFO_CACHE_DEFAULT_TTL = int(os.getenv("VIDEO_INFO_CACHE_TTL", "600"))
+VIDEO_INFO_CACHE_TTLS = {
+    "youtube": int(os.getenv("VIDEO_INFO_CACHE_TTL_YOUTUBE", "1800")),
+    "tiktok": int(os.getenv("VIDEO_INFO_CACHE_TTL_TIKTOK", "300")),
+    "instagram": int(os.getenv("VIDEO_INFO_CACHE_TTL_INSTAGRAM", "300")),
+    "facebook": int(os.getenv("VIDEO_INFO_CACHE_TTL_FACEBOOK", "300")),
+}
+
+# Blocking work pool (yt-dlp extraction/download runs off the event loop)
+# Per task type limits; the pool size defaults to their sum.
+TASK_CONCURRENCY_LIMITS = {
+    "download": int(os.getenv("DOWNLOAD_CONCURRENCY", "4")),
+    "summary": int(os.getenv("SUMMARY_CONCURRENCY", "8")),
+    "spy": int(os.getenv("SPY_CONCURRENCY", "8")),
+    "slideshow": int(os.getenv("SLIDESHOW_CONCURRENCY", "4")),
+    "audio": int(os.getenv("AUDIO_CONCURRENCY", "2")),
+}
+WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", str(sum(TASK_CONCURRENCY_LIMITS.values()))))
+
+# Task scheduler: concurrent tasks per resource class (see scheduler.TASK_CLASSES)
+# and weighted fair queuing weights of the user tiers within a class
+SCHEDULER_CLASS_SLOTS = {
+    "lookup": int(os.getenv("SCHEDULER_LOOKUP_SLOTS", "8")),
+    "network": int(os.getenv("SCHEDULER_NETWORK_SLOTS", "4")),
+    "cpu": int(os.getenv("SCHEDULER_CPU_SLOTS", "2")),
+}
+SCHEDULER_TIER_WEIGHTS = {
+    "premium": float(os.getenv("SCHEDULER_PREMIUM_WEIGHT", "4")),
+    "authenticated": float(os.getenv("SCHEDULER_AUTHENTICATED_WEIGHT", "2")),
+    "anonymous": float(os.getenv("SCHEDULER_ANONYMOUS_WEIGHT", "1")),
+}
+
+# Batch spy endpoint: URLs per request and extractions in flight per batch
+SPY_BATCH_MAX_URLS = int(os.getenv("SPY_BATCH_MAX_URLS", "50"))
+SPY_BATCH_CONCURRENCY = int(os.getenv("SPY_BATCH_CONCURRENCY", "4"))
+
+# Task progress push channel (SSE)
+PROGRESS_MAX_EVENTS_PER_SECOND = float(os.getenv("PROGRESS_MAX_EVENTS_PER_SECOND", "4"))
+PROGRESS_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+# Minimum seconds between progress writes from yt-dlp/demucs hooks
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "0.25"))
+
+# Task store: "sqlite" (shared across processes) or "memory"
+TASK_STORE = os.getenv("TASK_STORE", "sqlite")
+TASK_STORE_PATH = os.getenv("TASK_STORE_PATH", os.path.join(DATA_DIR, "tasks.db"))
+# Finished tasks are kept this long; unfinished ones expire after TASK_MAX_AGE_SECONDS
+TASK_TTL_SECONDS = int(os.getenv("TASK_TTL_SECONDS", "86400"))
+TASK_MAX_AGE_SECONDS = int(os.getenv("TASK_MAX_AGE_SECONDS", "172800"))
+TASK_PURGE_INTERVAL = int(os.getenv("TASK_PURGE_INTERVAL", "300"))
+
+# Task execution: "inline" (background tasks in the API process) or "queue"
+# (API enqueues, `python worker.py` processes run the jobs)
+TASK_EXECUTION = os.getenv("TASK_EXECUTION", "inline")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.db"))
+# A job whose lease isn't renewed for this long is handed to another worker
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "120"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "10"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# Jobs a worker holds at once; the scheduler runs them within its class slots
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "8"))
+# How often SSE streams re-read tasks updated by queue workers (other processes)
+PROGRESS_POLL_SECONDS = float(os.getenv("PROGRESS_POLL_SECONDS", "1"))
+
+# Rate limiter counters: "sqlite" (shared by the workers on a host),
+# "redis" (shared by every host) or "memory" (per process, development only)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", os.path.join(DATA_DIR, "ratelimit.db"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Cost budgets (free tier; premium gets PREMIUM_MULTIPLIER x)
+PROXY_BYTES_PER_HOUR = int(os.getenv("PROXY_BYTES_PER_HOUR", str(500 * 1024 ** 2)))  # 500 MB
+PROXY_BYTES_PER_DAY = int(os.getenv("PROXY_BYTES_PER_DAY", str(1024 ** 3)))  # 1 GB
+CPU_SECONDS_PER_HOUR = float(os.getenv("CPU_SECONDS_PER_HOUR", "300"))
+CPU_SECONDS_PER_DAY = float(os.getenv("CPU_SECONDS_PER_DAY", "900"))
+# Unfinished tasks a client may have at once (tasks older than
+# ACTIVE_TASK_WINDOW_SECONDS stop counting, e.g. if a crash orphaned them)
+MAX_ACTIVE_TASKS = int(os.getenv("MAX_ACTIVE_TASKS", "2"))
+MAX_ACTIVE_TASKS_PREMIUM = int(os.getenv("MAX_ACTIVE_TASKS_PREMIUM", "6"))
+ACTIVE_TASK_WINDOW_SECONDS = int(os.getenv("ACTIVE_TASK_WINDOW_SECONDS", "3600"))
+
+# Download directory index and janitor
+FILE_INDEX_PATH = os.getenv("FILE_INDEX_PATH", os.path.join(DATA_DIR, "files.db"))
+DOWNLOAD_QUOTA_BYTES = int(os.getenv("DOWNLOAD_QUOTA_BYTES", str(20 * 1024 ** 3)))  # 20 GB
+DOWNLOAD_MAX_AGE_SECONDS = int(os.getenv("DOWNLOAD_MAX_AGE_SECONDS", "86400"))
+FILE_EVICTION_GRACE_SECONDS = int(os.getenv("FILE_EVICTION_GRACE_SECONDS", "600"))
+FILE_JANITOR_INTERVAL = int(os.getenv("FILE_JANITOR_INTERVAL", "300"))
+
+# Completed file delivery: "" serves from Python, "nginx" returns
+# X-Accel-Redirect to FILE_OFFLOAD_PREFIX (an internal location aliasing DOWNLOAD_DIR)
+FILE_OFFLOAD = os.getenv("FILE_OFFLOAD", "")
+FILE_OFFLOAD_PREFIX = os.getenv("FILE_OFFLOAD_PREFIX", "/internal/downloads/")
+
+# Download delivery: "file" downloads into DOWNLOAD_DIR, "stream" pipes
+# single-format downloads (no merge) from yt-dlp to the client when fetched
+DOWNLOAD_DELIVERY = os.getenv("DOWNLOAD_DELIVERY", "file")
+# Concurrent yt-dlp pipelines per API process; a request waits this long for one
+STREAM_MAX_CONCURRENCY = int(os.getenv("STREAM_MAX_CONCURRENCY", "16"))
+STREAM_SLOT_TIMEOUT = float(os.getenv("STREAM_SLOT_TIMEOUT", "30"))
+# Every fetch of a streamed download runs it again through the proxy
+STREAM_MAX_PER_TASK = int(os.getenv("STREAM_MAX_PER_TASK", "5"))
+
+# Slideshow image fetching
+SLIDESHOW_FETCH_CONCURRENCY = int(os.getenv("SLIDESHOW_FETCH_CONCURRENCY", "8"))
+SLIDESHOW_IMAGE_TIMEOUT = float(os.getenv("SLIDESHOW_IMAGE_TIMEOUT", "15"))
+SLIDESHOW_IMAGE_RETRIES = int(os.getenv("SLIDESHOW_IMAGE_RETRIES", "2"))
+# "file": write {task_id}_slideshow.zip to DOWNLOAD_DIR
+# "stream": build the ZIP on the fly when it is downloaded (no disk use)
+SLIDESHOW_DELIVERY = os.getenv("SLIDESHOW_DELIVERY", "file")
+
+# Shared HTTP client pools (one per upstream, kept alive for the app lifetime)
+HTTP_POOL_LIMITS = {
+    "supabase": int(os.getenv("HTTP_SUPABASE_MAX_CONNECTIONS", "20")),
+    "tiktok_html": int(os.getenv("HTTP_TIKTOK_HTML_MAX_CONNECTIONS", "10")),
+    "tiktok_cdn": int(os.getenv("HTTP_TIKTOK_CDN_MAX_CONNECTIONS", str(SLIDESHOW_FETCH_CONCURRENCY * 2))),
+    "openai": int(os.getenv("HTTP_OPENAI_MAX_CONNECTIONS", str(SUMMARY_MAX_CONCURRENCY))),
+}
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Auth: validated-token cache and remote premium-flag refresh
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_JWKS_TTL = int(os.getenv("AUTH_JWKS_TTL", "3600"))
+AUTH_PREMIUM_REFRESH_SECONDS = int(os.getenv("AUTH_PREMIUM_REFRESH_SECONDS", "300"))
+
+# Vocal separation: "worker" keeps Demucs loaded in a long-lived process,
+# "cli" runs the demucs command per task
+SEPARATOR_MODE = os.getenv("SEPARATOR_MODE", "worker")
+SEPARATOR_MODEL = os.getenv("SEPARATOR_MODEL", "htdemucs")
+SEPARATOR_THREADS = int(os.getenv("SEPARATOR_THREADS", str(os.cpu_count() or 4)))
+SEPARATOR_MAX_JOBS = int(os.getenv("SEPARATOR_MAX_JOBS", "1"))
+SEPARATOR_JOB_TIMEOUT = int(os.getenv("SEPARATOR_JOB_TIMEOUT", "900"))
+# Disk budget for cached stems (LRU-evicted by the download janitor)
+STEM_CACHE_QUOTA_BYTES = int(os.getenv("STEM_CACHE_QUOTA_BYTES", str(5 * 1024 ** 3)))  # 5 GB
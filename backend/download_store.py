@@ -0,0 +1,219 @@
+"""
+Content-addressed download store for V-Tool API.
+Finished downloads are kept once per (video id, format selection) and task
+files are hardlinks to them, so repeated requests for the same media do not
+go through the proxy again. Identical in-flight downloads are coalesced,
+within a process by the single-flight and across worker processes by a
+lock file per key.
+
+Downloads run in a private temp directory and only the finished file is
+moved into the store, so the store never holds a partial file.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import DOWNLOAD_STORE_DIR
+from singleflight import SingleFlight
+from video_cache import info_key, normalize_url
+
+
+# yt-dlp intermediate files that must never be served from the store
+_PARTIAL_SUFFIXES = {"part", "ytdl", "temp"}
+
+# Store subdirectories for in-progress downloads and per-key locks
+PARTIAL_DIR = ".partial"
+LOCK_DIR = ".locks"
+
+
+def download_key(url: str, options: dict, info: Optional[dict] = None) -> str:
+    """
+    Content key for a download: video identity + format selection.
+
+    Only options that change the produced file take part in the key.
+    """
+    format_type = options.get('format') or 'video'
+    selection = {
+        "video": (info and info_key(info)) or normalize_url(url),
+        "format": format_type,
+        "ytdlp_format": options.get('ytdlp_format') if format_type != 'audio' else None,
+        "audio_bitrate": (options.get('audio_bitrate') or '320') if format_type == 'audio' else None,
+        "native_audio": bool(options.get('native_audio')) if format_type == 'audio' else None,
+    }
+    raw = json.dumps(selection, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class DownloadStore:
+    """Stores one file per content key and links it into task files."""
+
+    def __init__(self, root: str = DOWNLOAD_STORE_DIR):
+        self.root = root
+        self._flight = SingleFlight()
+        self._listeners: Dict[str, List[Callable[[dict], None]]] = defaultdict(list)
+        self._listeners_lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _shard_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2])
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.root, LOCK_DIR, f"{key}.lock")
+
+    @staticmethod
+    def _find_finished(directory: str, key: str) -> Optional[str]:
+        """Path of key.<ext> in directory, skipping fragments and partial files."""
+        if not os.path.isdir(directory):
+            return None
+        prefix = f"{key}."
+        for name in os.listdir(directory):
+            if not name.startswith(prefix):
+                continue
+            ext = name[len(prefix):]
+            # Skip format fragments (key.f137.mp4) and partial downloads
+            if "." in ext or ext in _PARTIAL_SUFFIXES:
+                continue
+            return os.path.join(directory, name)
+        return None
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Path of the finished file for key, or None."""
+        return self._find_finished(self._shard_dir(key), key)
+
+    def _download_locked(self, key: str, download: Callable[[str, list], None]) -> Tuple[str, bool]:
+        """
+        Download key unless another process already did, holding its lock file.
+
+        Returns:
+            Tuple of (path, found) where found is True if the file appeared
+            while waiting for the lock
+        """
+        os.makedirs(os.path.join(self.root, LOCK_DIR), exist_ok=True)
+        with open(self._lock_path(key), "a") as lock_file:
+            # Blocks while another worker process downloads the same key
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                existing = self.lookup(key)
+                if existing:
+                    return existing, True
+
+                partial_root = os.path.join(self.root, PARTIAL_DIR)
+                os.makedirs(partial_root, exist_ok=True)
+                workdir = tempfile.mkdtemp(prefix=f"{key}-", dir=partial_root)
+                try:
+                    download(os.path.join(workdir, f"{key}.%(ext)s"), [self._progress_hook(key)])
+                    finished = self._find_finished(workdir, key)
+                    if not finished:
+                        raise Exception("Downloaded file not found")
+                    os.makedirs(self._shard_dir(key), exist_ok=True)
+                    stored = os.path.join(self._shard_dir(key), os.path.basename(finished))
+                    # Same filesystem, so the file appears in the store complete or not at all
+                    os.replace(finished, stored)
+                    return stored, False
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _progress_hook(self, key: str) -> Callable[[dict], None]:
+        """yt-dlp progress hook forwarding to every caller waiting on key."""
+        def hook(d: dict):
+            with self._listeners_lock:
+                listeners = list(self._listeners.get(key, ()))
+            for listener in listeners:
+                try:
+                    listener(d)
+                except Exception as e:
+                    print(f"Progress listener error: {e}")
+        return hook
+
+    def fetch(
+        self,
+        key: str,
+        download: Callable[[str, list], None],
+        on_progress: Optional[Callable[[dict], None]] = None
+    ) -> Tuple[str, bool]:
+        """
+        Return the stored file for key, downloading it on a miss.
+
+        Args:
+            key: Content key from download_key()
+            download: Callable receiving the yt-dlp output template and a
+                list of yt-dlp progress hooks
+            on_progress: Receives yt-dlp progress dicts while this caller
+                waits, whether it runs the download or joined another one
+
+        Returns:
+            Tuple of (path, cached: bool) where cached is True if no new
+            download was needed for this caller
+        """
+        path = self.lookup(key)
+        if path:
+            self.hits += 1
+            return path, True
+
+        if on_progress:
+            with self._listeners_lock:
+                self._listeners[key].append(on_progress)
+        try:
+            (path, found), shared = self._flight.do(key, lambda: self._download_locked(key, download))
+        finally:
+            if on_progress:
+                with self._listeners_lock:
+                    self._listeners[key].remove(on_progress)
+                    if not self._listeners[key]:
+                        del self._listeners[key]
+        if shared or found:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return path, shared or found
+
+    @staticmethod
+    def link(src: str, dest: str):
+        """Hardlink src to dest, copying if the filesystem can't link."""
+        if os.path.exists(dest):
+            os.remove(dest)
+        try:
+            os.link(src, dest)
+        except OSError:
+            shutil.copyfile(src, dest)
+
+    def purge_stale_partials(self, max_age_seconds: int) -> int:
+        """Delete temp download directories left behind by a crashed process. Returns how many."""
+        partial_root = os.path.join(self.root, PARTIAL_DIR)
+        if not os.path.isdir(partial_root):
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for entry in os.scandir(partial_root):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def get_stats(self) -> dict:
+        """Store counters for health/debug endpoints."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": self._flight.in_flight(),
+        }
+
+
+# Global download store instance
+download_store = DownloadStore()
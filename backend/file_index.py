@@ -0,0 +1,255 @@
+"""
+Download directory index for V-Tool API.
+Tracks every file the pipeline writes (owner, size, last access) so lookups
+and deletes don't scan DOWNLOAD_DIR, and a janitor can enforce a byte quota
+and a maximum age with LRU eviction.
+
+Task files are sharded into DOWNLOAD_DIR/<first two chars of the name>/ so
+no directory grows to hundreds of thousands of entries.
+"""
+
+import os
+import time
+from typing import List, Optional, Tuple
+
+from config import (
+    DOWNLOAD_DIR,
+    FILE_INDEX_PATH,
+    DOWNLOAD_QUOTA_BYTES,
+    DOWNLOAD_MAX_AGE_SECONDS,
+    FILE_EVICTION_GRACE_SECONDS,
+)
+from db import SQLiteDatabase
+
+
+# Only refresh last_access when it is older than this (avoids a write per request)
+_TOUCH_RESOLUTION_SECONDS = 60
+
+
+def _check_filename(filename: str):
+    if not filename or filename != os.path.basename(filename) or filename.startswith("."):
+        raise ValueError(f"Invalid filename: {filename!r}")
+
+
+def task_file_path(filename: str) -> str:
+    """Sharded path for a task file (the shard directory is created)."""
+    _check_filename(filename)
+    shard = os.path.join(DOWNLOAD_DIR, filename[:2])
+    os.makedirs(shard, exist_ok=True)
+    return os.path.join(shard, filename)
+
+
+def find_task_file(filename: str) -> Optional[str]:
+    """Existing path of a task file, or None. Checks the legacy flat layout too."""
+    try:
+        _check_filename(filename)
+    except ValueError:
+        return None
+    for path in (
+        os.path.join(DOWNLOAD_DIR, filename[:2], filename),
+        os.path.join(DOWNLOAD_DIR, filename),
+    ):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER,
+    created_ts REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_owner ON files(owner);
+CREATE INDEX IF NOT EXISTS idx_files_last_access ON files(last_access);
+"""
+
+
+class FileIndex:
+    """SQLite index of files in DOWNLOAD_DIR, keyed by path."""
+
+    def __init__(self, path: str = FILE_INDEX_PATH):
+        self.db = SQLiteDatabase(path, _SQLITE_SCHEMA)
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def register(self, owner: str, path: str):
+        """
+        Record a file written by the pipeline.
+
+        Args:
+            owner: Task id, or "<kind>:<key>" for shared caches (e.g. "store:ab12...")
+            path: Absolute file path
+        """
+        stat = os.stat(path)
+        now = time.time()
+        self.db.execute(
+            "INSERT INTO files (path, owner, size, inode, created_ts, last_access) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET owner = excluded.owner, size = excluded.size, "
+            "inode = excluded.inode, last_access = excluded.last_access",
+            (path, owner, stat.st_size, stat.st_ino, now, now)
+        )
+
+    def touch(self, path: str):
+        """Mark a file as recently used."""
+        now = time.time()
+        self.db.execute(
+            "UPDATE files SET last_access = ? WHERE path = ? AND last_access < ?",
+            (now, path, now - _TOUCH_RESOLUTION_SECONDS)
+        )
+
+    def files_for(self, owner: str) -> List[str]:
+        """Paths registered for an owner."""
+        rows = self.db.execute("SELECT path FROM files WHERE owner = ?", (owner,)).fetchall()
+        return [row["path"] for row in rows]
+
+    def _remove_path(self, path: str) -> int:
+        """Delete a file and its row. Returns bytes actually freed on disk."""
+        freed = 0
+        try:
+            stat = os.stat(path)
+            # Hardlinked files only free space when the last link goes
+            if stat.st_nlink <= 1:
+                freed = stat.st_size
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        return freed
+
+    def remove(self, path: str) -> int:
+        """Delete one indexed file. Returns bytes freed on disk."""
+        return self._remove_path(path)
+
+    def remove_owner(self, owner: str) -> int:
+        """Delete all files of an owner. Returns the number of files removed."""
+        paths = self.files_for(owner)
+        for path in paths:
+            self._remove_path(path)
+        return len(paths)
+
+    def total_bytes(self) -> int:
+        """Bytes used on disk by indexed files (hardlinks counted once)."""
+        row = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM "
+            "(SELECT MAX(size) AS size FROM files GROUP BY COALESCE(inode, path))"
+        ).fetchone()
+        return row[0]
+
+    def evict(
+        self,
+        max_bytes: Optional[int],
+        max_age_seconds: Optional[int],
+        owner_prefix: Optional[str] = None,
+        grace_seconds: int = FILE_EVICTION_GRACE_SECONDS
+    ) -> Tuple[int, int]:
+        """
+        Delete files not accessed within max_age_seconds, then least recently
+        used files until the indexed total is under max_bytes.
+
+        Args:
+            max_bytes: Byte quota (None = no quota)
+            max_age_seconds: Maximum idle time (None = no limit)
+            owner_prefix: Only consider owners starting with this prefix
+            grace_seconds: Never evict files used more recently than this
+
+        Returns:
+            Tuple of (files removed, bytes freed)
+        """
+        now = time.time()
+        owner_clause = "AND owner LIKE ?" if owner_prefix else ""
+        owner_params = (f"{owner_prefix}%",) if owner_prefix else ()
+        removed = freed = 0
+
+        if max_age_seconds:
+            rows = self.db.execute(
+                f"SELECT path FROM files WHERE last_access < ? {owner_clause}",
+                (now - max_age_seconds, *owner_params)
+            ).fetchall()
+            for row in rows:
+                freed += self._remove_path(row["path"])
+                removed += 1
+
+        if max_bytes is not None:
+            total = self._total_for(owner_prefix)
+            if total > max_bytes:
+                rows = self.db.execute(
+                    f"SELECT path, size FROM files WHERE last_access < ? {owner_clause} ORDER BY last_access",
+                    (now - grace_seconds, *owner_params)
+                ).fetchall()
+                for row in rows:
+                    if total <= max_bytes:
+                        break
+                    released = self._remove_path(row["path"])
+                    # A scoped quota counts the owner's rows, even if another
+                    # hardlink keeps the bytes on disk
+                    total -= row["size"] if owner_prefix else released
+                    freed += released
+                    removed += 1
+
+        self.evicted_files += removed
+        self.evicted_bytes += freed
+        return removed, freed
+
+    def _total_for(self, owner_prefix: Optional[str]) -> int:
+        if not owner_prefix:
+            return self.total_bytes()
+        row = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM "
+            "(SELECT MAX(size) AS size FROM files WHERE owner LIKE ? GROUP BY COALESCE(inode, path))",
+            (f"{owner_prefix}%",)
+        ).fetchone()
+        return row[0]
+
+    def index_untracked(self, root: str = DOWNLOAD_DIR) -> int:
+        """
+        Register files on disk that the index doesn't know about (e.g. written
+        before the index existed) so the janitor can reclaim them.
+        Owners are derived from the path: store/ and stems/ files belong to
+        their cache key, "<uuid>..." files to that task.
+        """
+        known = {row["path"] for row in self.db.execute("SELECT path FROM files").fetchall()}
+        added = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            # In-progress downloads and lock files of the store (.partial, .locks)
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if path in known or name.endswith((".part", ".ytdl", ".partial.mp3", ".db", ".db-wal", ".db-shm")):
+                    continue
+                relative = os.path.relpath(path, root)
+                if relative.startswith("store" + os.sep):
+                    owner = f"store:{name.split('.')[0]}"
+                elif relative.startswith("stems" + os.sep):
+                    owner = f"stems:{name.split('_')[0]}"
+                else:
+                    owner = name[:36]
+                try:
+                    self.register(owner, path)
+                    added += 1
+                except FileNotFoundError:
+                    pass
+        return added
+
+    def get_stats(self) -> dict:
+        """Index counters for health/debug endpoints."""
+        row = self.db.execute("SELECT COUNT(*) FROM files").fetchone()
+        return {
+            "files": row[0],
+            "bytes": self.total_bytes(),
+            "quota_bytes": DOWNLOAD_QUOTA_BYTES,
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+# Global file index instance
+file_index = FileIndex()
+
+
+def enforce_download_quota() -> Tuple[int, int]:
+    """Janitor pass over the whole download directory."""
+    return file_index.evict(DOWNLOAD_QUOTA_BYTES, DOWNLOAD_MAX_AGE_SECONDS)
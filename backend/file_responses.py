@@ -0,0 +1,241 @@
+"""
+File responses for V-Tool API.
+Serves completed files with HTTP range support in constant memory: the
+file is read with os.pread in FILE_CHUNK_SIZE pieces (off the event loop)
+and each piece is sent before the next is read, so a 2 GB video costs the
+same as a 2 MB one no matter how many clients are seeking.
+
+Handles single ranges (206), multiple ranges (206 multipart/byteranges),
+If-Range revalidation against the ETag/Last-Modified, and unsatisfiable
+ranges (416 with Content-Range: bytes */size).
+
+With FILE_OFFLOAD=nginx the body isn't sent from Python at all: the
+response only carries X-Accel-Redirect and nginx serves the file itself
+(sendfile, ranges, If-Range) from an internal location.
+"""
+
+import asyncio
+import os
+import secrets
+from email.utils import formatdate
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from config import DOWNLOAD_DIR, FILE_OFFLOAD_PREFIX
+
+
+FILE_CHUNK_SIZE = 256 * 1024
+
+# More ranges than this in one request are ignored (whole file is sent)
+MAX_RANGES = 16
+
+
+def content_disposition(filename: str) -> str:
+    """attachment header value, RFC 5987-encoded if filename isn't plain ASCII."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a Range header into sorted, merged inclusive (start, end) pairs.
+
+    Returns:
+        None if the header should be ignored (malformed, or too many ranges),
+        an empty list if no range is satisfiable, otherwise the ranges
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        start_s, sep, end_s = spec.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if not start_s:
+                # Suffix range: the last N bytes
+                length = int(end_s)
+                if length <= 0 or size == 0:
+                    continue
+                ranges.append((max(0, size - length), size - 1))
+                continue
+            start = int(start_s)
+            end = int(end_s) if end_s else None
+        except ValueError:
+            return None
+        if start < 0 or (end is not None and end < start):
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class RangedFileResponse(Response):
+    """Streams byte ranges of an open file with os.pread; memory use is one chunk. Owns (closes) fd."""
+
+    def __init__(
+        self,
+        fd: int,
+        parts: List[Tuple[bytes, int, int]],
+        trailer: bytes,
+        status_code: int,
+        headers: dict,
+        media_type: Optional[str] = None
+    ):
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.fd = fd
+        self.parts = parts
+        self.trailer = trailer
+
+    @staticmethod
+    async def _wait_for_disconnect(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    async def __call__(self, scope, receive, send):
+        fd = self.fd
+        disconnected = asyncio.ensure_future(self._wait_for_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            for part_header, start, end in self.parts:
+                if part_header:
+                    await send({"type": "http.response.body", "body": part_header, "more_body": True})
+                offset = start
+                while offset <= end:
+                    if disconnected.done():
+                        return
+                    chunk = await asyncio.to_thread(os.pread, fd, min(FILE_CHUNK_SIZE, end - offset + 1), offset)
+                    if not chunk:
+                        # File shrank under us - the declared length can't be met
+                        return
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    offset += len(chunk)
+            await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+        finally:
+            disconnected.cancel()
+            self.fd = None
+            os.close(fd)
+
+    def __del__(self):
+        # Never sent (e.g. the request failed before the response was called)
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def ranged_file_response(
+    path: str,
+    request_headers: Headers,
+    filename: str,
+    media_type: str = "application/octet-stream"
+) -> Response:
+    """
+    Build the response for a GET of path, honoring Range and If-Range.
+
+    Args:
+        path: File to serve
+        request_headers: Incoming request headers
+        filename: Name for Content-Disposition
+        media_type: Content type of the file
+    """
+    # Opened here so a file evicted after the lookup is a FileNotFoundError for
+    # the caller, before any response is started
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return _ranged_fd_response(fd, request_headers, filename, media_type)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+def _ranged_fd_response(fd: int, request_headers: Headers, filename: str, media_type: str) -> Response:
+    stat = os.fstat(fd)
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(filename),
+        "ETag": etag,
+        "Last-Modified": last_modified,
+    }
+
+    ranges = None
+    range_header = request_headers.get("range")
+    if range_header:
+        if_range = request_headers.get("if-range")
+        # A stale If-Range validator means the client's partial copy is outdated: send everything
+        if not if_range or if_range.strip() in (etag, last_modified):
+            ranges = parse_range(range_header, size)
+
+    if ranges == []:
+        os.close(fd)
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"})
+
+    if not ranges:
+        headers["Content-Length"] = str(size)
+        return RangedFileResponse(fd, [(b"", 0, size - 1)], b"", 200, headers, media_type)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return RangedFileResponse(fd, [(b"", start, end)], b"", 206, headers, media_type)
+
+    boundary = secrets.token_hex(16)
+    parts = [
+        (
+            f"\r\n--{boundary}\r\nContent-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n".encode("latin-1"),
+            start,
+            end,
+        )
+        for start, end in ranges
+    ]
+    trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+    headers["Content-Length"] = str(
+        sum(len(part_header) + end - start + 1 for part_header, start, end in parts) + len(trailer)
+    )
+    headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+    return RangedFileResponse(fd, parts, trailer, 206, headers)
+
+
+def accel_redirect_response(
+    path: str,
+    filename: str,
+    media_type: str = "application/octet-stream"
+) -> Response:
+    """
+    Hand the transfer of a DOWNLOAD_DIR file to nginx (FILE_OFFLOAD=nginx).
+    nginx keeps the Content-Type and Content-Disposition set here.
+    """
+    relative = os.path.relpath(path, DOWNLOAD_DIR).replace(os.sep, "/")
+    if relative.startswith("../"):
+        raise ValueError(f"{path} is outside the download directory")
+    return Response(
+        headers={
+            "X-Accel-Redirect": FILE_OFFLOAD_PREFIX + quote(relative),
+            "Content-Disposition": content_disposition(filename),
+        },
+        media_type=media_type
+    )
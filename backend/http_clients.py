@@ -0,0 +1,124 @@
+"""
+Shared HTTP clients for V-Tool API.
+One pooled httpx.AsyncClient per upstream (Supabase, TikTok HTML, TikTok
+CDN, OpenAI), created by the FastAPI lifespan and closed on shutdown, so requests
+reuse keep-alive connections (HTTP/2 when h2 is installed) instead of
+paying DNS/TCP/TLS setup every time. Connection reuse is tracked per pool.
+"""
+
+from dataclasses import dataclass
+from typing import Dict
+
+import httpx
+
+from config import HTTP_POOL_LIMITS, HTTP_KEEPALIVE_EXPIRY, SLIDESHOW_IMAGE_TIMEOUT
+
+
+try:
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+
+TIKTOK_HTML_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Mobile/15E148 Safari/604.1',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+TIKTOK_CDN_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15',
+    'Referer': 'https://www.tiktok.com/'
+}
+
+# Per-pool client settings (limits come from HTTP_POOL_LIMITS)
+_POOL_SETTINGS = {
+    "supabase": {"timeout": 5.0},
+    "tiktok_html": {"timeout": 30.0, "follow_redirects": True, "headers": TIKTOK_HTML_HEADERS},
+    "tiktok_cdn": {"timeout": SLIDESHOW_IMAGE_TIMEOUT, "follow_redirects": True, "headers": TIKTOK_CDN_HEADERS},
+    # Streamed completions can pause between tokens; the SDK sets per-request timeouts
+    "openai": {"timeout": httpx.Timeout(60.0, connect=10.0)},
+}
+
+
+@dataclass
+class PoolStats:
+    """Request/connection counters for one pool."""
+    requests: int = 0
+    new_connections: int = 0
+
+    def as_dict(self) -> dict:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+class HTTPClients:
+    """Registry of named, lazily created AsyncClient pools."""
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, PoolStats] = {name: PoolStats() for name in _POOL_SETTINGS}
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        stats = self._stats.setdefault(name, PoolStats())
+        max_connections = HTTP_POOL_LIMITS.get(name, 20)
+
+        async def trace(event_name: str, info: dict):
+            # httpcore emits this once per newly opened TCP connection
+            if event_name == "connection.connect_tcp.complete":
+                stats.new_connections += 1
+
+        async def on_request(request: httpx.Request):
+            stats.requests += 1
+            request.extensions["trace"] = trace
+
+        return httpx.AsyncClient(
+            http2=HAS_HTTP2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            event_hooks={"request": [on_request]},
+            **_POOL_SETTINGS.get(name, {})
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Pooled client for an upstream ('supabase', 'tiktok_html', 'tiktok_cdn', 'openai').
+        Created on first use, so processes without the API lifespan (scripts,
+        workers) work too.
+        """
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    def start(self):
+        """Open every configured pool (called from the FastAPI lifespan)."""
+        for name in _POOL_SETTINGS:
+            self.get(name)
+
+    async def aclose(self):
+        """Close all pools (called on shutdown)."""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def get_stats(self) -> dict:
+        """Connection reuse per pool."""
+        return {
+            "http2": HAS_HTTP2,
+            "pools": {name: stats.as_dict() for name, stats in self._stats.items()},
+        }
+
+
+# Global HTTP client registry
+http_clients = HTTPClients()
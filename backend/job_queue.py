@@ -0,0 +1,304 @@
+"""
+Job queue for V-Tool API.
+With TASK_EXECUTION=queue the API only records tasks and enqueues them here;
+worker processes (worker.py) claim and run them, so processing scales by
+adding workers instead of API replicas.
+
+The broker is a WAL-mode SQLite database shared through DATA_DIR:
+- claim() leases a job for JOB_VISIBILITY_TIMEOUT seconds
+- the worker heartbeats to extend the lease while the job runs
+- a job whose lease runs out (worker crashed or hung) is claimed again,
+  up to JOB_MAX_ATTEMPTS attempts; attempts that failed with a transient
+  error retry with backoff
+- workers claim by task type (the types of a scheduler class with a free
+  slot); within a class jobs are claimed in weighted fair queuing order
+  between user tiers, like the inline scheduler: enqueue() gives each job
+  a start-time fair tag advancing by expected duration / tier weight, and
+  the class virtual time and per-tier finish tags live in the database so
+  every API process and worker shares them
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import (
+    JOB_QUEUE_PATH,
+    JOB_VISIBILITY_TIMEOUT,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_DELAY,
+    SCHEDULER_TIER_WEIGHTS,
+)
+from db import SQLiteDatabase
+from scheduler import TASK_CLASSES
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_expires REAL,
+    worker_id TEXT,
+    heartbeat_at REAL,
+    created_ts REAL NOT NULL,
+    finished_ts REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs(status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_ts ON jobs(finished_ts);
+CREATE TABLE IF NOT EXISTS fair_clock (
+    resource_class TEXT PRIMARY KEY,
+    virtual_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fair_finish (
+    resource_class TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    finish_tag REAL NOT NULL,
+    PRIMARY KEY (resource_class, tier)
+);
+"""
+
+# Fair queuing order of a job (jobs queued before fair tags sort first)
+_FAIR_TAG_SQL = "json_extract(payload, '$.fair_tag')"
+
+
+@dataclass
+class Job:
+    """A leased job."""
+    id: str
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+class JobQueue:
+    """SQLite-backed job queue with leases, heartbeats and retries."""
+
+    def __init__(
+        self,
+        path: str = JOB_QUEUE_PATH,
+        visibility_timeout: int = JOB_VISIBILITY_TIMEOUT,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        retry_delay: float = JOB_RETRY_DELAY
+    ):
+        self.db = SQLiteDatabase(path, _SCHEMA)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    @staticmethod
+    def _type_filter(task_types: Optional[Sequence[str]]) -> Tuple[str, list]:
+        if task_types is None:
+            return "", []
+        return f" AND json_extract(payload, '$.type') IN ({','.join('?' * len(task_types))})", list(task_types)
+
+    def enqueue(self, job_id: str, payload: dict, max_attempts: Optional[int] = None, cost: float = 1.0) -> float:
+        """
+        Add a job, runnable right away.
+
+        Args:
+            payload: Job data; its "type" and "tier" place it in fair queuing order
+            cost: Expected duration of the job (seconds)
+
+        Returns:
+            The job's fair tag (see backlog())
+        """
+        now = time.time()
+        resource_class = TASK_CLASSES.get(payload.get("type"), "network")
+        tier = payload.get("tier", "anonymous")
+        weight = SCHEDULER_TIER_WEIGHTS.get(tier, 1.0)
+        with self.db.transaction() as conn:
+            # Start-time fair queuing: a tier's tags advance by cost / weight
+            clock = conn.execute(
+                "SELECT virtual_time FROM fair_clock WHERE resource_class = ?", (resource_class,)
+            ).fetchone()
+            finish = conn.execute(
+                "SELECT finish_tag FROM fair_finish WHERE resource_class = ? AND tier = ?", (resource_class, tier)
+            ).fetchone()
+            start = max(clock[0] if clock else 0.0, finish[0] if finish else 0.0)
+            tag = start + cost / weight
+            conn.execute(
+                "INSERT INTO fair_finish (resource_class, tier, finish_tag) VALUES (?, ?, ?) "
+                "ON CONFLICT(resource_class, tier) DO UPDATE SET finish_tag = excluded.finish_tag",
+                (resource_class, tier, tag)
+            )
+            conn.execute(
+                "INSERT INTO jobs (id, payload, status, max_attempts, available_at, created_ts) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (
+                    job_id,
+                    json.dumps({**payload, "fair_start": start, "fair_tag": tag}, default=str),
+                    max_attempts or self.max_attempts,
+                    now,
+                    now
+                )
+            )
+        return tag
+
+    def claim(self, worker_id: str, task_types: Optional[Sequence[str]] = None) -> Optional[Job]:
+        """
+        Lease the next runnable job (of task_types, if given): queued and
+        due, or running with an expired lease (its worker died) and attempts
+        left. Queued jobs go in fair tag order, so each tier gets claims in
+        proportion to its weight while it has jobs waiting.
+        """
+        if task_types is not None and not task_types:
+            return None
+        now = time.time()
+        type_sql, type_params = self._type_filter(task_types)
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, payload, attempts, max_attempts FROM jobs "
+                f"WHERE status = 'queued' AND available_at <= ?{type_sql} "
+                f"ORDER BY {_FAIR_TAG_SQL}, available_at LIMIT 1",
+                (now, *type_params)
+            ).fetchone()
+            if row is None:
+                row = conn.execute(
+                    "SELECT id, payload, attempts, max_attempts FROM jobs "
+                    f"WHERE status = 'running' AND lease_expires < ? AND attempts < max_attempts{type_sql} "
+                    "ORDER BY lease_expires LIMIT 1",
+                    (now, *type_params)
+                ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker_id = ?, "
+                "lease_expires = ?, heartbeat_at = ? WHERE id = ?",
+                (worker_id, now + self.visibility_timeout, now, row["id"])
+            )
+            payload = json.loads(row["payload"])
+            if payload.get("fair_start") is not None:
+                # The class virtual time follows the start tag of the job in service
+                conn.execute(
+                    "INSERT INTO fair_clock (resource_class, virtual_time) VALUES (?, ?) "
+                    "ON CONFLICT(resource_class) DO UPDATE SET "
+                    "virtual_time = MAX(virtual_time, excluded.virtual_time)",
+                    (TASK_CLASSES.get(payload.get("type"), "network"), payload["fair_start"])
+                )
+        return Job(
+            id=row["id"],
+            payload=payload,
+            attempts=row["attempts"] + 1,
+            max_attempts=row["max_attempts"]
+        )
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease. False if the job is no longer leased to worker_id."""
+        now = time.time()
+        return self.db.execute(
+            "UPDATE jobs SET lease_expires = ?, heartbeat_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (now + self.visibility_timeout, now, job_id, worker_id)
+        ).rowcount > 0
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        """Mark a leased job done."""
+        return self.db.execute(
+            "UPDATE jobs SET status = 'done', finished_ts = ?, lease_expires = NULL "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (time.time(), job_id, worker_id)
+        ).rowcount > 0
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """
+        Record a failed attempt. With retry, the job is retried with
+        exponential backoff while it has attempts left.
+
+        Returns:
+            True if the job will be retried
+        """
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return False
+            if retry and row["attempts"] < row["max_attempts"]:
+                delay = self.retry_delay * 2 ** (row["attempts"] - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', available_at = ?, lease_expires = NULL, error = ? WHERE id = ?",
+                    (now + delay, error, job_id)
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_ts = ?, lease_expires = NULL, error = ? WHERE id = ?",
+                (now, error, job_id)
+            )
+            return False
+
+    def reap(self) -> List[str]:
+        """Fail jobs whose lease expired on their last attempt. Returns their ids."""
+        now = time.time()
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now,)
+            ).fetchall()
+            job_ids = [row["id"] for row in rows]
+            if job_ids:
+                conn.execute(
+                    f"UPDATE jobs SET status = 'failed', finished_ts = ?, lease_expires = NULL, "
+                    f"error = 'Worker lost' WHERE id IN ({','.join('?' * len(job_ids))})",
+                    (now, *job_ids)
+                )
+        return job_ids
+
+    def purge(self, max_age_seconds: int) -> int:
+        """Delete finished jobs older than max_age_seconds."""
+        return self.db.execute(
+            "DELETE FROM jobs WHERE finished_ts < ?",
+            (time.time() - max_age_seconds,)
+        ).rowcount
+
+    def depth(self) -> int:
+        """Jobs waiting to be claimed."""
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def backlog(self, task_types: Sequence[str], fair_tag: float) -> Tuple[Dict[str, int], int, int]:
+        """
+        What a job among task_types with fair_tag (from enqueue()) waits behind.
+
+        Returns:
+            (queued jobs claimed before it, per type; running jobs of
+            task_types; workers currently running jobs)
+        """
+        type_sql, type_params = self._type_filter(task_types)
+        rows = self.db.execute(
+            "SELECT json_extract(payload, '$.type') AS type, COUNT(*) AS n FROM jobs "
+            f"WHERE status = 'queued'{type_sql} AND ({_FAIR_TAG_SQL} IS NULL OR {_FAIR_TAG_SQL} < ?) GROUP BY type",
+            (*type_params, fair_tag)
+        ).fetchall()
+        now = time.time()
+        running = self.db.execute(
+            f"SELECT COUNT(*) FROM jobs WHERE status = 'running' AND lease_expires >= ?{type_sql}",
+            (now, *type_params)
+        ).fetchone()[0]
+        workers = self.db.execute(
+            "SELECT COUNT(DISTINCT worker_id) FROM jobs WHERE status = 'running' AND lease_expires >= ?",
+            (now,)
+        ).fetchone()[0]
+        return {row["type"]: row["n"] for row in rows}, running, workers
+
+    def get_stats(self) -> Dict:
+        """Job counts by status for health/debug endpoints."""
+        rows = self.db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        stats.update({row["status"]: row["n"] for row in rows})
+        oldest = self.db.execute(
+            "SELECT MIN(available_at) FROM jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+        stats["oldest_queued_seconds"] = round(max(0.0, time.time() - oldest), 1) if oldest else 0.0
+        return stats
+
+
+# Global job queue instance
+job_queue = JobQueue()
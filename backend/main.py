@@ -1,14 +1,17 @@
 import uuid
 import os
+import mimetypes
 import io
+import json
 import asyncio
 import functools
 import cv2
 import numpy as np
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Header, Request
+from typing import Optional
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from datetime import datetime
 from PIL import Image
@@ -22,23 +25,49 @@ except ImportError:
     HAS_INPAINTING = False
     print("⚠️ Inpainting router disabled (torch not installed)")
 
-from config import SUPABASE_URL, SUPABASE_SERVICE_KEY, CORS_ORIGINS, HOST, PORT, DOWNLOAD_DIR
-from models import ProcessRequest, CreateTaskResponse, Task
-from tasks import process_task, tasks_db
+from config import (
+    SUPABASE_URL, SUPABASE_SERVICE_KEY, CORS_ORIGINS, HOST, PORT, DOWNLOAD_DIR,
+    TASK_STORE, TASK_PURGE_INTERVAL, FILE_JANITOR_INTERVAL, SEPARATOR_MODE, SPY_BATCH_MAX_URLS,
+    MAX_ACTIVE_TASKS, MAX_ACTIVE_TASKS_PREMIUM, TASK_EXECUTION, TASK_TTL_SECONDS, FILE_OFFLOAD,
+    DOWNLOAD_MAX_AGE_SECONDS, STREAM_MAX_PER_TASK
+)
+from models import ProcessRequest, CreateTaskResponse, Task, SpyBatchRequest
+from tasks import (
+    process_task, expand_playlist, spy_batch_stream, open_download_stream, open_slideshow_zip, uses_proxy,
+    charge_task_usage
+)
+from task_store import task_store, public_task
+from file_index import file_index, find_task_file, enforce_download_quota
+from slideshow import SlideshowGone, SlideshowUnavailable
+from file_responses import ranged_file_response, accel_redirect_response, content_disposition
+from media_stream import media_streamer, StreamBusy, StreamUnavailable
+from video_cache import video_info_cache
+from workers import worker_pool, run_blocking, timed
+from download_store import download_store
+from progress import task_event_stream, progress_broker
+from http_clients import http_clients
+from separator import separator
+from stem_cache import stem_cache
+from audio_pipeline import purge_stale_pcm
+from job_queue import job_queue
+from scheduler import scheduler, user_tier, TASK_CLASSES
 
 # Rate limiting and auth
-from rate_limiter import rate_limiter
-from auth import get_current_user, get_client_ip
+from rate_limiter import rate_limiter, BUDGET_HEADERS, RateLimitDecision
+from auth import get_current_user, get_client_ip, get_auth_stats
 
 
-async def check_rate_limit(request: Request, endpoint: str) -> JSONResponse | None:
+async def check_rate_limit(request: Request, endpoint: str, cost: int = 1) -> JSONResponse | None:
     """
     Check rate limit for a request. Returns error response if limit exceeded.
     Returns None if request is allowed.
+    cost is the number of units the request consumes (e.g. URLs in a batch).
     """
     # Get user or use IP
     user = await get_current_user(request)
     
+    request.state.user = user
+    
     if user:
         identifier = f"user:{user.id}"
         is_premium = user.is_premium
@@ -46,44 +75,155 @@ async def check_rate_limit(request: Request, endpoint: str) -> JSONResponse | No
         identifier = f"ip:{get_client_ip(request)}"
         is_premium = False
     
-    allowed, remaining, reset_seconds = rate_limiter.check_rate_limit(
-        identifier, endpoint, is_premium
-    )
+    # Atomic check-and-consume (refunded by process_task if the task fails)
+    decision = await asyncio.to_thread(rate_limiter.acquire, identifier, endpoint, is_premium, cost)
     
-    if not allowed:
+    if not decision.allowed:
         return JSONResponse(
             status_code=429,
             content={
                 "error": "Rate limit exceeded",
-                "message": f"Too many requests. Please wait {reset_seconds} seconds.",
-                "retry_after": reset_seconds
+                "message": f"Too many requests. Please wait {decision.reset_seconds} seconds.",
+                "retry_after": decision.reset_seconds
             },
             headers={
                 "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": str(reset_seconds),
-                "Retry-After": str(reset_seconds)
+                "X-RateLimit-Reset": str(decision.reset_seconds),
+                "Retry-After": str(decision.reset_seconds)
             }
         )
     
-    # Record the request
-    rate_limiter.record_request(identifier, endpoint)
+    # Proxy bandwidth / CPU budgets the endpoint draws on
+    refusal, budget_headers = await asyncio.to_thread(rate_limiter.check_budgets, identifier, endpoint, is_premium)
+    if refusal:
+        await asyncio.to_thread(rate_limiter.refund, identifier, endpoint, cost)
+        return budget_exceeded_response(refusal, budget_headers)
+    
+    request.state.rate_limit = {"identifier": identifier, "endpoint": endpoint, "is_premium": is_premium}
+    request.state.rate_limit_headers = {"X-RateLimit-Remaining": str(decision.remaining), **budget_headers}
     return None
 
 
+def budget_exceeded_response(refusal: RateLimitDecision, budget_headers: dict) -> JSONResponse:
+    """429 for a client whose proxy bandwidth / CPU budget is used up."""
+    return JSONResponse(
+        status_code=429,
+        content={
+            "error": "Usage budget exceeded",
+            "message": f"Usage budget used up. Please wait {refusal.reset_seconds} seconds.",
+            "retry_after": refusal.reset_seconds
+        },
+        headers={
+            **budget_headers,
+            "X-RateLimit-Reset": str(refusal.reset_seconds),
+            "Retry-After": str(refusal.reset_seconds)
+        }
+    )
+
+
+async def charge_usage(request: Request, resource: str, amount: float):
+    """Charge resource usage to the client of a request that passed check_rate_limit."""
+    rate_limit = getattr(request.state, "rate_limit", None)
+    if rate_limit:
+        await asyncio.to_thread(rate_limiter.charge, rate_limit["identifier"], resource, amount)
+
+
+class RateLimitHeadersMiddleware:
+    """Adds the X-RateLimit-* headers set by check_rate_limit to the response."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # Same dict as request.state
+        state = scope.setdefault("state", {})
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and state.get("rate_limit_headers"):
+                headers = list(message.get("headers", []))
+                existing = {name.lower() for name, _ in headers}
+                for name, value in state["rate_limit_headers"].items():
+                    if name.lower().encode() not in existing:
+                        headers.append((name.lower().encode(), value.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+
+async def _purge_expired_tasks():
+    """Periodically drop expired task records so the store stays bounded"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(task_store.purge_expired)
+            if removed:
+                print(f"🧹 Purged {removed} expired tasks")
+            await asyncio.to_thread(rate_limiter.evict_idle)
+            if TASK_EXECUTION == "queue":
+                await asyncio.to_thread(job_queue.purge, TASK_TTL_SECONDS)
+        except Exception as e:
+            print(f"Task purge error: {e}")
+        await asyncio.sleep(TASK_PURGE_INTERVAL)
+
+
+async def _download_janitor():
+    """Periodically enforce the download quota and max file age (LRU eviction)"""
+    try:
+        added = await asyncio.to_thread(file_index.index_untracked)
+        if added:
+            print(f"🗃️ Indexed {added} untracked files in {DOWNLOAD_DIR}")
+    except Exception as e:
+        print(f"File index scan error: {e}")
+    
+    while True:
+        try:
+            removed, freed = await asyncio.to_thread(stem_cache.enforce_quota)
+            if removed:
+                print(f"🧹 Evicted {removed} cached stems ({freed / 1024 ** 2:.1f} MB)")
+            removed, freed = await asyncio.to_thread(enforce_download_quota)
+            if removed:
+                print(f"🧹 Evicted {removed} files ({freed / 1024 ** 2:.1f} MB)")
+            removed = await asyncio.to_thread(purge_stale_pcm, DOWNLOAD_MAX_AGE_SECONDS)
+            if removed:
+                print(f"🧹 Removed {removed} stale PCM files")
+            removed = await asyncio.to_thread(download_store.purge_stale_partials, DOWNLOAD_MAX_AGE_SECONDS)
+            if removed:
+                print(f"🧹 Removed {removed} abandoned partial downloads")
+        except Exception as e:
+            print(f"Download janitor error: {e}")
+        await asyncio.sleep(FILE_JANITOR_INTERVAL)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifecycle manager"""
     print("🚀 Starting V-Tool API Server...")
     print(f"📁 Download directory: {DOWNLOAD_DIR}")
+    print(f"🗂️ Task store: {TASK_STORE}")
+    print(f"⚙️ Task execution: {TASK_EXECUTION}")
     
     if SUPABASE_URL and SUPABASE_SERVICE_KEY:
         print("✅ Supabase configured")
     else:
-        print("⚠️ Supabase not configured - using in-memory storage")
+        print("⚠️ Supabase not configured - auth disabled")
+    
+    http_clients.start()
+    if SEPARATOR_MODE == "worker" and TASK_EXECUTION == "inline":
+        # Load the separation model now so the first audio task starts warm
+        separator.start()
+    purge_task = asyncio.create_task(_purge_expired_tasks())
+    janitor_task = asyncio.create_task(_download_janitor())
     
     yield
     
     print("👋 Shutting down V-Tool API Server...")
+    purge_task.cancel()
+    janitor_task.cancel()
+    worker_pool.shutdown()
+    separator.shutdown()
+    await http_clients.aclose()
 
 
 # Create FastAPI app
@@ -98,6 +238,8 @@ app = FastAPI(
 if HAS_INPAINTING:
     app.include_router(inpainting.router)
 
+app.add_middleware(RateLimitHeadersMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -105,6 +247,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-RateLimit-Remaining", "X-RateLimit-Reset", "Retry-After", *BUDGET_HEADERS.values()],
 )
 
 if not os.path.exists("static"):
@@ -126,28 +269,51 @@ async def root():
     }
 
 
+def _database_stats() -> dict:
+    """Health stats that query SQLite (run off the event loop)."""
+    return {
+        "active_tasks": task_store.count(),
+        "files": file_index.get_stats(),
+        "rate_limiter": rate_limiter.get_stats(),
+        "job_queue": job_queue.get_stats() if TASK_EXECUTION == "queue" else None,
+    }
+
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
+    database_stats = await asyncio.to_thread(_database_stats)
     return {
         "status": "healthy",
         "download_dir": DOWNLOAD_DIR,
-        "active_tasks": len(tasks_db)
+        "active_tasks": database_stats["active_tasks"],
+        "video_info_cache": video_info_cache.get_stats(),
+        "worker_pool": worker_pool.get_stats(),
+        "download_store": download_store.get_stats(),
+        "progress_subscribers": progress_broker.subscriber_count(),
+        "files": database_stats["files"],
+        "http_clients": http_clients.get_stats(),
+        "auth": get_auth_stats(),
+        "separator": separator.get_stats(),
+        "stem_cache": stem_cache.get_stats(),
+        "rate_limiter": database_stats["rate_limiter"],
+        "job_queue": database_stats["job_queue"],
+        "scheduler": scheduler.get_stats(),
+        "media_streams": media_streamer.get_stats()
     }
 
 
 @app.post("/api/process", response_model=CreateTaskResponse)
 async def create_process_task(
     request: ProcessRequest,
-    background_tasks: BackgroundTasks,
     req: Request
 ):
     """
     Create a new processing task.
     
     - Creates a task record
-    - Returns task_id immediately
-    - Processes the task in the background
+    - Returns task_id immediately, with its queue position and estimated wait
+    - Processes the task in the background when the scheduler gives it a slot
     """
     # Check rate limit for this task type
     rate_limit_error = await check_rate_limit(req, request.type)
@@ -165,42 +331,169 @@ async def create_process_task(
             "audio_bitrate": request.audio_bitrate,
         }
         
-        # Create task in memory storage
+        user = getattr(req.state, "user", None)
+        
+        # Create task record
         task_data = {
             "id": task_id,
+            "user_id": user.id if user else None,
             "type": request.type,
             "status": "pending",
             "progress": 0,
             "input_url": request.url,
             "options": options,
+            "rate_limit": getattr(req.state, "rate_limit", None),
             "result": None,
             "error_message": None,
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat()
         }
-        tasks_db[task_id] = task_data
+        max_active = MAX_ACTIVE_TASKS_PREMIUM if user and user.is_premium else MAX_ACTIVE_TASKS
+        if not await asyncio.to_thread(task_store.create, task_data, max_active=max_active):
+            await asyncio.to_thread(rate_limiter.refund, task_data["rate_limit"]["identifier"], request.type)
+            return JSONResponse(
+                status_code=429,
+                content={
+                    "error": "Too many active tasks",
+                    "message": f"You already have {max_active} tasks in progress. Please wait for one to finish.",
+                    "retry_after": 10
+                },
+                headers={"Retry-After": "10"}
+            )
+        
+        tier = user_tier(user)
+        try:
+            if TASK_EXECUTION == "queue":
+                # A worker process picks it up (see worker.py) when its class has a free slot
+                fair_tag = await asyncio.to_thread(job_queue.enqueue, task_id, {
+                    "task_id": task_id,
+                    "type": request.type,
+                    "url": request.url,
+                    "options": options,
+                    "tier": tier,
+                }, cost=scheduler.expected_seconds(request.type))
+            else:
+                # Start background processing with options once a slot is free
+                ticket = scheduler.submit(task_id, request.type, tier, process_task, task_id, request.type, request.url, options)
+        except Exception:
+            # The task will never run: free its active task slot and give back the rate limit unit
+            await asyncio.to_thread(task_store.delete, task_id)
+            await asyncio.to_thread(rate_limiter.refund, task_data["rate_limit"]["identifier"], request.type)
+            raise
         
-        # Start background processing with options
-        background_tasks.add_task(process_task, task_id, request.type, request.url, options)
+        if TASK_EXECUTION == "queue":
+            ahead, running, workers = await asyncio.to_thread(
+                job_queue.backlog, scheduler.task_types(TASK_CLASSES.get(request.type, "network")), fair_tag
+            )
+            queue_position = sum(ahead.values()) + 1
+            estimated_wait_seconds = scheduler.estimate_wait(request.type, ahead, running, workers)
+        else:
+            queue_position = ticket.queue_position
+            estimated_wait_seconds = ticket.estimated_wait_seconds
         
         return CreateTaskResponse(
             task_id=task_id,
-            message=f"Task created successfully. Processing {request.type} for URL: {request.url}"
+            message=f"Task created successfully. Processing {request.type} for URL: {request.url}",
+            queue_position=queue_position,
+            estimated_wait_seconds=estimated_wait_seconds
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/spy/batch")
+async def spy_batch(request: SpyBatchRequest, req: Request):
+    """
+    Extract spy metadata for many videos in one request.
+    
+    - Takes a list of URLs, or a playlist/channel URL (expanded with flat extraction)
+    - Each video counts against the spy rate limit
+    - Extracts with bounded parallelism
+    - Streams NDJSON: a "start" line, one "result" line per video as soon as
+      it is ready (completion order, with its input index), then a "done" line
+    """
+    if bool(request.urls) == bool(request.playlist_url):
+        raise HTTPException(status_code=400, detail="Provide either urls or playlist_url")
+    
+    limit = request.max_items or SPY_BATCH_MAX_URLS
+    if request.urls and len(request.urls) > SPY_BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {SPY_BATCH_MAX_URLS} URLs per batch")
+    
+    if request.urls:
+        # Drop duplicates, keep order
+        urls = list(dict.fromkeys(request.urls))[:limit]
+        cost = len(urls)
+    else:
+        # Up to limit videos; what the playlist doesn't fill is refunded below
+        cost = limit
+    
+    rate_limit_error = await check_rate_limit(req, "spy", cost=cost)
+    if rate_limit_error:
+        return rate_limit_error
+    
+    if request.playlist_url:
+        identifier = req.state.rate_limit["identifier"]
+        try:
+            urls = await run_blocking("spy", expand_playlist, request.playlist_url, limit)
+        except Exception as e:
+            await asyncio.to_thread(rate_limiter.refund, identifier, "spy", cost)
+            raise HTTPException(status_code=422, detail=str(e))
+        if len(urls) < cost:
+            await asyncio.to_thread(rate_limiter.refund, identifier, "spy", cost - len(urls))
+        if not urls:
+            raise HTTPException(status_code=422, detail="No videos found in playlist")
+    
+    async def ndjson():
+        async for item in spy_batch_stream(urls):
+            yield json.dumps(item) + "\n"
+    
+    return StreamingResponse(
+        ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/api/tasks/{task_id}")
 async def get_task(task_id: str):
     """
     Get task status and result.
     """
-    if task_id not in tasks_db:
+    task = await asyncio.to_thread(task_store.get, task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return tasks_db[task_id]
+    return public_task(task)
+
+
+def get_public_task(task_id: str) -> Optional[dict]:
+    """task_store.get without the fields the API never returns."""
+    task = task_store.get(task_id)
+    return public_task(task) if task is not None else None
+
+
+@app.get("/api/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, req: Request):
+    """
+    Stream task updates as Server-Sent Events.
+    
+    - Sends a `task` event with the full task record whenever it changes
+      (coalesced to PROGRESS_MAX_EVENTS_PER_SECOND)
+    - Closes the stream once the task is completed or failed
+    """
+    if await asyncio.to_thread(task_store.get, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    return StreamingResponse(
+        task_event_stream(task_id, get_public_task, req.is_disconnected),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Disable nginx response buffering so events arrive immediately
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 
 @app.delete("/api/tasks/{task_id}")
@@ -208,80 +501,140 @@ async def delete_task(task_id: str):
     """
     Delete a task and its files.
     """
-    if task_id in tasks_db:
-        del tasks_db[task_id]
+    await asyncio.to_thread(task_store.delete, task_id)
     
-    # Clean up downloaded files
-    for f in os.listdir(DOWNLOAD_DIR):
-        if f.startswith(task_id):
-            os.remove(os.path.join(DOWNLOAD_DIR, f))
+    # Clean up downloaded files (shared store copies stay for the janitor)
+    await asyncio.to_thread(file_index.remove_owner, task_id)
     
     return {"message": "Task deleted successfully"}
 
 
 @app.get("/api/files/{filename}")
-async def serve_file(filename: str, download_name: str = None, range: str = Header(None)):
+async def serve_file(filename: str, req: Request, download_name: str = None):
     """
     Serve downloaded files with Range support for seeking.
     Optionally set Content-Disposition filename with download_name.
+    Ranges are streamed in fixed-size chunks (see file_responses), or the
+    transfer is handed to nginx with FILE_OFFLOAD=nginx.
     """
-    filepath = os.path.join(DOWNLOAD_DIR, filename)
+    filepath = find_task_file(filename)
     
-    if not os.path.exists(filepath):
+    if not filepath:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    await asyncio.to_thread(file_index.touch, filepath)
+    
+    if FILE_OFFLOAD == "nginx":
+        return accel_redirect_response(filepath, download_name or filename)
+    
+    try:
+        return ranged_file_response(filepath, req.headers, download_name or filename)
+    except FileNotFoundError:
+        # Evicted between lookup and open
         raise HTTPException(status_code=404, detail="File not found")
-        
-    file_size = os.path.getsize(filepath)
-    headers = {
-        "Content-Disposition": f'attachment; filename="{download_name or filename}"',
-        "Accept-Ranges": "bytes"
-    }
 
-    # Handle Range Header
-    if range:
+
+@app.get("/api/stream/{task_id}")
+async def stream_download(task_id: str, download_name: str = None):
+    """
+    Stream a download task's media straight from yt-dlp (DOWNLOAD_DELIVERY=stream).
+    Nothing is written to disk; the first bytes are sent as soon as yt-dlp
+    has them, and a disconnect stops the download.
+    Each fetch downloads again, so it must fit the task client's budgets and
+    a task can be fetched at most STREAM_MAX_PER_TASK times.
+    """
+    task = await asyncio.to_thread(task_store.get, task_id)
+    stream = (task or {}).get("stream")
+    if not task or task.get("status") != "completed" or not stream:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    rate_limit = task.get("rate_limit")
+    if rate_limit:
+        refusal, budget_headers = await asyncio.to_thread(
+            rate_limiter.check_budgets, rate_limit["identifier"], rate_limit["endpoint"], rate_limit.get("is_premium", False)
+        )
+        if refusal:
+            return budget_exceeded_response(refusal, budget_headers)
+    
+    # Counted atomically so concurrent fetches can't all pass the limit
+    if not await asyncio.to_thread(task_store.claim_stream, task_id, STREAM_MAX_PER_TASK):
+        raise HTTPException(status_code=410, detail="Stream limit reached for this download, please request it again")
+    
+    url = task["input_url"]
+    try:
+        media = await open_download_stream(url, stream)
+    except BaseException as e:
+        # Nothing was sent, so this fetch doesn't count
+        await asyncio.to_thread(task_store.release_stream, task_id)
+        if isinstance(e, StreamBusy):
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+        if isinstance(e, StreamUnavailable):
+            raise HTTPException(status_code=502, detail=f"Stream failed: {e}")
+        raise
+    
+    async def body():
         try:
-            start, end = range.replace("bytes=", "").split("-")
-            start = int(start)
-            end = int(end) if end else file_size - 1
-            
-            # Cap end at file size
-            if end >= file_size:
-                end = file_size - 1
-                
-            chunk_size = (end - start) + 1
-            
-            headers.update({
-                "Content-Range": f"bytes {start}-{end}/{file_size}",
-                "Content-Length": str(chunk_size)
-            })
-            
-            with open(filepath, "rb") as f:
-                f.seek(start)
-                content = f.read(chunk_size)
-                
-            return StreamingResponse(
-                io.BytesIO(content),
-                status_code=206,
-                headers=headers,
-                media_type="application/octet-stream"
-            )
-        except Exception:
-            # If range parsing fails, fallback to full file
-            pass
-
-    return FileResponse(
-        filepath,
-        filename=download_name or filename,
-        media_type="application/octet-stream",
-        headers={"Accept-Ranges": "bytes"}
+            while chunk := await media.read():
+                yield chunk
+        finally:
+            media.close()
+            if uses_proxy(url):
+                # Not awaited: this also runs when the client disconnects (cancelled)
+                asyncio.get_running_loop().run_in_executor(
+                    None, charge_task_usage, task_id, "proxy_bytes", media.bytes_sent
+                )
+    
+    filename = download_name or (task.get("result") or {}).get("filename") or f"{task_id}.{stream['ext']}"
+    return StreamingResponse(
+        body(),
+        media_type=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "Cache-Control": "no-store",
+            # A pipe can't seek; tells players not to send Range requests
+            "Accept-Ranges": "none",
+            # Pass bytes through as they come; nginx buffering would stage the file on its disk
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
+@app.get("/api/slideshow/{task_id}/zip")
+async def stream_slideshow(task_id: str):
+    """
+    Stream a slideshow task's images as a ZIP built on the fly.
+    Nothing is written to disk; the first bytes are sent as soon as the
+    first image has been fetched, so a slideshow whose images can't be
+    fetched gets an error status instead of an empty ZIP.
+    """
+    task = await asyncio.to_thread(task_store.get, task_id)
+    result = (task or {}).get("result") or {}
+    if not task or task.get("type") != "slideshow" or not result.get("images"):
+        raise HTTPException(status_code=404, detail="Slideshow not found")
+    
+    try:
+        zip_stream = await open_slideshow_zip(task_id, task)
+    except SlideshowGone as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except SlideshowUnavailable as e:
+        raise HTTPException(status_code=502, detail=f"Slideshow images could not be fetched: {e}")
+    
+    return StreamingResponse(
+        zip_stream,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{result.get("filename") or f"{task_id}_slideshow.zip"}"',
+            "X-Accel-Buffering": "no"
+        }
     )
 
 
 @app.get("/api/tasks")
-async def list_tasks():
+async def list_tasks(limit: int = 100, status: str = None):
     """
-    List all tasks.
+    List the most recent tasks (newest first).
     """
-    return list(tasks_db.values())
+    tasks = await asyncio.to_thread(task_store.list, limit=min(max(limit, 1), 1000), status=status)
+    return [public_task(task) for task in tasks]
 
 
 # Allowed image extensions for background removal
@@ -347,10 +700,11 @@ async def remove_background(req: Request, file: UploadFile = File(...)):
         
         # Process in thread pool to avoid blocking
         loop = asyncio.get_event_loop()
-        result_bytes = await loop.run_in_executor(
+        result_bytes, seconds = await loop.run_in_executor(
             None,
-            functools.partial(_process_remove_bg, image_bytes)
+            functools.partial(timed, _process_remove_bg, image_bytes)
         )
+        await charge_usage(req, "cpu_seconds", seconds)
         
         # Return as streaming response
         return StreamingResponse(
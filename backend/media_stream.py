@@ -0,0 +1,225 @@
+"""
+Direct media streaming for V-Tool API.
+With DOWNLOAD_DELIVERY=stream, downloads that fetch a single http(s) format
+(no merge) are never staged in DOWNLOAD_DIR: /api/stream/{task_id} runs
+yt-dlp on the cached extraction (--load-info-json) with -o - and pipes its
+stdout into the response, through ffmpeg when the audio becomes an MP3.
+
+The pipe is only read as fast as the client takes the bytes, so a slow
+client leaves yt-dlp blocked on a full pipe instead of the video piling up
+in memory; a disconnect kills the pipeline.
+"""
+
+import asyncio
+import os
+import sys
+from typing import List, Optional
+
+from config import STREAM_MAX_CONCURRENCY, STREAM_SLOT_TIMEOUT
+
+
+STREAM_READ_SIZE = 64 * 1024
+
+
+class StreamUnavailable(Exception):
+    """The pipeline failed (before the first byte, or part way through)."""
+
+
+class StreamBusy(StreamUnavailable):
+    """No stream slot became free within STREAM_SLOT_TIMEOUT."""
+
+
+async def _exit_errors(processes: List[asyncio.subprocess.Process]) -> str:
+    """Wait for the pipeline to exit; stderr of the processes that failed."""
+    errors = []
+    for process in processes:
+        await process.wait()
+        if process.returncode != 0:
+            stderr = await process.stderr.read()
+            errors.append(stderr.decode(errors="replace").strip()[-500:] or f"exit status {process.returncode}")
+    return "; ".join(errors)
+
+
+class MediaStream:
+    """A running yt-dlp (-> ffmpeg) pipeline. read() until b"", then close()."""
+
+    def __init__(self, streamer: "MediaStreamer", processes: List[asyncio.subprocess.Process], first_chunk: bytes):
+        self._streamer = streamer
+        self._processes = processes
+        self._pending = first_chunk
+        self.bytes_sent = 0
+        self.closed = False
+
+    async def read(self) -> bytes:
+        """
+        Next chunk of media, b"" at the end.
+
+        Raises:
+            StreamUnavailable: If the pipeline failed (the media is truncated)
+        """
+        if self._pending:
+            chunk, self._pending = self._pending, b""
+        else:
+            chunk = await self._processes[-1].stdout.read(STREAM_READ_SIZE)
+        if chunk:
+            self.bytes_sent += len(chunk)
+            return chunk
+        errors = await _exit_errors(self._processes)
+        if errors:
+            raise StreamUnavailable(errors)
+        return b""
+
+    def close(self):
+        """Kill whatever is still running and free the slot. Safe to call twice."""
+        if self.closed:
+            return
+        self.closed = True
+        for process in self._processes:
+            if process.returncode is None:
+                process.kill()
+        self._streamer._release(self)
+
+
+class MediaStreamer:
+    """Starts media pipelines, at most max_streams at a time per process."""
+
+    def __init__(self, max_streams: int = STREAM_MAX_CONCURRENCY, slot_timeout: float = STREAM_SLOT_TIMEOUT):
+        self.max_streams = max_streams
+        self.slot_timeout = slot_timeout
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.started = 0
+        self.failed = 0
+        self.busy = 0
+        self.bytes_sent = 0
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, self.max_streams))
+        return self._slots
+
+    def _release(self, stream: MediaStream):
+        self.active -= 1
+        self.bytes_sent += stream.bytes_sent
+        self._slots.release()
+
+    async def _spawn(
+        self,
+        info_json: bytes,
+        format_id: str,
+        proxy: Optional[str],
+        audio_bitrate: Optional[str]
+    ) -> List[asyncio.subprocess.Process]:
+        cmd = [
+            sys.executable, "-m", "yt_dlp",
+            "--load-info-json", "-",
+            "-f", format_id,
+            "-o", "-",
+            "--quiet", "--no-warnings", "--no-progress", "--no-part",
+            "--no-check-certificates", "--retries", "5",
+        ]
+        if proxy:
+            cmd += ["--proxy", proxy]
+
+        if audio_bitrate is None:
+            ytdlp = await asyncio.create_subprocess_exec(
+                *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            processes = [ytdlp]
+        else:
+            # yt-dlp writes straight into ffmpeg's stdin through an OS pipe
+            read_fd, write_fd = os.pipe()
+            try:
+                ytdlp = await asyncio.create_subprocess_exec(
+                    *cmd, stdin=asyncio.subprocess.PIPE, stdout=write_fd, stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    ffmpeg = await asyncio.create_subprocess_exec(
+                        "ffmpeg", "-v", "error", "-i", "pipe:0",
+                        "-vn", "-codec:a", "libmp3lame", "-b:a", f"{audio_bitrate}k",
+                        "-f", "mp3", "pipe:1",
+                        stdin=read_fd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+                    )
+                except BaseException:
+                    ytdlp.kill()
+                    raise
+            finally:
+                os.close(read_fd)
+                os.close(write_fd)
+            processes = [ytdlp, ffmpeg]
+
+        try:
+            ytdlp.stdin.write(info_json)
+            await ytdlp.stdin.drain()
+            ytdlp.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # yt-dlp died before reading the info - its stderr says why
+            pass
+        return processes
+
+    async def open(
+        self,
+        info_json: bytes,
+        format_id: str,
+        proxy: Optional[str] = None,
+        audio_bitrate: Optional[str] = None
+    ) -> MediaStream:
+        """
+        Start piping one format of an extraction and wait for its first bytes.
+
+        Args:
+            info_json: yt-dlp info dict (sanitized) as JSON
+            format_id: Format to stream
+            proxy: Proxy URL for the media request
+            audio_bitrate: Convert to MP3 at this bitrate (kbps) with ffmpeg
+
+        Raises:
+            StreamBusy: If no slot became free in time
+            StreamUnavailable: If the pipeline ended without producing output
+        """
+        slots = self._get_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.slot_timeout)
+        except asyncio.TimeoutError:
+            self.busy += 1
+            raise StreamBusy("All media streams are busy")
+        self.active += 1
+        self.started += 1
+
+        stream = None
+        processes: List[asyncio.subprocess.Process] = []
+        try:
+            processes = await self._spawn(info_json, format_id, proxy, audio_bitrate)
+            stream = MediaStream(self, processes, b"")
+            # Nothing is sent before the first chunk, so early failures can still become an error status
+            first_chunk = await processes[-1].stdout.read(STREAM_READ_SIZE)
+            if not first_chunk:
+                raise StreamUnavailable(await _exit_errors(processes) or "yt-dlp produced no output")
+            stream._pending = first_chunk
+            return stream
+        except BaseException:
+            self.failed += 1
+            if stream is not None:
+                stream.close()
+            else:
+                for process in processes:
+                    process.kill()
+                self.active -= 1
+                slots.release()
+            raise
+
+    def get_stats(self) -> dict:
+        """Pipeline counts for health/debug endpoints."""
+        return {
+            "max_streams": self.max_streams,
+            "active": self.active,
+            "started": self.started,
+            "failed": self.failed,
+            "busy": self.busy,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+# Global media streamer instance
+media_streamer = MediaStreamer()
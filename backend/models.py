@@ -1,7 +1,9 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 from typing import Optional, Literal, Union, List
 from datetime import datetime
 
+from config import SPY_BATCH_MAX_URLS
+
 # Task types
 TaskType = Literal["download", "summary", "spy", "slideshow", "audio"]
 TaskStatus = Literal["pending", "processing", "completed", "failed"]
@@ -17,10 +19,19 @@ class ProcessRequest(BaseModel):
     audio_bitrate: Optional[str] = None
 
 
+class SpyBatchRequest(BaseModel):
+    urls: Optional[List[str]] = None
+    playlist_url: Optional[str] = None  # Playlist/channel expanded with flat extraction
+    max_items: Optional[int] = Field(None, ge=1, le=SPY_BATCH_MAX_URLS)
+
+
 # Response Models
 class CreateTaskResponse(BaseModel):
     task_id: str
     message: str
+    # 0 = started right away (inline); queued tasks count themselves (1 = next)
+    queue_position: int = 0
+    estimated_wait_seconds: Optional[float] = None
 
 
 class DownloadResult(BaseModel):
@@ -71,6 +82,8 @@ class AudioResult(BaseModel):
     duration: float
     format: str
     file_size: int
+    # download_url is piped from yt-dlp on every fetch (no Range support)
+    streamed: bool = False
     # Optional fields for separated tracks
     vocals_url: Optional[str] = None
     vocals_filename: Optional[str] = None
@@ -81,12 +94,22 @@ class AudioResult(BaseModel):
 TaskResult = Union[DownloadResult, SummaryResult, SpyResult, SlideshowResult, AudioResult]
 
 
+class TransferProgress(BaseModel):
+    downloaded_bytes: int
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None
+    eta: Optional[int] = None
+
+
 class Task(BaseModel):
     id: str
     user_id: Optional[str] = None
     type: TaskType
     status: TaskStatus
     progress: int
+    stage: Optional[str] = None
+    transfer: Optional[TransferProgress] = None
+    partial_markdown: Optional[str] = None  # Summary text streamed so far
     input_url: str
     result: Optional[TaskResult] = None
     error_message: Optional[str] = None
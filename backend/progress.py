@@ -0,0 +1,126 @@
+"""
+Task progress push channel for V-Tool API.
+Task updates (including yt-dlp byte-level progress from worker threads)
+wake Server-Sent Events subscribers, which send the latest task snapshot at
+most PROGRESS_MAX_EVENTS_PER_SECOND times per second.
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from config import PROGRESS_MAX_EVENTS_PER_SECOND, PROGRESS_HEARTBEAT_SECONDS, PROGRESS_POLL_SECONDS, TASK_EXECUTION
+
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+@dataclass(eq=False)
+class Subscriber:
+    """One SSE connection waiting for updates of a task."""
+    loop: asyncio.AbstractEventLoop
+    event: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class ProgressBroker:
+    """Thread-safe fan-out of task update notifications."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._lock = Lock()
+
+    def subscribe(self, task_id: str) -> Subscriber:
+        """Register the calling coroutine's loop for updates of task_id."""
+        subscriber = Subscriber(loop=asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[task_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, task_id: str, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    def notify(self, task_id: str):
+        """Wake subscribers of task_id. Safe to call from any thread."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.event.set)
+            except RuntimeError:
+                pass  # Subscriber's loop is closed
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+# Global progress broker instance
+progress_broker = ProgressBroker()
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def task_event_stream(
+    task_id: str,
+    get_task: Callable[[str], Optional[dict]],
+    is_disconnected: Callable[[], Awaitable[bool]]
+) -> AsyncIterator[str]:
+    """
+    Yield SSE messages with task snapshots until the task finishes.
+
+    Bursts of updates are coalesced: a snapshot is sent at most once per
+    1 / PROGRESS_MAX_EVENTS_PER_SECOND seconds and only if it changed.
+    A comment line is sent every PROGRESS_HEARTBEAT_SECONDS so proxies keep
+    the connection open; the task is also re-read then, which picks up
+    updates made outside this process. Queue workers never notify this
+    process, so with TASK_EXECUTION=queue the task is re-read every
+    PROGRESS_POLL_SECONDS.
+    """
+    min_interval = 1.0 / max(PROGRESS_MAX_EVENTS_PER_SECOND, 0.1)
+    poll_interval = PROGRESS_POLL_SECONDS if TASK_EXECUTION == "queue" else PROGRESS_HEARTBEAT_SECONDS
+    subscriber = progress_broker.subscribe(task_id)
+    last_payload = None
+    last_sent = time.monotonic()
+
+    try:
+        while True:
+            subscriber.event.clear()
+            # Blocking store read (SQLite) - keep it off the event loop
+            task = await asyncio.to_thread(get_task, task_id)
+            if task is None:
+                yield _sse("not_found", json.dumps({"detail": "Task not found"}))
+                return
+
+            payload = json.dumps(task, default=str)
+            if payload != last_payload:
+                last_payload = payload
+                last_sent = time.monotonic()
+                yield _sse("task", payload)
+
+            if task.get("status") in FINISHED_STATUSES:
+                return
+
+            await asyncio.sleep(min_interval)
+            if not subscriber.event.is_set():
+                try:
+                    await asyncio.wait_for(subscriber.event.wait(), poll_interval)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_sent >= PROGRESS_HEARTBEAT_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keepalive\n\n"
+
+            if await is_disconnected():
+                return
+    finally:
+        progress_broker.unsubscribe(task_id, subscriber)
@@ -1,14 +1,38 @@
 """
 Rate Limiter for V-Tool API
-Uses sliding window algorithm with in-memory storage.
+Uses sliding window counters with pluggable storage.
 Tracks by IP address (anonymous) or user_id (authenticated).
+
+Each (endpoint, identifier) keeps two counters per window (current and
+previous), so a check is O(1) and memory per client is constant. The
+request count in the last hour/day is estimated by weighting the previous
+window by how much of it still overlaps the sliding window.
+
+Backends (RATE_LIMIT_BACKEND):
+- "sqlite" (default): WAL-mode database shared by every worker on the host
+- "redis": shared by every host, checks run as a Lua script
+- "memory": process-local, for development (limits multiply with workers)
+
+Besides request counts, clients have cost budgets for the scarce resources:
+bytes downloaded through the proxy and CPU seconds of rembg/demucs/LaMa work.
+Budgets are charged after the work is done and checked before it starts.
+
+Backend calls block (SQLite transaction, Redis round trip), so async code
+runs them with asyncio.to_thread. If the backend fails (e.g. Redis is down)
+the limiter fails open: requests are allowed and the error is logged.
 """
 
 import time
-from collections import defaultdict
+from abc import ABC, abstractmethod
 from threading import Lock
 from typing import Optional, Dict, Tuple
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+
+from config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_DB_PATH, REDIS_URL,
+    PROXY_BYTES_PER_HOUR, PROXY_BYTES_PER_DAY, CPU_SECONDS_PER_HOUR, CPU_SECONDS_PER_DAY
+)
+from db import SQLiteDatabase
 
 
 @dataclass
@@ -35,96 +59,279 @@ PREMIUM_MULTIPLIER = 5
 
 
 @dataclass
+class BudgetConfig:
+    """Hourly/daily allowance of a metered resource."""
+    per_hour: float
+    per_day: float
+
+
+# Cost budgets for free tier (premium gets PREMIUM_MULTIPLIER x)
+FREE_TIER_BUDGETS: Dict[str, BudgetConfig] = {
+    "proxy_bytes": BudgetConfig(per_hour=PROXY_BYTES_PER_HOUR, per_day=PROXY_BYTES_PER_DAY),
+    "cpu_seconds": BudgetConfig(per_hour=CPU_SECONDS_PER_HOUR, per_day=CPU_SECONDS_PER_DAY),
+}
+
+# Budgets an endpoint draws on - it is refused while any of them is spent
+ENDPOINT_BUDGETS: Dict[str, Tuple[str, ...]] = {
+    "download": ("proxy_bytes",),
+    "audio": ("proxy_bytes", "cpu_seconds"),
+    "remove_bg": ("cpu_seconds",),
+    "inpainting": ("cpu_seconds",),
+}
+
+# Response headers reporting what is left of each budget
+BUDGET_HEADERS = {
+    "proxy_bytes": "X-RateLimit-Bytes-Remaining",
+    "cpu_seconds": "X-RateLimit-CPU-Remaining",
+}
+
+
+HOUR_SECONDS = 3600
+DAY_SECONDS = 86400
+
+# Independent lock stripes - requests for different clients rarely contend
+LOCK_STRIPES = 64
+
+# Idle entries examined per request for amortized eviction
+_EVICTION_BATCH = 2
+
+
+@dataclass
+class RateLimitDecision:
+    """Outcome of an atomic check-and-consume."""
+    allowed: bool
+    remaining: int
+    reset_seconds: int
+
+
+class WindowCounter:
+    """Sliding window counter: counts for the current and previous fixed window."""
+    __slots__ = ("window", "start", "current", "previous")
+    
+    def __init__(self, window: int, now: float, start: Optional[float] = None, current: float = 0.0, previous: float = 0.0):
+        self.window = window
+        self.start = now - (now % window) if start is None else start
+        self.current = current
+        self.previous = previous
+    
+    def _roll(self, now: float):
+        elapsed_windows = int((now - self.start) // self.window)
+        if elapsed_windows >= 1:
+            self.previous = self.current if elapsed_windows == 1 else 0.0
+            self.current = 0.0
+            self.start += elapsed_windows * self.window
+    
+    def estimate(self, now: float) -> float:
+        """Requests in the sliding window ending now."""
+        self._roll(now)
+        overlap = 1.0 - (now - self.start) / self.window
+        return self.previous * overlap + self.current
+    
+    def seconds_until_at_most(self, limit: float, now: float) -> int:
+        """Seconds until the estimate is at most limit (assuming no new requests)."""
+        self._roll(now)
+        limit = max(0.0, limit)
+        window_end = self.start + self.window
+        if self.current <= limit:
+            # prev * (1 - t/window) + cur <= limit, within the current window
+            if self.previous <= 0:
+                return 0
+            fraction = 1.0 - (limit - self.current) / self.previous
+            return max(0, int(self.start + fraction * self.window - now) + 1)
+        # Current window alone is over the limit: wait for it to become "previous"
+        fraction = 1.0 - limit / self.current
+        return int(window_end + fraction * self.window - now) + 1
+    
+    def add(self, amount: float, now: float):
+        self._roll(now)
+        self.current += amount
+    
+    def remove(self, amount: float, now: float):
+        self._roll(now)
+        taken = min(self.current, amount)
+        self.current -= taken
+        self.previous = max(0.0, self.previous - (amount - taken))
+
+
 class UsageRecord:
-    """Tracks usage for a single identifier (IP or user_id)."""
-    hourly_timestamps: list = field(default_factory=list)
-    daily_timestamps: list = field(default_factory=list)
+    """Hourly and daily counters for a single identifier (IP or user_id)."""
+    __slots__ = ("hourly", "daily", "last_seen")
     
+    def __init__(self, now: float, hourly: Optional[WindowCounter] = None, daily: Optional[WindowCounter] = None):
+        self.hourly = hourly or WindowCounter(HOUR_SECONDS, now)
+        self.daily = daily or WindowCounter(DAY_SECONDS, now)
+        self.last_seen = now
+    
+    def consume(self, hourly_limit: float, daily_limit: float, cost: float, now: float) -> RateLimitDecision:
+        """Check both limits and, if allowed, add cost to the counters."""
+        self.last_seen = now
+        hourly_count = self.hourly.estimate(now)
+        daily_count = self.daily.estimate(now)
+        
+        if hourly_count + cost > hourly_limit:
+            # Allowed again once hourly_count + cost <= hourly_limit
+            reset_seconds = self.hourly.seconds_until_at_most(hourly_limit - cost, now)
+            return RateLimitDecision(False, 0, max(1, reset_seconds))
+        
+        if daily_count + cost > daily_limit:
+            reset_seconds = self.daily.seconds_until_at_most(daily_limit - cost, now)
+            return RateLimitDecision(False, 0, max(1, reset_seconds))
+        
+        self.hourly.add(cost, now)
+        self.daily.add(cost, now)
+        remaining = min(hourly_limit - hourly_count, daily_limit - daily_count) - cost
+        return RateLimitDecision(True, max(0, int(remaining)), 0)
+    
+    def adjust(self, amount: float, now: float):
+        """Add amount without checking the limits (negative amounts give units back)."""
+        if amount >= 0:
+            self.hourly.add(amount, now)
+            self.daily.add(amount, now)
+        else:
+            self.hourly.remove(-amount, now)
+            self.daily.remove(-amount, now)
+    
+    def remaining(self, hourly_limit: float, daily_limit: float, now: float) -> RateLimitDecision:
+        """What is left of both limits (allowed while something is left)."""
+        hourly_left = hourly_limit - self.hourly.estimate(now)
+        daily_left = daily_limit - self.daily.estimate(now)
+        if hourly_left <= 0:
+            return RateLimitDecision(False, 0, max(1, self.hourly.seconds_until_at_most(hourly_limit, now)))
+        if daily_left <= 0:
+            return RateLimitDecision(False, 0, max(1, self.daily.seconds_until_at_most(daily_limit, now)))
+        return RateLimitDecision(True, int(min(hourly_left, daily_left)), 0)
 
-class RateLimiter:
-    """Thread-safe in-memory rate limiter with sliding window."""
+
+class _Stripe:
+    __slots__ = ("lock", "records")
     
     def __init__(self):
-        self._usage: Dict[str, Dict[str, UsageRecord]] = defaultdict(
-            lambda: defaultdict(UsageRecord)
-        )
-        self._lock = Lock()
-        self._hour_seconds = 3600
-        self._day_seconds = 86400
+        self.lock = Lock()
+        # Insertion order doubles as LRU order (records are re-inserted on use)
+        self.records: Dict[Tuple[str, str], UsageRecord] = {}
+
+
+class RateLimiter(ABC):
+    """Interface shared by the rate limiter backends."""
     
-    def _clean_old_timestamps(self, timestamps: list, window_seconds: int, now: float) -> list:
-        """Remove timestamps outside the sliding window."""
-        cutoff = now - window_seconds
-        return [ts for ts in timestamps if ts > cutoff]
+    @staticmethod
+    def _limits(endpoint: str, is_premium: bool) -> Optional[Tuple[int, int]]:
+        config = FREE_TIER_LIMITS.get(endpoint)
+        if not config:
+            return None
+        multiplier = PREMIUM_MULTIPLIER if is_premium else 1
+        return config.requests_per_hour * multiplier, config.requests_per_day * multiplier
     
-    def check_rate_limit(
+    def acquire(
         self,
         identifier: str,
         endpoint: str,
-        is_premium: bool = False
-    ) -> Tuple[bool, int, int]:
+        is_premium: bool = False,
+        cost: float = 1
+    ) -> RateLimitDecision:
         """
-        Check if request is allowed under rate limits.
+        Atomically check the limits and, if allowed, consume cost.
         
         Args:
             identifier: IP address or user_id
             endpoint: The endpoint being accessed (e.g., 'download', 'summary')
             is_premium: Whether user has premium tier
+            cost: Units to consume (1 per request)
             
         Returns:
-            Tuple of (allowed: bool, remaining_hourly: int, reset_seconds: int)
+            RateLimitDecision with remaining requests and seconds until reset
         """
-        config = FREE_TIER_LIMITS.get(endpoint)
-        if not config:
+        limits = self._limits(endpoint, is_premium)
+        if not limits:
             # Unknown endpoint, allow by default
-            return True, 999, 0
-        
-        hourly_limit = config.requests_per_hour
-        daily_limit = config.requests_per_day
-        
-        if is_premium:
-            hourly_limit *= PREMIUM_MULTIPLIER
-            daily_limit *= PREMIUM_MULTIPLIER
+            return RateLimitDecision(True, 999, 0)
+        try:
+            return self._acquire(endpoint, identifier, limits[0], limits[1], cost, time.time())
+        except Exception as e:
+            print(f"⚠️ Rate limiter backend error, allowing {endpoint} request: {e}")
+            return RateLimitDecision(True, limits[0], 0)
+    
+    @abstractmethod
+    def _acquire(
+        self,
+        endpoint: str,
+        identifier: str,
+        hourly_limit: int,
+        daily_limit: int,
+        cost: float,
+        now: float
+    ) -> RateLimitDecision:
+        """Backend check-and-consume; must be atomic across its sharing scope."""
+    
+    @abstractmethod
+    def _adjust(self, endpoint: str, identifier: str, amount: float, now: float):
+        """Backend unconditional add (negative amounts give units back)."""
+    
+    def refund(self, identifier: str, endpoint: str, cost: float = 1):
+        """Give back units consumed by acquire (e.g. when the task failed)."""
+        try:
+            self._adjust(endpoint, identifier, -cost, time.time())
+        except Exception as e:
+            print(f"⚠️ Rate limiter backend error, refund of {endpoint} lost: {e}")
+    
+    def charge(self, identifier: str, resource: str, amount: float):
+        """
+        Charge resource usage after the fact (e.g. bytes a download pulled
+        through the proxy). May overdraw the budget; the next check_budget
+        call refuses until it recovers.
+        """
+        if amount > 0 and resource in FREE_TIER_BUDGETS:
+            try:
+                self._adjust(resource, identifier, amount, time.time())
+            except Exception as e:
+                print(f"⚠️ Rate limiter backend error, {resource} charge lost: {e}")
+    
+    def check_budget(self, identifier: str, resource: str, is_premium: bool = False) -> RateLimitDecision:
+        """
+        Remaining budget of a metered resource.
         
+        Returns:
+            RateLimitDecision - allowed while some budget is left, remaining in
+            the resource's unit, reset_seconds until it is available again
+        """
+        config = FREE_TIER_BUDGETS[resource]
+        multiplier = PREMIUM_MULTIPLIER if is_premium else 1
+        hourly_limit, daily_limit = config.per_hour * multiplier, config.per_day * multiplier
         now = time.time()
-        
-        with self._lock:
-            record = self._usage[endpoint][identifier]
-            
-            # Clean old timestamps
-            record.hourly_timestamps = self._clean_old_timestamps(
-                record.hourly_timestamps, self._hour_seconds, now
-            )
-            record.daily_timestamps = self._clean_old_timestamps(
-                record.daily_timestamps, self._day_seconds, now
-            )
-            
-            hourly_count = len(record.hourly_timestamps)
-            daily_count = len(record.daily_timestamps)
-            
-            # Check limits
-            if hourly_count >= hourly_limit:
-                # Calculate reset time (when oldest request expires)
-                oldest = min(record.hourly_timestamps) if record.hourly_timestamps else now
-                reset_seconds = int((oldest + self._hour_seconds) - now)
-                return False, 0, max(1, reset_seconds)
-            
-            if daily_count >= daily_limit:
-                oldest = min(record.daily_timestamps) if record.daily_timestamps else now
-                reset_seconds = int((oldest + self._day_seconds) - now)
-                return False, 0, max(1, reset_seconds)
-            
-            remaining = min(hourly_limit - hourly_count, daily_limit - daily_count) - 1
-            return True, max(0, remaining), 0
+        try:
+            record = self._usage(resource, identifier, now) or UsageRecord(now)
+        except Exception as e:
+            print(f"⚠️ Rate limiter backend error, allowing {resource} use: {e}")
+            return RateLimitDecision(True, int(hourly_limit), 0)
+        return record.remaining(hourly_limit, daily_limit, now)
     
-    def record_request(self, identifier: str, endpoint: str):
-        """Record a successful request for rate limiting."""
-        now = time.time()
+    def check_budgets(self, identifier: str, endpoint: str, is_premium: bool = False) -> Tuple[Optional[RateLimitDecision], Dict[str, str]]:
+        """
+        Check the budgets endpoint draws on.
         
-        with self._lock:
-            record = self._usage[endpoint][identifier]
-            record.hourly_timestamps.append(now)
-            record.daily_timestamps.append(now)
+        Returns:
+            Tuple of (refusal or None, remaining-budget response headers)
+        """
+        refusal = None
+        headers = {}
+        for resource in ENDPOINT_BUDGETS.get(endpoint, ()):
+            decision = self.check_budget(identifier, resource, is_premium)
+            headers[BUDGET_HEADERS[resource]] = str(decision.remaining)
+            if not decision.allowed and (refusal is None or decision.reset_seconds > refusal.reset_seconds):
+                refusal = decision
+        return refusal, headers
+    
+    @abstractmethod
+    def _usage(self, endpoint: str, identifier: str, now: float) -> Optional[UsageRecord]:
+        """Current counters for (endpoint, identifier), or None."""
+    
+    @abstractmethod
+    def evict_idle(self) -> int:
+        """Remove records whose counters have fully expired. Returns how many."""
+    
+    @abstractmethod
+    def get_stats(self) -> Dict:
+        """Limiter size for health/debug endpoints."""
     
     def get_usage_stats(self, identifier: str, endpoint: str) -> Dict:
         """Get current usage statistics for debugging/display."""
@@ -133,26 +340,321 @@ class RateLimiter:
             return {"error": "Unknown endpoint"}
         
         now = time.time()
+        record = self._usage(endpoint, identifier, now)
+        hourly = record.hourly.estimate(now) if record else 0
+        daily = record.daily.estimate(now) if record else 0
         
-        with self._lock:
-            record = self._usage[endpoint][identifier]
-            
-            # Clean and count
-            hourly = self._clean_old_timestamps(
-                record.hourly_timestamps, self._hour_seconds, now
+        return {
+            "endpoint": endpoint,
+            "hourly_used": round(hourly, 2),
+            "hourly_limit": config.requests_per_hour,
+            "daily_used": round(daily, 2),
+            "daily_limit": config.requests_per_day,
+        }
+
+
+class MemoryRateLimiter(RateLimiter):
+    """Thread-safe in-process rate limiter (lock-striped)."""
+    
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self.evicted = 0
+    
+    def _stripe(self, key: Tuple[str, str]) -> _Stripe:
+        return self._stripes[hash(key) % len(self._stripes)]
+    
+    def _evict_idle(self, stripe: _Stripe, now: float, limit: Optional[int] = _EVICTION_BATCH):
+        """Drop records whose counters have fully expired (oldest first). Caller holds the lock."""
+        cutoff = now - 2 * DAY_SECONDS
+        examined = 0
+        while stripe.records and (limit is None or examined < limit):
+            examined += 1
+            key = next(iter(stripe.records))
+            if stripe.records[key].last_seen >= cutoff:
+                break
+            del stripe.records[key]
+            self.evicted += 1
+    
+    def _acquire(self, endpoint, identifier, hourly_limit, daily_limit, cost, now) -> RateLimitDecision:
+        key = (endpoint, identifier)
+        stripe = self._stripe(key)
+        
+        with stripe.lock:
+            record = stripe.records.pop(key, None) or UsageRecord(now)
+            record.last_seen = now
+            stripe.records[key] = record
+            self._evict_idle(stripe, now)
+            return record.consume(hourly_limit, daily_limit, cost, now)
+    
+    def _adjust(self, endpoint, identifier, amount, now):
+        key = (endpoint, identifier)
+        stripe = self._stripe(key)
+        with stripe.lock:
+            record = stripe.records.get(key)
+            if record is None:
+                if amount <= 0:
+                    return
+                record = stripe.records[key] = UsageRecord(now)
+            record.adjust(amount, now)
+    
+    def _usage(self, endpoint, identifier, now) -> Optional[UsageRecord]:
+        key = (endpoint, identifier)
+        stripe = self._stripe(key)
+        with stripe.lock:
+            record = stripe.records.get(key)
+            if record is None:
+                return None
+            # Snapshot - estimates roll the counters, which needs the lock
+            hourly, daily = record.hourly, record.daily
+            return UsageRecord(
+                now,
+                hourly=WindowCounter(hourly.window, now, hourly.start, hourly.current, hourly.previous),
+                daily=WindowCounter(daily.window, now, daily.start, daily.current, daily.previous)
             )
-            daily = self._clean_old_timestamps(
-                record.daily_timestamps, self._day_seconds, now
+    
+    def evict_idle(self) -> int:
+        now = time.time()
+        before = self.evicted
+        for stripe in self._stripes:
+            with stripe.lock:
+                self._evict_idle(stripe, now, limit=None)
+        return self.evicted - before
+    
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "tracked": sum(len(stripe.records) for stripe in self._stripes),
+            "evicted": self.evicted,
+        }
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    endpoint TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    hour_start REAL NOT NULL,
+    hour_current REAL NOT NULL,
+    hour_previous REAL NOT NULL,
+    day_start REAL NOT NULL,
+    day_current REAL NOT NULL,
+    day_previous REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (endpoint, identifier)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_limits_last_seen ON rate_limits(last_seen);
+"""
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Rate limiter backed by a WAL-mode SQLite database.
+    Every uvicorn worker on the host shares the counters; BEGIN IMMEDIATE
+    serializes check-and-consume across processes.
+    """
+    
+    def __init__(self, path: str = RATE_LIMIT_DB_PATH):
+        self.db = SQLiteDatabase(path, _SQLITE_SCHEMA)
+    
+    @staticmethod
+    def _record(row, now: float) -> UsageRecord:
+        return UsageRecord(
+            now,
+            hourly=WindowCounter(HOUR_SECONDS, now, row["hour_start"], row["hour_current"], row["hour_previous"]),
+            daily=WindowCounter(DAY_SECONDS, now, row["day_start"], row["day_current"], row["day_previous"])
+        )
+    
+    @staticmethod
+    def _load(conn, endpoint: str, identifier: str):
+        return conn.execute(
+            "SELECT * FROM rate_limits WHERE endpoint = ? AND identifier = ?",
+            (endpoint, identifier)
+        ).fetchone()
+    
+    @staticmethod
+    def _save(conn, endpoint: str, identifier: str, record: UsageRecord):
+        conn.execute(
+            "INSERT OR REPLACE INTO rate_limits "
+            "(endpoint, identifier, hour_start, hour_current, hour_previous, "
+            "day_start, day_current, day_previous, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                endpoint, identifier,
+                record.hourly.start, record.hourly.current, record.hourly.previous,
+                record.daily.start, record.daily.current, record.daily.previous,
+                record.last_seen,
             )
-            
-            return {
-                "endpoint": endpoint,
-                "hourly_used": len(hourly),
-                "hourly_limit": config.requests_per_hour,
-                "daily_used": len(daily),
-                "daily_limit": config.requests_per_day,
-            }
+        )
+    
+    def _acquire(self, endpoint, identifier, hourly_limit, daily_limit, cost, now) -> RateLimitDecision:
+        with self.db.transaction() as conn:
+            row = self._load(conn, endpoint, identifier)
+            record = self._record(row, now) if row else UsageRecord(now)
+            decision = record.consume(hourly_limit, daily_limit, cost, now)
+            if decision.allowed or row is None:
+                self._save(conn, endpoint, identifier, record)
+            return decision
+    
+    def _adjust(self, endpoint, identifier, amount, now):
+        with self.db.transaction() as conn:
+            row = self._load(conn, endpoint, identifier)
+            if row is None and amount <= 0:
+                return
+            record = self._record(row, now) if row else UsageRecord(now)
+            record.adjust(amount, now)
+            self._save(conn, endpoint, identifier, record)
+    
+    def _usage(self, endpoint, identifier, now) -> Optional[UsageRecord]:
+        row = self._load(self.db.connection(), endpoint, identifier)
+        return self._record(row, now) if row else None
+    
+    def evict_idle(self) -> int:
+        cutoff = time.time() - 2 * DAY_SECONDS
+        return self.db.execute("DELETE FROM rate_limits WHERE last_seen < ?", (cutoff,)).rowcount
+    
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "sqlite",
+            "tracked": self.db.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0],
+        }
+
+
+# Same algorithm as WindowCounter/UsageRecord.consume, run atomically by Redis.
+# KEYS[1] = counter hash; ARGV = now, cost, hourly_limit, daily_limit, ttl_ms
+_REDIS_ACQUIRE = """
+local function roll(start, current, previous, window, now)
+    local elapsed = math.floor((now - start) / window)
+    if elapsed >= 1 then
+        if elapsed == 1 then previous = current else previous = 0 end
+        current = 0
+        start = start + elapsed * window
+    end
+    return start, current, previous
+end
+
+local function until_at_most(start, current, previous, window, limit, now)
+    limit = math.max(0, limit)
+    if current <= limit then
+        if previous <= 0 then return 0 end
+        local fraction = 1 - (limit - current) / previous
+        return math.max(0, math.floor(start + fraction * window - now) + 1)
+    end
+    local fraction = 1 - limit / current
+    return math.floor(start + window + fraction * window - now) + 1
+end
+
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local hourly_limit = tonumber(ARGV[3])
+local daily_limit = tonumber(ARGV[4])
+
+local v = redis.call('HMGET', KEYS[1], 'hs', 'hc', 'hp', 'ds', 'dc', 'dp')
+local hs, hc, hp = roll(tonumber(v[1]) or (now - now % 3600), tonumber(v[2]) or 0, tonumber(v[3]) or 0, 3600, now)
+local ds, dc, dp = roll(tonumber(v[4]) or (now - now % 86400), tonumber(v[5]) or 0, tonumber(v[6]) or 0, 86400, now)
+
+local hourly = hp * (1 - (now - hs) / 3600) + hc
+local daily = dp * (1 - (now - ds) / 86400) + dc
+
+if hourly + cost > hourly_limit then
+    return {0, 0, math.max(1, until_at_most(hs, hc, hp, 3600, hourly_limit - cost, now))}
+end
+if daily + cost > daily_limit then
+    return {0, 0, math.max(1, until_at_most(ds, dc, dp, 86400, daily_limit - cost, now))}
+end
+
+redis.call('HSET', KEYS[1], 'hs', hs, 'hc', hc + cost, 'hp', hp, 'ds', ds, 'dc', dc + cost, 'dp', dp)
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+local remaining = math.min(hourly_limit - hourly, daily_limit - daily) - cost
+return {1, math.max(0, math.floor(remaining)), 0}
+"""
+
+# Same as UsageRecord.adjust. KEYS[1] = counter hash; ARGV = now, amount, ttl_ms
+_REDIS_ADJUST = """
+local v = redis.call('HMGET', KEYS[1], 'hs', 'hc', 'hp', 'ds', 'dc', 'dp')
+local now = tonumber(ARGV[1])
+local amount = tonumber(ARGV[2])
+if not v[1] and amount <= 0 then return 0 end
+
+local function adjust(start, current, previous, window)
+    local elapsed = math.floor((now - start) / window)
+    if elapsed >= 1 then
+        if elapsed == 1 then previous = current else previous = 0 end
+        current = 0
+        start = start + elapsed * window
+    end
+    if amount >= 0 then
+        return start, current + amount, previous
+    end
+    local taken = math.min(current, -amount)
+    return start, current - taken, math.max(0, previous - (-amount - taken))
+end
+
+local hs, hc, hp = adjust(tonumber(v[1]) or (now - now % 3600), tonumber(v[2]) or 0, tonumber(v[3]) or 0, 3600)
+local ds, dc, dp = adjust(tonumber(v[4]) or (now - now % 86400), tonumber(v[5]) or 0, tonumber(v[6]) or 0, 86400)
+redis.call('HSET', KEYS[1], 'hs', hs, 'hc', hc, 'hp', hp, 'ds', ds, 'dc', dc, 'dp', dp)
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Rate limiter backed by Redis, shared by every API host.
+    Check-and-consume is one EVALSHA round trip; idle keys expire on their own.
+    """
+    
+    def __init__(self, url: str = REDIS_URL, prefix: str = "vtool:rl:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "RATE_LIMIT_BACKEND=redis requires the redis package (pip install -r requirements.txt)"
+            ) from e
+        
+        self._redis = redis.Redis.from_url(url, socket_timeout=1)
+        self._acquire_script = self._redis.register_script(_REDIS_ACQUIRE)
+        self._adjust_script = self._redis.register_script(_REDIS_ADJUST)
+        self.prefix = prefix
+    
+    def _key(self, endpoint: str, identifier: str) -> str:
+        return f"{self.prefix}{endpoint}:{identifier}"
+    
+    def _acquire(self, endpoint, identifier, hourly_limit, daily_limit, cost, now) -> RateLimitDecision:
+        allowed, remaining, reset_seconds = self._acquire_script(
+            keys=[self._key(endpoint, identifier)],
+            args=[now, cost, hourly_limit, daily_limit, 2 * DAY_SECONDS * 1000]
+        )
+        return RateLimitDecision(bool(allowed), int(remaining), int(reset_seconds))
+    
+    def _adjust(self, endpoint, identifier, amount, now):
+        self._adjust_script(keys=[self._key(endpoint, identifier)], args=[now, amount, 2 * DAY_SECONDS * 1000])
+    
+    def _usage(self, endpoint, identifier, now) -> Optional[UsageRecord]:
+        values = self._redis.hmget(self._key(endpoint, identifier), "hs", "hc", "hp", "ds", "dc", "dp")
+        if values[0] is None:
+            return None
+        hs, hc, hp, ds, dc, dp = (float(value) for value in values)
+        return UsageRecord(
+            now,
+            hourly=WindowCounter(HOUR_SECONDS, now, hs, hc, hp),
+            daily=WindowCounter(DAY_SECONDS, now, ds, dc, dp)
+        )
+    
+    def evict_idle(self) -> int:
+        # Keys carry a TTL
+        return 0
+    
+    def get_stats(self) -> Dict:
+        return {"backend": "redis"}
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the rate limiter selected by RATE_LIMIT_BACKEND."""
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryRateLimiter()
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter()
+    return SQLiteRateLimiter()
 
 
 # Global rate limiter instance
-rate_limiter = RateLimiter()
+rate_limiter = create_rate_limiter()
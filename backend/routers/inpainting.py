@@ -14,6 +14,7 @@ import ssl
 # Import rate limiter
 from rate_limiter import rate_limiter
 from auth import get_current_user, get_client_ip
+from workers import timed
 
 # Bypass SSL verification for model download
 try:
@@ -93,26 +94,42 @@ async def _check_inpainting_rate_limit(request: Request) -> JSONResponse | None:
         identifier = f"ip:{get_client_ip(request)}"
         is_premium = False
     
-    allowed, remaining, reset_seconds = rate_limiter.check_rate_limit(
-        identifier, "inpainting", is_premium
-    )
+    decision = await asyncio.to_thread(rate_limiter.acquire, identifier, "inpainting", is_premium)
     
-    if not allowed:
+    if not decision.allowed:
         return JSONResponse(
             status_code=429,
             content={
                 "error": "Rate limit exceeded",
-                "message": f"Too many requests. Please wait {reset_seconds} seconds.",
-                "retry_after": reset_seconds
+                "message": f"Too many requests. Please wait {decision.reset_seconds} seconds.",
+                "retry_after": decision.reset_seconds
             },
             headers={
                 "X-RateLimit-Remaining": "0",
-                "X-RateLimit-Reset": str(reset_seconds),
-                "Retry-After": str(reset_seconds)
+                "X-RateLimit-Reset": str(decision.reset_seconds),
+                "Retry-After": str(decision.reset_seconds)
             }
         )
     
-    rate_limiter.record_request(identifier, "inpainting")
+    refusal, budget_headers = await asyncio.to_thread(rate_limiter.check_budgets, identifier, "inpainting", is_premium)
+    if refusal:
+        await asyncio.to_thread(rate_limiter.refund, identifier, "inpainting")
+        return JSONResponse(
+            status_code=429,
+            content={
+                "error": "Usage budget exceeded",
+                "message": f"Usage budget used up. Please wait {refusal.reset_seconds} seconds.",
+                "retry_after": refusal.reset_seconds
+            },
+            headers={
+                **budget_headers,
+                "X-RateLimit-Reset": str(refusal.reset_seconds),
+                "Retry-After": str(refusal.reset_seconds)
+            }
+        )
+    
+    request.state.rate_limit = {"identifier": identifier, "endpoint": "inpainting"}
+    request.state.rate_limit_headers = {"X-RateLimit-Remaining": str(decision.remaining), **budget_headers}
     return None
 
 
@@ -140,10 +157,11 @@ async def remove_object(
 
         # Process in thread pool
         loop = asyncio.get_event_loop()
-        result_bytes = await loop.run_in_executor(
+        result_bytes, seconds = await loop.run_in_executor(
             None,
-            functools.partial(_process_inpainting, image_bytes, mask_bytes)
+            functools.partial(timed, _process_inpainting, image_bytes, mask_bytes)
         )
+        await asyncio.to_thread(rate_limiter.charge, request.state.rate_limit["identifier"], "cpu_seconds", seconds)
 
         return StreamingResponse(
             io.BytesIO(result_bytes),
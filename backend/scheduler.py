@@ -0,0 +1,238 @@
+"""
+Task scheduler for V-Tool API.
+Sits in front of the task processors, wherever tasks run (the API process
+with TASK_EXECUTION=inline, each worker with TASK_EXECUTION=queue):
+
+- Task types map to resource classes (cheap lookups, network-bound
+  downloads, CPU-bound separation), each with its own concurrency slots, so
+  a burst of audio tasks can't starve spy/summary lookups.
+- Within a class, waiting tasks are ordered by weighted fair queuing
+  between user tiers (premium > authenticated > anonymous): each tier's
+  tasks get virtual finish tags advancing by expected duration / weight.
+- Expected durations are an EWMA per task type, which also gives every new
+  task an estimated queue wait.
+
+With TASK_EXECUTION=queue the waiting happens in the job queue instead:
+workers only claim jobs of classes with a free slot, in the same weighted
+fair order (tags kept in the queue database, see JobQueue.enqueue), and
+estimate_wait() prices the queued backlog.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import SCHEDULER_CLASS_SLOTS, SCHEDULER_TIER_WEIGHTS
+
+
+# Resource class of each task type
+TASK_CLASSES = {
+    "spy": "lookup",
+    "summary": "lookup",
+    "download": "network",
+    "slideshow": "network",
+    "audio": "cpu",
+}
+
+# Starting point for the per-type duration EWMA (seconds)
+DEFAULT_SERVICE_SECONDS = {
+    "spy": 3.0,
+    "summary": 8.0,
+    "download": 30.0,
+    "slideshow": 15.0,
+    "audio": 120.0,
+}
+
+_EWMA_ALPHA = 0.2
+
+
+def user_tier(user) -> str:
+    """Scheduling tier of an auth.User (or None for anonymous requests)."""
+    if user is None:
+        return "anonymous"
+    return "premium" if user.is_premium else "authenticated"
+
+
+@dataclass(eq=False)
+class Ticket:
+    """A task's place in the scheduler."""
+    task_id: str
+    task_type: str
+    tier: str
+    resource_class: str
+    expected_seconds: float
+    tag: float = 0.0
+    queue_position: int = 0
+    estimated_wait_seconds: float = 0.0
+    started_at: Optional[float] = None
+    cancelled: bool = False
+    ready: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class _ResourceClass:
+    """Slots and the fair queue of one resource class."""
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(1, slots)
+        self.running: List[Ticket] = []
+        self.heap: list = []
+        self.virtual_time = 0.0
+        self.tier_finish: Dict[str, float] = {}
+        self.waiting = 0
+
+
+class TaskScheduler:
+    """Weighted fair scheduler with per-class concurrency slots."""
+
+    def __init__(
+        self,
+        class_slots: Optional[Dict[str, int]] = None,
+        tier_weights: Optional[Dict[str, float]] = None
+    ):
+        slots = class_slots if class_slots is not None else SCHEDULER_CLASS_SLOTS
+        self.tier_weights = tier_weights if tier_weights is not None else SCHEDULER_TIER_WEIGHTS
+        self._classes = {name: _ResourceClass(name, n) for name, n in slots.items()}
+        self._service_seconds = dict(DEFAULT_SERVICE_SECONDS)
+        self._seq = itertools.count()
+        self._background: set = set()
+        self.completed = 0
+
+    def _class_of(self, task_type: str) -> _ResourceClass:
+        return self._classes[TASK_CLASSES.get(task_type, "network")]
+
+    @staticmethod
+    def task_types(class_name: str) -> List[str]:
+        """Task types that run in a resource class."""
+        return [task_type for task_type, name in TASK_CLASSES.items() if name == class_name]
+
+    def free_classes(self) -> List[str]:
+        """Resource classes that can start a task right away."""
+        return [name for name, cls in self._classes.items() if len(cls.running) + cls.waiting < cls.slots]
+
+    def expected_seconds(self, task_type: str) -> float:
+        """Current duration estimate of a task type (the cost of a fair queuing tag)."""
+        return self._service_seconds.get(task_type, 30.0)
+
+    def estimate_wait(self, task_type: str, ahead: Dict[str, int], running: int, workers: int = 1) -> float:
+        """
+        Expected queue wait of a task with ahead[type] tasks queued before it
+        and running tasks in progress in its class, spread over workers.
+        """
+        cls = self._class_of(task_type)
+        capacity = cls.slots * max(1, workers)
+        if running + sum(ahead.values()) < capacity:
+            return 0.0
+        expected = self._service_seconds.get(task_type, 30.0)
+        # Running tasks are on average half done
+        work = sum(count * self._service_seconds.get(t, 30.0) for t, count in ahead.items()) + running * expected / 2
+        return round(work / capacity, 1)
+
+    def admit(self, task_id: str, task_type: str, tier: str = "anonymous") -> Ticket:
+        """
+        Queue a task and estimate its wait. Must be called on the event loop.
+
+        Returns:
+            Ticket to pass to run()
+        """
+        cls = self._class_of(task_type)
+        expected = self._service_seconds.get(task_type, 30.0)
+        ticket = Ticket(
+            task_id=task_id,
+            task_type=task_type,
+            tier=tier,
+            resource_class=cls.name,
+            expected_seconds=expected,
+            ready=asyncio.get_running_loop().create_future()
+        )
+
+        # Start-time fair queuing: a tier's tags advance by cost / weight
+        weight = self.tier_weights.get(tier, 1.0)
+        start = max(cls.virtual_time, cls.tier_finish.get(tier, 0.0))
+        ticket.tag = start + expected / weight
+        cls.tier_finish[tier] = ticket.tag
+
+        if len(cls.running) < cls.slots and cls.waiting == 0:
+            self._start(cls, ticket)
+            return ticket
+
+        # Work queued ahead of this ticket plus what is left of the running tasks
+        ahead = [t for _, _, t in cls.heap if not t.cancelled and t.tag <= ticket.tag]
+        now = time.monotonic()
+        remaining = sum(max(0.0, t.expected_seconds - (now - t.started_at)) for t in cls.running)
+        ticket.queue_position = len(ahead) + 1
+        ticket.estimated_wait_seconds = round(
+            (remaining + sum(t.expected_seconds for t in ahead)) / cls.slots, 1
+        )
+        heapq.heappush(cls.heap, (ticket.tag, next(self._seq), ticket))
+        cls.waiting += 1
+        return ticket
+
+    def _start(self, cls: _ResourceClass, ticket: Ticket):
+        cls.virtual_time = max(cls.virtual_time, ticket.tag - ticket.expected_seconds / self.tier_weights.get(ticket.tier, 1.0))
+        ticket.started_at = time.monotonic()
+        cls.running.append(ticket)
+        ticket.ready.set_result(None)
+
+    def _dispatch(self, cls: _ResourceClass):
+        while len(cls.running) < cls.slots and cls.heap:
+            _, _, ticket = heapq.heappop(cls.heap)
+            if ticket.cancelled:
+                continue
+            cls.waiting -= 1
+            self._start(cls, ticket)
+
+    def _release(self, ticket: Ticket):
+        cls = self._classes[ticket.resource_class]
+        cls.running.remove(ticket)
+        elapsed = time.monotonic() - ticket.started_at
+        previous = self._service_seconds.get(ticket.task_type, elapsed)
+        self._service_seconds[ticket.task_type] = (1 - _EWMA_ALPHA) * previous + _EWMA_ALPHA * elapsed
+        self.completed += 1
+        self._dispatch(cls)
+
+    async def run(self, ticket: Ticket, fn: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """Wait for the ticket's turn, then run fn(*args, **kwargs) in its slot."""
+        try:
+            await ticket.ready
+        except asyncio.CancelledError:
+            if ticket.started_at is None:
+                ticket.cancelled = True
+                self._classes[ticket.resource_class].waiting -= 1
+            else:
+                self._release(ticket)
+            raise
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            self._release(ticket)
+
+    def submit(self, task_id: str, task_type: str, tier: str, fn: Callable[..., Awaitable], *args) -> Ticket:
+        """admit() and run fn in the background when its turn comes."""
+        ticket = self.admit(task_id, task_type, tier)
+        task = asyncio.create_task(self.run(ticket, fn, *args))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return ticket
+
+    def size(self) -> int:
+        """Tasks waiting or running."""
+        return sum(cls.waiting + len(cls.running) for cls in self._classes.values())
+
+    def get_stats(self) -> dict:
+        """Per-class load and expected durations for health/debug endpoints."""
+        return {
+            "classes": {
+                name: {"slots": cls.slots, "running": len(cls.running), "waiting": cls.waiting}
+                for name, cls in self._classes.items()
+            },
+            "expected_seconds": {name: round(value, 1) for name, value in self._service_seconds.items()},
+            "completed": self.completed,
+        }
+
+
+# Global task scheduler instance
+scheduler = TaskScheduler()
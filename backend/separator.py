@@ -0,0 +1,442 @@
+"""
+Vocal separation service for V-Tool API.
+A long-lived worker process loads the Demucs model once and separates jobs
+from a queue, instead of starting the demucs CLI (Python + torch start-up
+and model load) for every audio task.
+
+The worker runs up to SEPARATOR_MAX_JOBS separations at a time sharing the
+model, with torch limited to SEPARATOR_THREADS threads. Callers beyond that
+wait on a semaphore holding only file paths, so memory stays bounded however
+many audio tasks are queued. If the worker can't start (demucs not
+installed) or SEPARATOR_MODE=cli, the CLI is used instead.
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+from audio_pipeline import SharedAudio, encode_mp3
+from config import (
+    DOWNLOAD_DIR,
+    SEPARATOR_MODE,
+    SEPARATOR_MODEL,
+    SEPARATOR_THREADS,
+    SEPARATOR_MAX_JOBS,
+    SEPARATOR_JOB_TIMEOUT,
+)
+
+
+class SeparationError(Exception):
+    """Raised when a separation job fails."""
+
+
+@dataclass
+class SeparationResult:
+    """Output of one separation job."""
+    vocals_path: str
+    instrumental_path: str
+    audio_seconds: float = 0.0
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def cpu_seconds(self) -> float:
+        """Seconds of decode/separate/encode work (queue wait excluded)."""
+        busy = sum(self.timings.get(stage, 0.0) for stage in ("decode", "separate", "encode"))
+        return busy or self.timings.get("total", 0.0)
+
+
+def _worker_main(jobs, results, model_name: str, threads: int, max_jobs: int):
+    """Entry point of the separation process (spawned, so torch is imported here only)."""
+    started = time.perf_counter()
+    try:
+        import numpy as np
+        import torch
+        from concurrent.futures import ThreadPoolExecutor
+        from demucs.apply import apply_model
+        from demucs.audio import AudioFile, convert_audio
+        from demucs.pretrained import get_model
+
+        torch.set_num_threads(threads)
+        model = get_model(model_name)
+        model.eval()
+    except Exception as e:
+        results.put(("ready", None, {"error": repr(e)}))
+        return
+    results.put(("ready", None, {"load_seconds": time.perf_counter() - started}))
+
+    # ffmpeg encodes run as subprocesses, so both stems encode in parallel
+    encoders = ThreadPoolExecutor(max_workers=2 * max_jobs)
+
+    def load(input_path: str, audio: Optional[SharedAudio]):
+        """Channel-first tensor at the model's rate, from shared PCM or the file."""
+        if audio is None:
+            return AudioFile(input_path).read(
+                streams=0, samplerate=model.samplerate, channels=model.audio_channels
+            )
+        pcm = np.memmap(audio.pcm_path, dtype=np.float32, mode="r", shape=(audio.frames, audio.channels))
+        try:
+            wav = torch.from_numpy(pcm.T.copy())
+        finally:
+            del pcm
+        return convert_audio(wav, audio.sample_rate, model.samplerate, model.audio_channels)
+
+    def encode(source, path: str, bitrate: int):
+        # Same clipping as demucs' save_audio(clip="rescale")
+        source = source / max(1.01 * source.abs().max().item(), 1)
+        pcm = source.T.contiguous().numpy().reshape(-1)
+        encode_mp3(memoryview(pcm).cast("B"), path, bitrate, model.samplerate, model.audio_channels)
+
+    def separate(job_id, input_path, audio, vocals_path, instrumental_path, bitrate, queued_at):
+        timings = {"queue_wait": time.time() - queued_at}
+        try:
+            t0 = time.perf_counter()
+            wav = load(input_path, audio)
+            ref = wav.mean(0)
+            wav = (wav - ref.mean()) / ref.std()
+            timings["decode"] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            with torch.no_grad():
+                sources = apply_model(model, wav[None], device="cpu", split=True, overlap=0.25, progress=False)[0]
+            sources = sources * ref.std() + ref.mean()
+            timings["separate"] = time.perf_counter() - t0
+
+            # --two-stems vocals: vocals + the sum of every other source
+            t0 = time.perf_counter()
+            vocals_index = model.sources.index("vocals")
+            vocals = sources[vocals_index]
+            instrumental = sum(source for i, source in enumerate(sources) if i != vocals_index)
+            pending = [
+                encoders.submit(encode, vocals, vocals_path, bitrate),
+                encoders.submit(encode, instrumental, instrumental_path, bitrate),
+            ]
+            for future in pending:
+                future.result()
+            timings["encode"] = time.perf_counter() - t0
+
+            audio_seconds = wav.shape[-1] / model.samplerate
+            results.put(("done", job_id, {"audio_seconds": audio_seconds, "timings": timings}))
+        except Exception as e:
+            results.put(("error", job_id, {"error": repr(e), "timings": timings}))
+
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            executor.submit(separate, *job)
+    encoders.shutdown()
+
+
+class SeparatorService:
+    """Parent-side handle of the separation worker process."""
+
+    # Seconds of wall time per second of audio, until real jobs have been measured
+    DEFAULT_REALTIME_FACTOR = 0.5
+
+    def __init__(
+        self,
+        model_name: str = SEPARATOR_MODEL,
+        threads: int = SEPARATOR_THREADS,
+        max_jobs: int = SEPARATOR_MAX_JOBS
+    ):
+        self.model_name = model_name
+        self.threads = threads
+        self.max_jobs = max_jobs
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._process = None
+        self._jobs = None
+        self._results = None
+        self._ready: Optional[Future] = None
+        self._pending: Dict[int, Future] = {}
+        self._job_ids = itertools.count(1)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.available = SEPARATOR_MODE != "cli"
+
+        # Stats
+        self.load_seconds = None
+        self.restarts = 0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.cli_jobs = 0
+        self.last_timings: Dict[str, float] = {}
+        self._timing_totals: Dict[str, float] = {}
+        self.realtime_factor = self.DEFAULT_REALTIME_FACTOR
+
+    # ---- process management -------------------------------------------------
+
+    def start(self) -> Future:
+        """Start the worker process (no-op if running). Returns the readiness future."""
+        with self._lock:
+            if self._process is not None and self._process.is_alive():
+                return self._ready
+            if self._process is not None:
+                self.restarts += 1
+            self._jobs = self._ctx.Queue()
+            self._results = self._ctx.Queue()
+            self._ready = Future()
+            # Each worker generation has its own pending map, so a dying worker
+            # only fails the jobs that were sent to it
+            self._pending = {}
+            self._process = self._ctx.Process(
+                target=_worker_main,
+                args=(self._jobs, self._results, self.model_name, self.threads, self.max_jobs),
+                name="demucs-separator",
+                daemon=True
+            )
+            self._process.start()
+            threading.Thread(
+                target=self._read_results,
+                args=(self._process, self._results, self._ready, self._pending),
+                name="demucs-separator-results",
+                daemon=True
+            ).start()
+            return self._ready
+
+    def _read_results(self, process, results, ready: Future, pending: Dict[int, Future]):
+        """Resolve job futures from the worker's result queue until it exits."""
+        while True:
+            try:
+                kind, job_id, payload = results.get(timeout=1.0)
+            except queue.Empty:
+                if not process.is_alive():
+                    break
+                continue
+
+            if kind == "ready":
+                if "error" in payload:
+                    print(f"⚠️ Separation worker unavailable ({payload['error']}) - using demucs CLI")
+                    self.available = False
+                    ready.set_result(False)
+                else:
+                    self.load_seconds = payload["load_seconds"]
+                    print(f"🎛️ Separation worker ready ({self.model_name} loaded in {self.load_seconds:.1f}s)")
+                    ready.set_result(True)
+                continue
+
+            future = pending.pop(job_id, None)
+            if future is None:
+                continue
+            if kind == "done":
+                future.set_result(payload)
+            else:
+                future.set_exception(SeparationError(payload["error"]))
+
+        # Worker died: fail whatever it was working on; the next job restarts it
+        if not ready.done():
+            ready.set_result(False)
+        for job_id in list(pending):
+            future = pending.pop(job_id, None)
+            if future is not None and not future.done():
+                future.set_exception(SeparationError("Separation worker exited"))
+
+    def _kill(self):
+        with self._lock:
+            process, self._process = self._process, None
+        if process is not None:
+            self.restarts += 1
+            process.terminate()
+
+    def shutdown(self):
+        """Stop the worker process."""
+        with self._lock:
+            process, self._process = self._process, None
+            if process is None:
+                return
+            try:
+                self._jobs.put(None)
+            except Exception:
+                pass
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+    # ---- jobs ---------------------------------------------------------------
+
+    async def separate(
+        self,
+        input_path: str,
+        vocals_path: str,
+        instrumental_path: str,
+        bitrate: int = 320,
+        duration: Optional[float] = None,
+        on_progress: Optional[Callable[[float], None]] = None,
+        audio: Optional[SharedAudio] = None
+    ) -> SeparationResult:
+        """
+        Split a track into vocals and instrumental MP3s.
+
+        Args:
+            input_path: Audio file to separate
+            vocals_path: Where to write the vocals MP3
+            instrumental_path: Where to write the instrumental MP3
+            bitrate: MP3 bitrate in kbps
+            duration: Track length in seconds, used to estimate progress
+            on_progress: Called with an estimated fraction (0..1) while separating
+            audio: Already decoded PCM of input_path; the worker maps its PCM
+                file instead of decoding the input again (must stay
+                alive until this returns)
+
+        Raises:
+            SeparationError: If the separation failed
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_jobs)
+
+        async with self._semaphore:
+            try:
+                if self.available and await asyncio.wrap_future(self.start()):
+                    return await self._separate_in_worker(
+                        input_path, audio, vocals_path, instrumental_path, bitrate, duration, on_progress
+                    )
+                return await self._separate_with_cli(
+                    input_path, vocals_path, instrumental_path, bitrate, on_progress
+                )
+            except SeparationError:
+                # Don't leave half-written stems behind
+                for path in (vocals_path, instrumental_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+
+    async def _separate_in_worker(self, input_path, audio, vocals_path, instrumental_path, bitrate, duration, on_progress):
+        job_id = next(self._job_ids)
+        future: Future = Future()
+        with self._lock:
+            pending, jobs = self._pending, self._jobs
+        pending[job_id] = future
+        started = time.monotonic()
+        jobs.put((job_id, input_path, audio, vocals_path, instrumental_path, bitrate, time.time()))
+
+        expected = (duration or (audio.duration if audio else 0)) * self.realtime_factor
+        wrapped = asyncio.wrap_future(future)
+        try:
+            while True:
+                done, _ = await asyncio.wait({wrapped}, timeout=1.0)
+                if done:
+                    break
+                elapsed = time.monotonic() - started
+                if elapsed > SEPARATOR_JOB_TIMEOUT:
+                    # A stuck job would hold a slot forever - recycle the worker
+                    pending.pop(job_id, None)
+                    self._kill()
+                    raise SeparationError(f"Separation timed out after {SEPARATOR_JOB_TIMEOUT}s")
+                if on_progress and expected:
+                    on_progress(min(elapsed / expected, 0.95))
+            payload = wrapped.result()
+        except SeparationError:
+            self.jobs_failed += 1
+            raise
+
+        self._record(payload["timings"], payload["audio_seconds"], time.monotonic() - started)
+        return SeparationResult(
+            vocals_path=vocals_path,
+            instrumental_path=instrumental_path,
+            audio_seconds=payload["audio_seconds"],
+            timings=payload["timings"]
+        )
+
+    def _record(self, timings: Dict[str, float], audio_seconds: float, total: float):
+        timings["total"] = total
+        self.jobs_done += 1
+        self.last_timings = {name: round(value, 3) for name, value in timings.items()}
+        for name, value in timings.items():
+            self._timing_totals[name] = self._timing_totals.get(name, 0.0) + value
+        if audio_seconds:
+            # EWMA of wall time per audio second, for progress estimates
+            factor = (timings.get("decode", 0) + timings.get("separate", 0) + timings.get("encode", 0)) / audio_seconds
+            self.realtime_factor = 0.8 * self.realtime_factor + 0.2 * factor
+
+    async def _separate_with_cli(self, input_path, vocals_path, instrumental_path, bitrate, on_progress):
+        """Fallback: run the demucs CLI (one process and model load per job)."""
+        self.cli_jobs += 1
+        output_dir = os.path.join(DOWNLOAD_DIR, "demucs")
+        cmd = [
+            "demucs",
+            "-n", self.model_name,
+            "--two-stems", "vocals",
+            "--mp3",
+            "--mp3-bitrate", str(bitrate),
+            input_path,
+            "-o", output_dir
+        ]
+        started = time.monotonic()
+        # stdout is unused; stderr carries the progress bar
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr = await _read_cli_progress(process.stderr, on_progress)
+        await process.wait()
+        if process.returncode != 0:
+            self.jobs_failed += 1
+            raise SeparationError(stderr)
+
+        track_dir = os.path.join(output_dir, self.model_name, os.path.splitext(os.path.basename(input_path))[0])
+        try:
+            os.replace(os.path.join(track_dir, "vocals.mp3"), vocals_path)
+            os.replace(os.path.join(track_dir, "no_vocals.mp3"), instrumental_path)
+        except FileNotFoundError as e:
+            self.jobs_failed += 1
+            raise SeparationError(f"demucs output missing: {e}")
+        finally:
+            shutil.rmtree(track_dir, ignore_errors=True)
+
+        timings: Dict[str, float] = {}
+        self._record(timings, 0.0, time.monotonic() - started)
+        return SeparationResult(vocals_path=vocals_path, instrumental_path=instrumental_path, timings=timings)
+
+    def get_stats(self) -> dict:
+        """Worker state and per-job timings for health/debug endpoints."""
+        done = self.jobs_done or 1
+        return {
+            "mode": "worker" if self.available else "cli",
+            "model": self.model_name,
+            "running": self._process is not None and self._process.is_alive(),
+            "threads": self.threads,
+            "max_jobs": self.max_jobs,
+            "model_load_seconds": round(self.load_seconds, 3) if self.load_seconds else None,
+            "restarts": self.restarts,
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+            "cli_jobs": self.cli_jobs,
+            "in_flight": len(self._pending),
+            "last_job": self.last_timings,
+            "avg_job": {name: round(total / done, 3) for name, total in self._timing_totals.items()},
+        }
+
+
+_CLI_PERCENT_RE = re.compile(rb'(\d{1,3})%\|')
+
+
+async def _read_cli_progress(stream: asyncio.StreamReader, on_progress: Optional[Callable[[float], None]]) -> str:
+    """
+    Follow demucs' tqdm progress bar on stderr, reporting fractions to
+    on_progress. Returns the tail of stderr for error reporting.
+    """
+    output = bytearray()
+    while True:
+        chunk = await stream.read(4096)
+        if not chunk:
+            break
+        output.extend(chunk)
+        matches = _CLI_PERCENT_RE.findall(chunk)
+        if matches and on_progress:
+            on_progress(min(int(matches[-1]), 100) / 100)
+    # tqdm redraws its bar many times - keep the tail
+    return output[-4000:].decode(errors="replace")
+
+
+# Global separation service
+separator = SeparatorService()
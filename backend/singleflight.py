@@ -0,0 +1,56 @@
+"""
+Single-flight helper for V-Tool API.
+Collapses concurrent calls for the same key into one execution.
+Callers that arrive while a call is in flight wait for its result instead of
+repeating the work (used for yt-dlp extraction and downloads).
+"""
+
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """Thread-safe duplicate call suppression keyed by string."""
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers of the same key.
+
+        Args:
+            key: Identity of the work being performed
+            fn: Zero-argument callable doing the work
+
+        Returns:
+            Tuple of (result, shared: bool) where shared is True if the
+            result came from another caller's in-flight execution
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Number of keys currently being executed."""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,215 @@
+"""
+Slideshow image fetching and packaging for V-Tool API.
+Images are fetched concurrently (bounded by SLIDESHOW_FETCH_CONCURRENCY)
+over the shared TikTok CDN client pool, each with its own timeout and retries.
+ZIP entries keep the original image order; already-compressed formats are
+stored instead of deflated. ZIPs are either written to disk or streamed
+to the client as they are built (SLIDESHOW_DELIVERY).
+"""
+
+import asyncio
+import time
+import zipfile
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, List, Optional
+
+import httpx
+
+from config import (
+    SLIDESHOW_FETCH_CONCURRENCY,
+    SLIDESHOW_IMAGE_TIMEOUT,
+    SLIDESHOW_IMAGE_RETRIES,
+)
+from http_clients import http_clients
+
+
+# Formats whose payload is already compressed - deflating them wastes CPU
+_STORED_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif", "heic", "avif"}
+
+
+@dataclass
+class FetchedImage:
+    """One downloaded slideshow image."""
+    index: int
+    content: bytes
+    ext: str
+
+    @property
+    def filename(self) -> str:
+        return f"image_{self.index + 1:02d}.{self.ext}"
+
+
+class SlideshowUnavailable(Exception):
+    """Not one slideshow image could be fetched (the CDN links may have expired)."""
+
+
+class SlideshowGone(SlideshowUnavailable):
+    """The post no longer has any images."""
+
+
+def image_extension(content_type: str) -> str:
+    """File extension for an image Content-Type (defaults to jpg)."""
+    content_type = (content_type or "").lower()
+    if 'png' in content_type:
+        return 'png'
+    if 'webp' in content_type:
+        return 'webp'
+    if 'heic' in content_type:
+        return 'heic'
+    if 'avif' in content_type:
+        return 'avif'
+    return 'jpg'
+
+
+def zip_compress_type(ext: str) -> int:
+    """ZIP_STORED for already-compressed image formats, else ZIP_DEFLATED."""
+    return zipfile.ZIP_STORED if ext.lower() in _STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+async def fetch_image(
+    client: httpx.AsyncClient,
+    index: int,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    retries: int = SLIDESHOW_IMAGE_RETRIES
+) -> Optional[FetchedImage]:
+    """
+    Fetch one image with a per-attempt timeout and retries.
+    Returns None if every attempt failed.
+    """
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                response = await asyncio.wait_for(client.get(url), SLIDESHOW_IMAGE_TIMEOUT)
+                if response.status_code == 200:
+                    ext = image_extension(response.headers.get('content-type', 'image/jpeg'))
+                    return FetchedImage(index=index, content=response.content, ext=ext)
+                # Client errors won't succeed on retry
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    print(f"Failed to download image {index + 1}: HTTP {response.status_code}")
+                    return None
+            except (httpx.HTTPError, asyncio.TimeoutError) as e:
+                print(f"Image {index + 1} attempt {attempt + 1} failed: {e!r}")
+            if attempt < retries:
+                await asyncio.sleep(0.5 * (attempt + 1))
+    return None
+
+
+async def fetch_images(
+    urls: List[str],
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    client: Optional[httpx.AsyncClient] = None
+) -> List[Optional[FetchedImage]]:
+    """
+    Fetch all images concurrently.
+
+    Args:
+        urls: Image URLs in slideshow order
+        on_progress: Called with (done, total) after each image finishes
+        client: Client to use (defaults to the shared TikTok CDN pool)
+
+    Returns:
+        List aligned with urls; failed images are None
+    """
+    semaphore = asyncio.Semaphore(SLIDESHOW_FETCH_CONCURRENCY)
+    client = client or http_clients.get("tiktok_cdn")
+    done = 0
+
+    async def _fetch(index: int, url: str) -> Optional[FetchedImage]:
+        nonlocal done
+        image = await fetch_image(client, index, url, semaphore)
+        done += 1
+        if on_progress:
+            on_progress(done, len(urls))
+        return image
+
+    return await asyncio.gather(*(_fetch(i, url) for i, url in enumerate(urls)))
+
+
+def write_slideshow_zip(path: str, images: List[Optional[FetchedImage]]) -> int:
+    """Write fetched images to a ZIP in slideshow order. Returns entries written."""
+    written = 0
+    with zipfile.ZipFile(path, 'w') as zipf:
+        for image in images:
+            if image is None:
+                continue
+            zipf.writestr(image.filename, image.content, compress_type=zip_compress_type(image.ext))
+            written += 1
+    return written
+
+
+class _ZipStreamBuffer:
+    """
+    Write-only, unseekable sink for zipfile. Having no tell()/seek() makes
+    zipfile use data descriptors, so entries never need to be rewritten.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_slideshow_zip(
+    urls: List[str],
+    client: Optional[httpx.AsyncClient] = None
+) -> AsyncIterator[bytes]:
+    """
+    Yield a ZIP of the slideshow images while it is being built.
+
+    Fetches run ahead of the writer by at most SLIDESHOW_FETCH_CONCURRENCY
+    images, so memory stays bounded regardless of slideshow length, and the
+    first bytes go out as soon as the first image has arrived.
+
+    Raises:
+        SlideshowUnavailable: Before anything is yielded, if no image could
+            be fetched - await the first chunk before sending headers
+    """
+    semaphore = asyncio.Semaphore(SLIDESHOW_FETCH_CONCURRENCY)
+    client = client or http_clients.get("tiktok_cdn")
+    pending: deque = deque()
+    next_index = 0
+
+    def _schedule_next():
+        nonlocal next_index
+        if next_index < len(urls):
+            pending.append(asyncio.create_task(
+                fetch_image(client, next_index, urls[next_index], semaphore)
+            ))
+            next_index += 1
+
+    buffer = _ZipStreamBuffer()
+    written = 0
+    try:
+        for _ in range(SLIDESHOW_FETCH_CONCURRENCY):
+            _schedule_next()
+
+        with zipfile.ZipFile(buffer, 'w') as zipf:
+            while pending:
+                image = await pending.popleft()
+                _schedule_next()
+                if image is None:
+                    continue
+                entry = zipfile.ZipInfo(image.filename, date_time=time.localtime()[:6])
+                entry.compress_type = zip_compress_type(image.ext)
+                zipf.writestr(entry, image.content)
+                written += 1
+                yield buffer.drain()
+        if not written:
+            raise SlideshowUnavailable(f"None of the {len(urls)} slideshow images could be fetched")
+        # Central directory
+        yield buffer.drain()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,141 @@
+"""
+Separated stem cache for V-Tool API.
+Vocals/instrumental outputs are stored once per fingerprint of the decoded
+PCM (plus model and bitrate), so a song requested again - through another
+URL, mirror or re-upload of the same stream - skips separation and its task
+files are hardlinked to the cached stems. Stems are LRU-evicted within
+STEM_CACHE_QUOTA_BYTES.
+"""
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from config import STEM_CACHE_DIR, STEM_CACHE_QUOTA_BYTES
+from file_index import file_index
+
+
+def pcm_fingerprint(pcm) -> str:
+    """
+    SHA-256 of decoded audio (see audio_pipeline.decode_audio).
+    Independent of container, codec framing, tags and file name.
+    """
+    return hashlib.sha256(pcm).hexdigest()
+
+
+def stem_key(fingerprint: str, model: str, bitrate: int) -> str:
+    """Cache key for the stems of a fingerprinted track."""
+    raw = f"{fingerprint}:{model}:{bitrate}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+@dataclass
+class Stems:
+    """Paths of a track's separated stems."""
+    vocals: str
+    instrumental: str
+
+
+class StemCache:
+    """Stores one vocals/instrumental pair per stem key."""
+
+    def __init__(self, root: str = STEM_CACHE_DIR, quota_bytes: int = STEM_CACHE_QUOTA_BYTES):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def paths(self, key: str, suffix: str = "") -> Stems:
+        """Stem paths for key (suffix marks in-progress files)."""
+        shard = os.path.join(self.root, key[:2])
+        os.makedirs(shard, exist_ok=True)
+        return Stems(
+            vocals=os.path.join(shard, f"{key}_vocals{suffix}.mp3"),
+            instrumental=os.path.join(shard, f"{key}_instrumental{suffix}.mp3")
+        )
+
+    def lookup(self, key: str) -> Optional[Stems]:
+        """Cached stems for key, or None."""
+        stems = self.paths(key)
+        if os.path.isfile(stems.vocals) and os.path.isfile(stems.instrumental):
+            return stems
+        return None
+
+    @staticmethod
+    def _touch(stems: Stems):
+        file_index.touch(stems.vocals)
+        file_index.touch(stems.instrumental)
+
+    @staticmethod
+    def _register(key: str, stems: Stems):
+        owner = f"stems:{key}"
+        file_index.register(owner, stems.vocals)
+        file_index.register(owner, stems.instrumental)
+
+    async def fetch(
+        self,
+        key: str,
+        separate: Callable[[str, str], Awaitable[None]]
+    ) -> Tuple[Stems, bool]:
+        """
+        Return the cached stems for key, separating on a miss.
+
+        Args:
+            key: Stem key from stem_key()
+            separate: Coroutine function writing (vocals_path, instrumental_path)
+
+        Returns:
+            Tuple of (stems, cached: bool)
+        """
+        while True:
+            stems = self.lookup(key)
+            if stems:
+                self.hits += 1
+                # File index writes go to SQLite - off the event loop
+                await asyncio.to_thread(self._touch, stems)
+                return stems, True
+            flight = self._in_flight.get(key)
+            if flight is None:
+                break
+            # Same track is being separated for another task - wait for it
+            self.coalesced += 1
+            await asyncio.shield(flight)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = flight
+        try:
+            partial = self.paths(key, suffix=".partial")
+            await separate(partial.vocals, partial.instrumental)
+            stems = self.paths(key)
+            os.replace(partial.vocals, stems.vocals)
+            os.replace(partial.instrumental, stems.instrumental)
+            await asyncio.to_thread(self._register, key, stems)
+            self.misses += 1
+            return stems, False
+        finally:
+            del self._in_flight[key]
+            flight.set_result(None)
+
+    def enforce_quota(self) -> Tuple[int, int]:
+        """Evict least recently used stems beyond the cache's disk budget."""
+        return file_index.evict(self.quota_bytes, None, owner_prefix="stems:")
+
+    def get_stats(self) -> dict:
+        """Cache counters for health/debug endpoints."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "in_flight": len(self._in_flight),
+            "quota_bytes": self.quota_bytes,
+        }
+
+
+# Global stem cache instance
+stem_cache = StemCache()
@@ -0,0 +1,88 @@
+"""
+AI summary generation for V-Tool API.
+Uses the async OpenAI client on the shared "openai" connection pool and
+streams the completion, so the event loop is never blocked and callers
+receive the summary as it is written. At most SUMMARY_MAX_CONCURRENCY
+completions run at once. OPENAI_BASE_URL points it at any OpenAI-compatible
+server (e.g. a local stub for testing).
+"""
+
+import asyncio
+from typing import Callable, Optional
+
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_MODEL,
+    SUMMARY_MAX_CONCURRENCY,
+    SUMMARY_MAX_TOKENS,
+)
+from http_clients import http_clients
+
+
+SYSTEM_PROMPT = "You are a helpful assistant that summarizes video content. Create a well-structured markdown summary with key points and topics."
+
+_client = None
+_client_http = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_openai_client():
+    """AsyncOpenAI bound to the shared connection pool (rebuilt if the pool was reopened)."""
+    global _client, _client_http
+    from openai import AsyncOpenAI
+
+    http_client = http_clients.get("openai")
+    if _client is None or _client_http is not http_client:
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL or None,
+            http_client=http_client
+        )
+        _client_http = http_client
+    return _client
+
+
+async def stream_summary(
+    title: str,
+    description: str,
+    on_delta: Optional[Callable[[str, int], None]] = None
+) -> str:
+    """
+    Generate a markdown summary, streaming tokens as they arrive.
+
+    Args:
+        title: Video title
+        description: Video description
+        on_delta: Called with (text so far, chunks received) after each chunk
+
+    Returns:
+        The complete summary text
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SUMMARY_MAX_CONCURRENCY)
+
+    async with _semaphore:
+        stream = await get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"Summarize this video:\n\nTitle: {title}\n\nDescription: {description}"}
+            ],
+            max_tokens=SUMMARY_MAX_TOKENS,
+            stream=True
+        )
+        parts = []
+        chunks = 0
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            chunks += 1
+            if on_delta:
+                on_delta("".join(parts), chunks)
+        return "".join(parts)
@@ -0,0 +1,319 @@
+"""
+Task storage for V-Tool API.
+Replaces the unbounded in-memory tasks dict with a pluggable store:
+- "sqlite" (default): WAL-mode database shared by every process on the host
+- "memory": process-local dict, for development
+Finished tasks expire after TASK_TTL_SECONDS; tasks that never finish
+(e.g. interrupted by a crash) expire after TASK_MAX_AGE_SECONDS.
+create() can cap the unfinished tasks of one client (the rate limit
+identifier stored in task["rate_limit"]) atomically with the insert, and
+claim_stream() caps the fetches of a streamed download the same way.
+"""
+
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional
+
+from config import TASK_STORE, TASK_STORE_PATH, TASK_TTL_SECONDS, TASK_MAX_AGE_SECONDS, ACTIVE_TASK_WINDOW_SECONDS
+from db import SQLiteDatabase
+
+
+FINISHED_STATUSES = ("completed", "failed")
+
+# Bookkeeping the API never returns: who the task belongs to (user id, client
+# IP in the rate limit identifier) and the stream delivery state
+PRIVATE_FIELDS = ("user_id", "rate_limit", "stream", "stream_opens")
+
+
+def task_client(task: dict) -> Optional[str]:
+    """Rate limit identifier (user:<id> or ip:<addr>) a task was created for."""
+    return (task.get("rate_limit") or {}).get("identifier")
+
+
+def public_task(task: dict) -> dict:
+    """Task record as served by the API, without PRIVATE_FIELDS."""
+    return {key: value for key, value in task.items() if key not in PRIVATE_FIELDS}
+
+
+class TaskStore(ABC):
+    """Interface shared by the task store backends."""
+
+    @abstractmethod
+    def create(self, task: dict, max_active: Optional[int] = None) -> bool:
+        """
+        Insert a new task record (must contain id, type, status).
+        With max_active, nothing is stored and False is returned if the
+        task's client already has that many unfinished tasks.
+        """
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[dict]:
+        """Return the task record or None."""
+
+    @abstractmethod
+    def update(self, task_id: str, updates: dict) -> bool:
+        """Merge updates into a task (sets updated_at). False if missing."""
+
+    @abstractmethod
+    def claim_stream(self, task_id: str, limit: int) -> bool:
+        """
+        Count one fetch of a streamed task (task["stream_opens"]).
+        False, leaving the count as is, if it already reached limit.
+        """
+
+    @abstractmethod
+    def release_stream(self, task_id: str):
+        """Give back a fetch counted by claim_stream() that never started."""
+
+    @abstractmethod
+    def delete(self, task_id: str) -> bool:
+        """Delete a task. False if it did not exist."""
+
+    @abstractmethod
+    def list(self, limit: int = 100, status: Optional[str] = None, user_id: Optional[str] = None) -> List[dict]:
+        """Newest tasks first, optionally filtered."""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored tasks."""
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """Delete expired tasks, returning how many were removed."""
+
+    def __contains__(self, task_id: str) -> bool:
+        return self.get(task_id) is not None
+
+
+class MemoryTaskStore(TaskStore):
+    """Thread-safe in-process task store with TTL expiry."""
+
+    def __init__(self, ttl_seconds: int = TASK_TTL_SECONDS, max_age_seconds: int = TASK_MAX_AGE_SECONDS):
+        self._tasks: "OrderedDict[str, dict]" = OrderedDict()
+        self._finished_at: Dict[str, float] = {}
+        self._created_at: Dict[str, float] = {}
+        self._lock = Lock()
+        self.ttl_seconds = ttl_seconds
+        self.max_age_seconds = max_age_seconds
+
+    def create(self, task: dict, max_active: Optional[int] = None) -> bool:
+        now = time.time()
+        with self._lock:
+            client = task_client(task)
+            if max_active is not None and client:
+                active = sum(
+                    1 for task_id, other in self._tasks.items()
+                    if task_id not in self._finished_at
+                    and self._created_at.get(task_id, 0) > now - ACTIVE_TASK_WINDOW_SECONDS
+                    and task_client(other) == client
+                )
+                if active >= max_active:
+                    return False
+            self._tasks[task["id"]] = dict(task)
+            self._created_at[task["id"]] = now
+            return True
+
+    def get(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def update(self, task_id: str, updates: dict) -> bool:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            task.update(updates)
+            task["updated_at"] = datetime.now().isoformat()
+            if updates.get("status") in FINISHED_STATUSES:
+                self._finished_at[task_id] = time.time()
+            return True
+
+    def claim_stream(self, task_id: str, limit: int) -> bool:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None or task.get("stream_opens", 0) >= limit:
+                return False
+            task["stream_opens"] = task.get("stream_opens", 0) + 1
+            return True
+
+    def release_stream(self, task_id: str):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is not None and task.get("stream_opens", 0) > 0:
+                task["stream_opens"] -= 1
+
+    def delete(self, task_id: str) -> bool:
+        with self._lock:
+            self._finished_at.pop(task_id, None)
+            self._created_at.pop(task_id, None)
+            return self._tasks.pop(task_id, None) is not None
+
+    def list(self, limit: int = 100, status: Optional[str] = None, user_id: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            result = []
+            for task in reversed(self._tasks.values()):
+                if status and task.get("status") != status:
+                    continue
+                if user_id and task.get("user_id") != user_id:
+                    continue
+                result.append(dict(task))
+                if len(result) >= limit:
+                    break
+            return result
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [
+                task_id for task_id in self._tasks
+                if (task_id in self._finished_at and self._finished_at[task_id] < now - self.ttl_seconds)
+                or self._created_at.get(task_id, now) < now - self.max_age_seconds
+            ]
+            for task_id in expired:
+                del self._tasks[task_id]
+                self._finished_at.pop(task_id, None)
+                self._created_at.pop(task_id, None)
+            return len(expired)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    created_ts REAL NOT NULL,
+    finished_ts REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_finished_ts ON tasks(finished_ts);
+"""
+
+
+class SQLiteTaskStore(TaskStore):
+    """Task store backed by a WAL-mode SQLite database."""
+
+    def __init__(
+        self,
+        path: str = TASK_STORE_PATH,
+        ttl_seconds: int = TASK_TTL_SECONDS,
+        max_age_seconds: int = TASK_MAX_AGE_SECONDS
+    ):
+        self.db = SQLiteDatabase(path, _SQLITE_SCHEMA)
+        self.ttl_seconds = ttl_seconds
+        self.max_age_seconds = max_age_seconds
+
+    def create(self, task: dict, max_active: Optional[int] = None) -> bool:
+        now = time.time()
+        finished_ts = now if task.get("status") in FINISHED_STATUSES else None
+        client = task_client(task)
+        with self.db.transaction() as conn:
+            if max_active is not None and client:
+                # Unfinished tasks are few; idx_tasks_finished_ts narrows the scan to them
+                active = conn.execute(
+                    "SELECT COUNT(*) FROM tasks WHERE finished_ts IS NULL AND created_ts > ? "
+                    "AND json_extract(data, '$.rate_limit.identifier') = ?",
+                    (now - ACTIVE_TASK_WINDOW_SECONDS, client)
+                ).fetchone()[0]
+                if active >= max_active:
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (id, user_id, type, status, created_at, created_ts, finished_ts, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task["id"], task.get("user_id"), task["type"], task["status"],
+                    task.get("created_at") or datetime.now().isoformat(), now, finished_ts,
+                    json.dumps(task, default=str),
+                )
+            )
+            return True
+
+    def get(self, task_id: str) -> Optional[dict]:
+        row = self.db.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def update(self, task_id: str, updates: dict) -> bool:
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT data, finished_ts FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row is None:
+                return False
+            task = json.loads(row["data"])
+            task.update(updates)
+            task["updated_at"] = datetime.now().isoformat()
+            finished_ts = row["finished_ts"]
+            if updates.get("status") in FINISHED_STATUSES:
+                finished_ts = time.time()
+            conn.execute(
+                "UPDATE tasks SET status = ?, user_id = ?, finished_ts = ?, data = ? WHERE id = ?",
+                (task["status"], task.get("user_id"), finished_ts, json.dumps(task, default=str), task_id)
+            )
+            return True
+
+    def claim_stream(self, task_id: str, limit: int) -> bool:
+        # One conditional UPDATE, so concurrent fetches can't all pass the check
+        return self.db.execute(
+            "UPDATE tasks SET data = json_set(data, '$.stream_opens', "
+            "COALESCE(json_extract(data, '$.stream_opens'), 0) + 1) "
+            "WHERE id = ? AND COALESCE(json_extract(data, '$.stream_opens'), 0) < ?",
+            (task_id, limit)
+        ).rowcount > 0
+
+    def release_stream(self, task_id: str):
+        self.db.execute(
+            "UPDATE tasks SET data = json_set(data, '$.stream_opens', "
+            "json_extract(data, '$.stream_opens') - 1) "
+            "WHERE id = ? AND json_extract(data, '$.stream_opens') > 0",
+            (task_id,)
+        )
+
+    def delete(self, task_id: str) -> bool:
+        return self.db.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount > 0
+
+    def list(self, limit: int = 100, status: Optional[str] = None, user_id: Optional[str] = None) -> List[dict]:
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.db.execute(
+            f"SELECT data FROM tasks {where} ORDER BY created_at DESC LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        return self.db.execute(
+            "DELETE FROM tasks WHERE finished_ts < ? OR created_ts < ?",
+            (now - self.ttl_seconds, now - self.max_age_seconds)
+        ).rowcount
+
+
+def create_task_store() -> TaskStore:
+    """Build the task store selected by TASK_STORE."""
+    if TASK_STORE == "memory":
+        return MemoryTaskStore()
+    return SQLiteTaskStore()
+
+
+# Global task store instance
+task_store = create_task_store()
@@ -3,10 +3,19 @@ import os
 import json
 import re
 import subprocess
-from typing import Optional
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional, Tuple
 from datetime import datetime
 
-from config import DOWNLOAD_DIR, OPENAI_API_KEY, HOST, PORT
+import httpx
+
+from config import (
+    DOWNLOAD_DIR, OPENAI_API_KEY, HOST, PORT, PROGRESS_MIN_INTERVAL, SLIDESHOW_DELIVERY, SUMMARY_MAX_TOKENS,
+    SPY_BATCH_CONCURRENCY, DOWNLOAD_DELIVERY
+)
 
 # Cookies file path for YouTube authentication
 COOKIES_FILE = os.path.join(os.path.dirname(__file__), "cookies.txt")
@@ -18,39 +27,180 @@ from models import (
     SlideshowResult, 
     AudioResult
 )
-
-# In-memory task storage (replace with Supabase in production)
-tasks_db: dict = {}
+from video_cache import video_info_cache
+from workers import run_blocking
+from download_store import download_store, download_key
+from progress import progress_broker
+from task_store import task_store
+from file_index import file_index, task_file_path
+from slideshow import fetch_images, write_slideshow_zip, stream_slideshow_zip, SlideshowGone, SlideshowUnavailable
+from http_clients import http_clients
+from tiktok_parser import parse_slideshow_page
+from separator import separator, SeparationError
+from stem_cache import stem_cache, stem_key, pcm_fingerprint
+from audio_pipeline import decode_audio, encode_mp3
+from summarizer import stream_summary
+from rate_limiter import rate_limiter
+from media_stream import media_streamer, MediaStream, StreamBusy, StreamUnavailable
 
 # Base URL for file downloads (use PUBLIC_URL or fallback to localhost)
 PUBLIC_URL = os.environ.get('PUBLIC_URL', f"http://localhost:{PORT}")
 API_BASE_URL = PUBLIC_URL
 
+# Bitrate of the separated vocals/instrumental MP3s
+STEM_BITRATE = 320
+
+
+# Task store writes issued from the event loop run on this thread: off the
+# loop (SQLite may wait on a write lock) and in the order they were made
+_task_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vtool-task-writer")
+
 
 def update_task_sync(task_id: str, updates: dict):
-    """Update task in memory storage"""
-    if task_id in tasks_db:
-        tasks_db[task_id].update(updates)
-        tasks_db[task_id]["updated_at"] = datetime.now().isoformat()
+    """Update task in the task store and wake progress stream subscribers (blocking)"""
+    if task_store.update(task_id, updates):
+        progress_broker.notify(task_id)
+
+
+async def update_task(task_id: str, updates: dict):
+    """update_task_sync off the event loop"""
+    await asyncio.get_running_loop().run_in_executor(_task_writer, update_task_sync, task_id, updates)
+
+
+def schedule_task_update(task_id: str, updates: dict):
+    """update_task without waiting, for sync callbacks that run on the event loop"""
+    _task_writer.submit(update_task_sync, task_id, updates)
+
+
+async def update_task_progress(task_id: str, progress: int, status: str = "processing", stage: str = None):
+    """Update task progress (and optionally the current pipeline stage)"""
+    updates = {"progress": progress, "status": status}
+    if stage:
+        updates["stage"] = stage
+    await update_task(task_id, updates)
+
 
+def charge_task_usage(task_id: str, resource: str, amount: float):
+    """Charge resource usage (proxy bytes, CPU seconds) to the client that created a task"""
+    task = task_store.get(task_id)
+    if task and task.get("rate_limit"):
+        rate_limiter.charge(task["rate_limit"]["identifier"], resource, amount)
 
-async def update_task_progress(task_id: str, progress: int, status: str = "processing"):
-    """Update task progress"""
-    update_task_sync(task_id, {"progress": progress, "status": status})
+
+class TransferMeter:
+    """yt-dlp progress hook counting the bytes downloaded (per file, merged formats included)"""
+    
+    def __init__(self, on_progress=None):
+        self.on_progress = on_progress
+        self._files = {}
+    
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._files.values())
+    
+    def __call__(self, d: dict):
+        if d.get('status') in ('downloading', 'finished'):
+            self._files[d.get('filename')] = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        if self.on_progress:
+            self.on_progress(d)
+
+
+def make_download_progress_hook(task_id: str, start: int, end: int):
+    """
+    Build a yt-dlp progress hook that maps byte progress onto the task's
+    start..end progress range. Updates are throttled to PROGRESS_MIN_INTERVAL.
+    Runs in worker threads.
+    """
+    state = {"last_update": 0.0, "progress": start}
+    
+    def hook(d: dict):
+        status = d.get('status')
+        if status not in ('downloading', 'finished'):
+            return
+        
+        now = time.monotonic()
+        if status == 'downloading' and now - state["last_update"] < PROGRESS_MIN_INTERVAL:
+            return
+        state["last_update"] = now
+        
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            # Merged formats download several files - never move backwards
+            fraction = min(downloaded / total, 1.0)
+            state["progress"] = max(state["progress"], start + int((end - start) * fraction))
+        
+        update_task_sync(task_id, {
+            "progress": state["progress"],
+            "stage": "downloading",
+            "transfer": {
+                "downloaded_bytes": downloaded,
+                "total_bytes": total,
+                "speed": d.get('speed'),
+                "eta": d.get('eta'),
+            }
+        })
+    
+    return hook
 
 
 async def complete_task(task_id: str, result: dict):
     """Mark task as completed with result"""
-    update_task_sync(task_id, {
+    await update_task(task_id, {
         "progress": 100,
         "status": "completed",
-        "result": result
+        "result": result,
+        "partial_markdown": None
     })
 
 
+# Set by process_task for an attempt that a queue worker will retry if it
+# fails: fail_task then records the error here and leaves the task pending
+_retry_on_failure: ContextVar[Optional[dict]] = ContextVar("retry_on_failure", default=None)
+
+# Error text of failures that may go away on their own (yt-dlp reports
+# network trouble only as a message in DownloadError)
+_TRANSIENT_ERROR_PATTERN = re.compile(
+    r"timed? ?out|temporar(y|ily)|connection (reset|refused|aborted)|remote end closed|"
+    r"network is unreachable|name resolution|incompleteread|http error (429|5\d\d)",
+    re.IGNORECASE
+)
+
+
+def is_transient_error(error: Optional[BaseException]) -> bool:
+    """
+    Whether a failure is worth another attempt: timeouts, connection errors
+    and rate limiting / 5xx from upstream, anywhere in the exception chain.
+    Deterministic failures (unsupported URL, 4xx, nothing found) are not.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError, httpx.TimeoutException, httpx.NetworkError)):
+            return True
+        if _TRANSIENT_ERROR_PATTERN.search(str(error)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
 async def fail_task(task_id: str, error_message: str):
-    """Mark task as failed with error"""
-    update_task_sync(task_id, {
+    """
+    Mark task as failed with error (pending again if the attempt will be retried).
+    Called from the processors' except blocks: only a transient exception
+    being handled is retried, anything else fails the task right away.
+    """
+    retry = _retry_on_failure.get()
+    if retry is not None and is_transient_error(sys.exc_info()[1]):
+        retry["error"] = error_message
+        await update_task(task_id, {
+            "status": "pending",
+            "progress": 0,
+            "stage": "retrying",
+            "error_message": error_message
+        })
+        return
+    await update_task(task_id, {
         "status": "failed",
         "error_message": error_message
     })
@@ -106,6 +256,11 @@ def get_ydl_opts(output_template: str = None, format_str: str = None, use_proxy:
 
 
 def get_video_info(url: str) -> dict:
+    """Get video information, served from the metadata cache when possible"""
+    return video_info_cache.get_or_extract(url, _extract_video_info)
+
+
+def _extract_video_info(url: str) -> dict:
     """Extract video information - uses PROXY to bypass YouTube blocks"""
     import yt_dlp
     
@@ -145,36 +300,76 @@ def get_video_info(url: str) -> dict:
     raise Exception("Failed to get video info")
 
 
-def download_video(url: str, task_id: str, options: dict = None) -> dict:
-    """Download video using yt-dlp - uses PROXY to bypass YouTube blocks"""
-    import yt_dlp
+def download_video(url: str, task_id: str, options: dict = None, info: dict = None, progress_hook=None) -> dict:
+    """
+    Download video using yt-dlp - uses PROXY to bypass YouTube blocks.
     
+    If info (an already extracted info dict) is given, the download is driven
+    straight from it so the extractor does not run a second time.
+    Files come from the content-addressed store: identical requests share
+    one download and the task file is a hardlink to the stored copy.
+    progress_hook receives yt-dlp progress dicts (also for shared downloads).
+    """
     options = options or {}
-    output_template = os.path.join(DOWNLOAD_DIR, f"{task_id}.%(ext)s")
+    key = download_key(url, options, info)
+    meter = TransferMeter(progress_hook)
     
-    # Determine format string
+    stored_path, cached = download_store.fetch(
+        key,
+        lambda output_template, hooks: _run_download(url, output_template, options, info, hooks),
+        on_progress=meter
+    )
+    if cached:
+        print(f"♻️ Reusing stored download {os.path.basename(stored_path)}")
+    elif uses_proxy(url):
+        # Proxy bandwidth is the scarce resource - the client that ran the download pays for it
+        charge_task_usage(task_id, "proxy_bytes", meter.total_bytes)
+    file_index.register(f"store:{key}", stored_path)
+    
+    filename = f"{task_id}{os.path.splitext(stored_path)[1]}"
+    filepath = task_file_path(filename)
+    download_store.link(stored_path, filepath)
+    file_index.register(task_id, filepath)
+    return {
+        "filepath": filepath,
+        "filename": filename,
+        "file_size": os.path.getsize(filepath)
+    }
+
+
+def uses_proxy(url: str) -> bool:
+    """Whether downloads of url go through PROXY_URL (YouTube blocks both info AND download)"""
+    is_youtube = 'youtube.com' in url or 'youtu.be' in url
+    return is_youtube and bool(PROXY_URL)
+
+
+def _format_string(options: dict) -> str:
+    """yt-dlp format selector for download options"""
     format_type = options.get('format', 'video')
     ytdlp_format = options.get('ytdlp_format')
-    audio_bitrate = options.get('audio_bitrate', '320')
-    
-    # Build format string
     if format_type == 'audio':
-        format_str = 'bestaudio/best'
-    elif ytdlp_format:
-        format_str = f"{ytdlp_format}/bestvideo+bestaudio/best"
-    else:
-        format_str = 'bestvideo+bestaudio/bestvideo*+bestaudio/best/bestvideo/bestaudio'
+        return 'bestaudio/best'
+    if ytdlp_format:
+        return f"{ytdlp_format}/bestvideo+bestaudio/best"
+    return 'bestvideo+bestaudio/bestvideo*+bestaudio/best/bestvideo/bestaudio'
+
+
+def _run_download(url: str, output_template: str, options: dict, info: dict = None, progress_hooks: list = None):
+    """Run yt-dlp for one download into output_template"""
+    import yt_dlp
     
-    # Check if this is a YouTube URL
-    is_youtube = 'youtube.com' in url or 'youtu.be' in url
+    format_type = options.get('format', 'video')
+    audio_bitrate = options.get('audio_bitrate', '320')
+    format_str = _format_string(options)
     
-    # Use proxy for YouTube (blocks both info AND download)
-    use_proxy = is_youtube and bool(PROXY_URL)
+    use_proxy = uses_proxy(url)
     
     ydl_opts = get_ydl_opts(output_template, format_str, use_proxy=use_proxy)
+    if progress_hooks:
+        ydl_opts['progress_hooks'] = progress_hooks
     
-    # Add audio post-processor if needed
-    if format_type == 'audio':
+    # Add audio post-processor if needed (native_audio keeps the original opus/m4a stream)
+    if format_type == 'audio' and not options.get('native_audio'):
         ydl_opts['postprocessors'] = [{
             'key': 'FFmpegExtractAudio',
             'preferredcodec': 'mp3',
@@ -188,86 +383,197 @@ def download_video(url: str, task_id: str, options: dict = None) -> dict:
     
     try:
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if info:
+                try:
+                    # Re-runs only format selection + download on the cached extraction
+                    ydl.process_ie_result(info, download=True)
+                    return
+                except Exception as info_error:
+                    # Media URLs in the info dict may have expired - extract again
+                    print(f"Download from info failed, re-extracting: {info_error}")
+                    video_info_cache.invalidate(url)
             ydl.download([url])
-            return _find_downloaded_file(task_id)
     except Exception as e:
         raise Exception(f"Download failed: {str(e)}")
 
 
-def _find_downloaded_file(task_id: str) -> dict:
-    """Helper to find the downloaded file for a task"""
-    for f in os.listdir(DOWNLOAD_DIR):
-        if f.startswith(task_id):
-            filepath = os.path.join(DOWNLOAD_DIR, f)
-            return {
-                "filepath": filepath,
-                "filename": f,
-                "file_size": os.path.getsize(filepath)
-            }
-    raise Exception("Downloaded file not found")
+# Protocols yt-dlp writes to stdout as the finished file (HLS/DASH need fixups or merging)
+STREAMABLE_PROTOCOLS = ("http", "https")
+
+
+def select_stream_format(info: dict, options: dict) -> Optional[dict]:
+    """
+    The format an audio download of info would fetch, if it can be piped
+    to the client as is: one http(s) format, nothing to merge or fix up.
+    Video downloads are always staged: the preview player needs Range
+    requests, which a pipe can't serve.
+
+    Returns:
+        {"format_id", "ext", "audio_bitrate", "file_size"} (audio_bitrate is
+        set when ffmpeg converts to MP3 on the way), or None
+    """
+    import yt_dlp
+    
+    if options.get('format') != 'audio':
+        return None
+    if info.get('_type', 'video') != 'video' or not info.get('formats'):
+        return None
+    
+    ydl_opts = get_ydl_opts(format_str=_format_string(options))
+    ydl_opts['quiet'] = True
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            # Format selection only; the selected format is merged into the returned dict
+            selected = ydl.process_ie_result(info, download=False)
+    except Exception as e:
+        print(f"Stream format selection failed: {e}")
+        return None
+    
+    if selected.get('requested_formats') or not selected.get('format_id'):
+        return None
+    if selected.get('protocol') not in STREAMABLE_PROTOCOLS:
+        return None
+    if (selected.get('container') or '').endswith('_dash'):
+        # DASH m4a/mp4 get remuxed by a yt-dlp fixup after download
+        return None
+    
+    if not options.get('native_audio'):
+        audio_bitrate = options.get('audio_bitrate') or '320'
+        duration = selected.get('duration') or 0
+        return {
+            "format_id": selected['format_id'],
+            "ext": "mp3",
+            "audio_bitrate": audio_bitrate,
+            "file_size": int(duration * int(audio_bitrate) * 125),
+        }
+    return {
+        "format_id": selected['format_id'],
+        "ext": selected.get('ext') or 'm4a',
+        "audio_bitrate": None,
+        "file_size": int(selected.get('filesize') or selected.get('filesize_approx') or 0),
+    }
+
+
+def stream_info_json(info: dict) -> bytes:
+    """info dict in the form yt-dlp --load-info-json reads"""
+    import yt_dlp
+    return json.dumps(yt_dlp.YoutubeDL.sanitize_info(info)).encode()
+
+
+async def open_download_stream(url: str, stream: dict) -> MediaStream:
+    """
+    Start piping a download task's selected format from yt-dlp.
+    If the cached media URLs have gone stale the info is extracted again once.
+    """
+    for attempt in range(2):
+        info = await run_blocking("download", get_video_info, url)
+        info_json = await run_blocking("download", stream_info_json, info)
+        try:
+            return await media_streamer.open(
+                info_json,
+                stream["format_id"],
+                proxy=PROXY_URL if uses_proxy(url) else None,
+                audio_bitrate=stream.get("audio_bitrate")
+            )
+        except StreamBusy:
+            raise
+        except StreamUnavailable as e:
+            if attempt:
+                raise
+            print(f"Stream from cached info failed, re-extracting: {e}")
+            video_info_cache.invalidate(url)
+
+
+def display_filename(info: dict, ext: str, default_title: str = 'video') -> str:
+    """Platform-aware download name, e.g. My_Video_TikTok.mp4"""
+    # Strict sanitize: drop invalid chars, spaces to underscores, limit length
+    clean_title = re.sub(r'[\\/*?:"<>|]', "", info.get('title', default_title))
+    clean_title = re.sub(r'\s+', "_", clean_title)[:50]
+    
+    extractor = info.get('extractor', 'unknown').replace(':', '').title()
+    
+    # Clean up platform name (e.g. "YoutubeTab" -> "Youtube")
+    if 'youtube' in extractor.lower(): extractor = 'YouTube'
+    elif 'tiktok' in extractor.lower(): extractor = 'TikTok'
+    elif 'instagram' in extractor.lower(): extractor = 'Instagram'
+    elif 'facebook' in extractor.lower(): extractor = 'Facebook'
+    
+    return f"{clean_title}_{extractor}{ext}"
+
+
+def build_download_result(format_type: str, download_url: str, filename: str, file_size: int, info: dict, streamed: bool = False):
+    """Task result of a download (AudioResult for audio downloads; only those are ever streamed)"""
+    if format_type == 'audio':
+        return AudioResult(
+            download_url=download_url,
+            filename=filename,
+            duration=info.get('duration', 0) or 0,
+            format="mp3",
+            file_size=file_size,
+            streamed=streamed
+        )
+    return DownloadResult(
+        download_url=download_url,
+        filename=filename,
+        file_size=file_size,
+        duration=info.get('duration'),
+        thumbnail_url=info.get('thumbnail')
+    )
 
 
 async def process_download(task_id: str, url: str, options: dict = None):
     """Process video download task - downloads video/audio with format options"""
     try:
         options = options or {}
-        await update_task_progress(task_id, 10)
+        await update_task_progress(task_id, 10, stage="extracting")
         
         # Get video info first
-        info = get_video_info(url)
+        info = await run_blocking("download", get_video_info, url)
         await update_task_progress(task_id, 30)
         
-        # Download with options
-        await update_task_progress(task_id, 50)
-        download_result = download_video(url, task_id, options)
-        await update_task_progress(task_id, 90)
-        
-        # Determine result type based on format
         format_type = options.get('format', 'video')
         
-        # Helper to strict sanitize filename
-        def sanitize_filename(name):
-            # Replace invalid chars with underscore
-            clean = re.sub(r'[\\/*?:"<>|]', "", name)
-            # Replace spaces with underscores
-            clean = re.sub(r'\s+', "_", clean)
-            return clean[:50]  # Limit length
-
-        # Get title and builder platform-aware filename
-        title = info.get('title', 'video')
-        extractor = info.get('extractor', 'unknown').replace(':', '').title()
-        
-        # Clean up platform name (e.g. "YoutubeTab" -> "Youtube")
-        if 'youtube' in extractor.lower(): extractor = 'YouTube'
-        elif 'tiktok' in extractor.lower(): extractor = 'TikTok'
-        elif 'instagram' in extractor.lower(): extractor = 'Instagram'
-        elif 'facebook' in extractor.lower(): extractor = 'Facebook'
+        if DOWNLOAD_DELIVERY == "stream":
+            stream = await run_blocking("download", select_stream_format, info, options)
+            if stream:
+                # Piped from yt-dlp by /api/stream/{task_id} when the file is fetched
+                filename = display_filename(info, f".{stream['ext']}")
+                await update_task(task_id, {"stream": stream})
+                result = build_download_result(
+                    format_type,
+                    f"{API_BASE_URL}/api/stream/{task_id}?download_name={filename}",
+                    filename,
+                    stream["file_size"],
+                    info,
+                    streamed=True
+                )
+                await complete_task(task_id, result.model_dump())
+                return
         
-        clean_title = sanitize_filename(title)
+        # Download with options
+        await update_task_progress(task_id, 35, stage="downloading")
+        download_result = await run_blocking(
+            "download", download_video, url, task_id, options, info=info,
+            progress_hook=make_download_progress_hook(task_id, 35, 90)
+        )
+        await update_task_progress(task_id, 90, stage="finalizing")
         
         # Extension from actual file
         actual_ext = os.path.splitext(download_result['filename'])[1]
         if not actual_ext: actual_ext = ".mp4"
         
         # Formatted Name: My_Video_TikTok.mp4
-        display_filename = f"{clean_title}_{extractor}{actual_ext}"
-        
+        filename = display_filename(info, actual_ext)
         if format_type == 'audio':
-            result = AudioResult(
-                download_url=f"{API_BASE_URL}/api/files/{download_result['filename']}?download_name={display_filename.replace('.mp4', '.mp3')}",
-                filename=display_filename.replace('.mp4', '.mp3'),
-                duration=info.get('duration', 0) or 0,
-                format="mp3",
-                file_size=download_result['file_size']
-            )
-        else:
-            result = DownloadResult(
-                download_url=f"{API_BASE_URL}/api/files/{download_result['filename']}?download_name={display_filename}",
-                filename=display_filename,
-                file_size=download_result['file_size'],
-                duration=info.get('duration'),
-                thumbnail_url=info.get('thumbnail')
-            )
+            filename = filename.replace('.mp4', '.mp3')
+        
+        result = build_download_result(
+            format_type,
+            f"{API_BASE_URL}/api/files/{download_result['filename']}?download_name={filename}",
+            filename,
+            download_result['file_size'],
+            info
+        )
         
         await complete_task(task_id, result.model_dump())
         
@@ -278,10 +584,10 @@ async def process_download(task_id: str, url: str, options: dict = None):
 async def process_summary(task_id: str, url: str):
     """Process AI summary task - generates summary from video content"""
     try:
-        await update_task_progress(task_id, 10)
+        await update_task_progress(task_id, 10, stage="extracting")
         
         # Get video info
-        info = get_video_info(url)
+        info = await run_blocking("summary", get_video_info, url)
         await update_task_progress(task_id, 30)
         
         title = info.get('title', 'Unknown Video')
@@ -290,21 +596,22 @@ async def process_summary(task_id: str, url: str):
         # If OpenAI is configured, use it for summarization
         if OPENAI_API_KEY:
             try:
-                from openai import OpenAI
-                client = OpenAI(api_key=OPENAI_API_KEY)
+                await update_task_progress(task_id, 50, stage="summarizing")
                 
-                await update_task_progress(task_id, 50)
+                # Stream tokens into the task so clients can render the summary as it is written
+                last_update = 0.0
                 
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that summarizes video content. Create a well-structured markdown summary with key points and topics."},
-                        {"role": "user", "content": f"Summarize this video:\n\nTitle: {title}\n\nDescription: {description}"}
-                    ],
-                    max_tokens=1000
-                )
+                def on_delta(text: str, chunks: int):
+                    nonlocal last_update
+                    now = time.monotonic()
+                    if now - last_update >= PROGRESS_MIN_INTERVAL:
+                        last_update = now
+                        schedule_task_update(task_id, {
+                            "progress": 50 + min(30, 30 * chunks // SUMMARY_MAX_TOKENS),
+                            "partial_markdown": text
+                        })
                 
-                summary_text = response.choices[0].message.content
+                summary_text = await stream_summary(title, description, on_delta=on_delta)
                 await update_task_progress(task_id, 80)
                 
             except Exception as e:
@@ -340,44 +647,49 @@ async def process_summary(task_id: str, url: str):
         await fail_task(task_id, str(e))
 
 
+def build_spy_result(info: dict) -> SpyResult:
+    """Build the spy metadata result from a yt-dlp info dict"""
+    # Determine platform
+    extractor = info.get('extractor', 'Unknown')
+    platform = extractor.replace(':', ' ').title()
+    
+    # Format date from YYYYMMDD to DD/MM/YYYY
+    upload_date = info.get('upload_date', '')
+    formatted_date = upload_date
+    if upload_date and len(upload_date) == 8:
+        try:
+            dt = datetime.strptime(upload_date, "%Y%m%d")
+            formatted_date = dt.strftime("%d/%m/%Y")
+        except ValueError:
+            pass
+
+    return SpyResult(
+        platform=platform,
+        author=info.get('uploader', info.get('channel', 'Unknown')),
+        author_avatar=info.get('uploader_url'),
+        title=info.get('title', 'Unknown'),
+        description=(info.get('description') or '')[:500],
+        view_count=info.get('view_count', 0) or 0,
+        like_count=info.get('like_count', 0) or 0,
+        comment_count=info.get('comment_count', 0) or 0,
+        share_count=info.get('repost_count', 0) or 0,
+        tags=(info.get('tags') or [])[:10],
+        duration=info.get('duration', 0) or 0,
+        thumbnail_url=info.get('thumbnail', ''),
+        publish_date=formatted_date
+    )
+
+
 async def process_spy(task_id: str, url: str):
     """Process metadata extraction task - extracts all video metadata"""
     try:
-        await update_task_progress(task_id, 20)
+        await update_task_progress(task_id, 20, stage="extracting")
         
         # Get video info
-        info = get_video_info(url)
+        info = await run_blocking("spy", get_video_info, url)
         await update_task_progress(task_id, 70)
         
-        # Determine platform
-        extractor = info.get('extractor', 'Unknown')
-        platform = extractor.replace(':', ' ').title()
-        
-        # Format date from YYYYMMDD to DD/MM/YYYY
-        upload_date = info.get('upload_date', '')
-        formatted_date = upload_date
-        if upload_date and len(upload_date) == 8:
-            try:
-                dt = datetime.strptime(upload_date, "%Y%m%d")
-                formatted_date = dt.strftime("%d/%m/%Y")
-            except ValueError:
-                pass
-
-        result = SpyResult(
-            platform=platform,
-            author=info.get('uploader', info.get('channel', 'Unknown')),
-            author_avatar=info.get('uploader_url'),
-            title=info.get('title', 'Unknown'),
-            description=info.get('description', '')[:500],
-            view_count=info.get('view_count', 0) or 0,
-            like_count=info.get('like_count', 0) or 0,
-            comment_count=info.get('comment_count', 0) or 0,
-            share_count=info.get('repost_count', 0) or 0,
-            tags=info.get('tags', [])[:10] or [],
-            duration=info.get('duration', 0) or 0,
-            thumbnail_url=info.get('thumbnail', ''),
-            publish_date=formatted_date
-        )
+        result = build_spy_result(info)
         
         await complete_task(task_id, result.model_dump())
         
@@ -385,121 +697,211 @@ async def process_spy(task_id: str, url: str):
         await fail_task(task_id, str(e))
 
 
-async def process_slideshow(task_id: str, url: str):
-    """Process slideshow extraction task - extracts images from TikTok slideshows"""
-    import httpx
-    import re
-    import zipfile
-    from io import BytesIO
+def expand_playlist(url: str, limit: int) -> List[str]:
+    """
+    List the video URLs of a playlist/channel with flat extraction
+    (one page fetch, no per-video extraction).
+    """
+    import yt_dlp
+    
+    ydl_opts = get_ydl_opts(use_proxy=uses_proxy(url))
+    ydl_opts.update({
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'noplaylist': False,
+        'playlistend': limit,
+    })
     
     try:
-        await update_task_progress(task_id, 10)
-        
-        images = []
-        
-        # For TikTok URLs, use HTTP scraping
-        if 'tiktok.com' in url.lower():
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        raise Exception(f"Failed to expand playlist: {str(e)}")
+    
+    urls = []
+    for entry in (info or {}).get('entries') or []:
+        if not entry:
+            continue
+        entry_url = entry.get('webpage_url') or entry.get('url')
+        if entry_url and entry_url.startswith('http'):
+            urls.append(entry_url)
+        if len(urls) >= limit:
+            break
+    return urls
+
+
+async def spy_batch_stream(urls: List[str]) -> AsyncIterator[dict]:
+    """
+    Extract spy metadata for many URLs concurrently (at most
+    SPY_BATCH_CONCURRENCY at a time) and yield each outcome as soon as it
+    is ready - completion order, not input order.
+    """
+    semaphore = asyncio.Semaphore(SPY_BATCH_CONCURRENCY)
+    
+    async def _extract(index: int, url: str) -> dict:
+        async with semaphore:
             try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0.3 Mobile/15E148 Safari/604.1',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                }
-                
+                info = await run_blocking("spy", get_video_info, url)
+                result = build_spy_result(info)
+                return {"event": "result", "index": index, "url": url, "status": "completed", "result": result.model_dump()}
+            except Exception as e:
+                return {"event": "result", "index": index, "url": url, "status": "failed", "error_message": str(e)}
+    
+    pending = [asyncio.ensure_future(_extract(i, url)) for i, url in enumerate(urls)]
+    completed = failed = 0
+    try:
+        yield {"event": "start", "total": len(urls)}
+        for next_done in asyncio.as_completed(pending):
+            item = await next_done
+            if item["status"] == "completed":
+                completed += 1
+            else:
+                failed += 1
+            yield item
+        yield {"event": "done", "total": len(urls), "completed": completed, "failed": failed}
+    finally:
+        # Client went away - stop extractions that haven't started yet
+        for task in pending:
+            task.cancel()
+
+
+async def extract_slideshow(url: str, task_id: Optional[str] = None, refresh: bool = False) -> Tuple[List[str], Optional[str]]:
+    """
+    Image URLs (up to 20) and audio URL of a slideshow post.
+    The URLs are signed CDN links that expire; refresh=True bypasses the
+    info cache to get fresh ones. Progress is reported on task_id when given.
+    """
+    images = []
+    audio_url = None
+    
+    # For TikTok URLs, use HTTP scraping
+    if 'tiktok.com' in url.lower():
+        try:
+            if task_id:
                 await update_task_progress(task_id, 20)
+            
+            response = await http_clients.get("tiktok_html").get(url)
+            html = response.text
+            
+            if task_id:
+                await update_task_progress(task_id, 30)
+            
+            # Parse the embedded rehydration JSON for all slideshow images
+            page = parse_slideshow_page(html)
+            if page:
+                images = page.image_urls[:20]  # Allow up to 20 images
+                audio_url = page.audio_url
+            else:
+                print("TikTok page has no rehydration data - falling back to yt-dlp")
                 
-                async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
-                    response = await client.get(url, headers=headers)
-                    html = response.text
-                    
-                    await update_task_progress(task_id, 30)
-                    
-                    # Look for imagePost pattern in HTML - get ALL images
-                    # Match the entire imagePost section to get all image objects
-                    image_section = re.search(r'"imagePost":\s*\{"images":\s*\[(.*?)\]\s*,', html, re.DOTALL)
-                    
-                    if image_section:
-                        images_data = image_section.group(1)
-                        
-                        # Split by image objects and extract first URL from each
-                        # Each image object has an imageURL with urlList
-                        image_objects = re.findall(r'\{"imageURL":\s*\{"urlList":\s*\["([^"]+)"', images_data)
-                        
-                        for encoded_url in image_objects:
-                            # Decode the URL (replace \u002F with /)
-                            decoded_url = encoded_url.replace('\\u002F', '/').replace('\\/', '/')
-                            if decoded_url and 'tiktokcdn' in decoded_url:
-                                images.append(decoded_url)
-                    
-                    # Deduplicate while preserving order
-                    seen = set()
-                    unique_images = []
-                    for img in images:
-                        if img not in seen:
-                            seen.add(img)
-                            unique_images.append(img)
-                    images = unique_images[:20]  # Allow up to 20 images
-                    
-            except Exception as http_error:
-                print(f"TikTok HTTP extraction error: {http_error}")
-        
-        # Fallback to yt-dlp for other platforms or if HTTP extraction failed
-        if not images:
-            try:
-                info = get_video_info(url)
+        except Exception as http_error:
+            print(f"TikTok HTTP extraction error: {http_error}")
+    
+    # Fallback to yt-dlp for other platforms or if HTTP extraction failed
+    if not images:
+        try:
+            if refresh:
+                video_info_cache.invalidate(url)
+            info = await run_blocking("slideshow", get_video_info, url)
+            if task_id:
                 await update_task_progress(task_id, 40)
+            
+            # Get thumbnails/images if available
+            thumbnails = info.get('thumbnails', [])
+            images = [t.get('url') for t in thumbnails if t.get('url')][:20]
+            
+            # If no thumbnails, use the main thumbnail
+            if not images and info.get('thumbnail'):
+                images = [info.get('thumbnail')]
                 
-                # Get thumbnails/images if available
-                thumbnails = info.get('thumbnails', [])
-                images = [t.get('url') for t in thumbnails if t.get('url')][:20]
-                
-                # If no thumbnails, use the main thumbnail
-                if not images and info.get('thumbnail'):
-                    images = [info.get('thumbnail')]
-                    
-            except Exception as yt_error:
-                print(f"yt-dlp error: {yt_error}")
+        except Exception as yt_error:
+            print(f"yt-dlp error: {yt_error}")
+    
+    return images, audio_url
+
+
+async def open_slideshow_zip(task_id: str, task: dict) -> AsyncIterator[bytes]:
+    """
+    Start the ZIP of a slideshow task, waiting until its first image is in.
+    If no image can be fetched the stored CDN links have probably expired:
+    the post is extracted again once and the task keeps the fresh links.
+    
+    Raises:
+        SlideshowGone: If the post has no images any more
+        SlideshowUnavailable: If the fresh links fail as well
+    """
+    result = task["result"]
+    images = result["images"]
+    for attempt in range(2):
+        zip_stream = stream_slideshow_zip(images, client=http_clients.get("tiktok_cdn"))
+        try:
+            first_chunk = await zip_stream.__anext__()
+            break
+        except SlideshowUnavailable as e:
+            if attempt:
+                raise
+            print(f"Slideshow images failed, re-extracting: {e}")
+        images, audio_url = await extract_slideshow(task["input_url"], refresh=True)
+        if not images:
+            raise SlideshowGone("The slideshow has no images any more")
+        result = {**result, "images": images, "audio_url": audio_url or result.get("audio_url")}
+        await update_task(task_id, {"result": result})
+    
+    async def chunks():
+        try:
+            yield first_chunk
+            async for chunk in zip_stream:
+                yield chunk
+        finally:
+            await zip_stream.aclose()
+    
+    return chunks()
+
+
+async def process_slideshow(task_id: str, url: str):
+    """Process slideshow extraction task - extracts images from TikTok slideshows"""
+    try:
+        await update_task_progress(task_id, 10, stage="extracting")
+        
+        images, audio_url = await extract_slideshow(url, task_id)
         
         if not images:
             raise Exception("No images found. This URL may not be a slideshow or TikTok may have changed their page structure.")
         
-        await update_task_progress(task_id, 50)
+        if SLIDESHOW_DELIVERY == "stream":
+            # The ZIP is built on the fly by /api/slideshow/{task_id}/zip
+            result = SlideshowResult(
+                download_url=f"{API_BASE_URL}/api/slideshow/{task_id}/zip",
+                images=images,
+                audio_url=audio_url,
+                filename=f"{task_id}_slideshow.zip"
+            )
+            await complete_task(task_id, result.model_dump())
+            return
+        
+        await update_task_progress(task_id, 50, stage="fetching")
         
-        # Download images and create ZIP file
-        zip_path = os.path.join(DOWNLOAD_DIR, f"{task_id}_slideshow.zip")
+        # Download images concurrently, then write the ZIP in slideshow order
+        def on_image_done(done: int, total: int):
+            schedule_task_update(task_id, {"progress": 50 + int(done / total * 40)})
         
-        async with httpx.AsyncClient(timeout=30) as client:
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for i, img_url in enumerate(images):
-                    try:
-                        # Download image
-                        img_response = await client.get(img_url, headers={
-                            'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_6 like Mac OS X) AppleWebKit/605.1.15',
-                            'Referer': 'https://www.tiktok.com/'
-                        })
-                        
-                        if img_response.status_code == 200:
-                            # Determine extension
-                            content_type = img_response.headers.get('content-type', 'image/jpeg')
-                            ext = 'jpg' if 'jpeg' in content_type else 'png' if 'png' in content_type else 'webp' if 'webp' in content_type else 'jpg'
-                            
-                            # Add to ZIP
-                            filename = f"image_{i+1:02d}.{ext}"
-                            zipf.writestr(filename, img_response.content)
-                            
-                        # Update progress
-                        progress = 50 + int((i + 1) / len(images) * 40)
-                        await update_task_progress(task_id, progress)
-                        
-                    except Exception as download_error:
-                        print(f"Failed to download image {i+1}: {download_error}")
+        fetched = await fetch_images(
+            images, on_progress=on_image_done, client=http_clients.get("tiktok_cdn")
+        )
+        if not any(fetched):
+            raise Exception("Failed to download slideshow images")
         
+        await update_task_progress(task_id, 90, stage="zipping")
+        zip_path = task_file_path(f"{task_id}_slideshow.zip")
+        await run_blocking("slideshow", write_slideshow_zip, zip_path, fetched)
+        
+        await asyncio.to_thread(file_index.register, task_id, zip_path)
         await update_task_progress(task_id, 95)
         
         result = SlideshowResult(
             download_url=f"{API_BASE_URL}/api/files/{task_id}_slideshow.zip",
             images=images,
-            audio_url=None,
+            audio_url=audio_url,
             filename=f"{task_id}_slideshow.zip"
         )
         
@@ -512,21 +914,22 @@ async def process_slideshow(task_id: str, url: str):
 async def process_audio(task_id: str, url: str, options: dict = None):
     """Process audio extraction task - extracts audio + vocals + instrumental"""
     try:
-        await update_task_progress(task_id, 10)
+        await update_task_progress(task_id, 10, stage="extracting")
         options = options or {}
         
         # Get video info first
-        info = get_video_info(url)
+        info = await run_blocking("audio", get_video_info, url)
         await update_task_progress(task_id, 20)
         
-        # Download audio first
-        await update_task_progress(task_id, 30)
-        audio_options = {'format': 'audio', 'audio_bitrate': options.get('audio_bitrate', '320')}
-        download_result = download_video(url, task_id, options=audio_options)
-        
-        filepath = download_result['filepath']
-        filename = download_result['filename']
-        file_size = download_result['file_size']
+        # Download the native audio stream (opus/m4a) - no intermediate MP3
+        await update_task_progress(task_id, 25, stage="downloading")
+        audio_bitrate = int(options.get('audio_bitrate') or 320)
+        audio_options = {'format': 'audio', 'native_audio': True}
+        download_result = await run_blocking(
+            "audio", download_video, url, task_id, options=audio_options, info=info,
+            progress_hook=make_download_progress_hook(task_id, 25, 50)
+        )
+        source_path = download_result['filepath']
         
         vocals_url = None
         vocals_filename = None
@@ -534,82 +937,87 @@ async def process_audio(task_id: str, url: str, options: dict = None):
         instrumental_filename = None
         
         # Auto-separate vocals and instrumental
-        await update_task_progress(task_id, 50)
-        
-        # Run demucs with --two-stems vocals to get vocals + instrumental (no_vocals)
-        cmd = [
-            "demucs",
-            "-n", "htdemucs",
-            "--two-stems", "vocals",
-            "--mp3",
-            "--mp3-bitrate", "320",
-            filepath,
-            "-o", DOWNLOAD_DIR
-        ]
-        
-        # Run command
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        _, stderr = await process.communicate()
+        await update_task_progress(task_id, 50, stage="separating")
         
-        if process.returncode != 0:
-            print(f"Demucs warning: {stderr.decode()} - Continuing with just full audio")
-        else:
-            await update_task_progress(task_id, 90)
+        filename = f"{task_id}.mp3"
+        filepath = task_file_path(filename)
+        if source_path == filepath:
+            # Source is already MP3 - keep the encode from truncating the stored copy
+            renamed = task_file_path(f"{task_id}_source.mp3")
+            os.replace(source_path, renamed)
+            await asyncio.to_thread(file_index.remove, source_path)
+            await asyncio.to_thread(file_index.register, task_id, renamed)
+            source_path = renamed
+        
+        # Decode once; the MP3 encode, fingerprint and separator share the buffer
+        decoded = await run_blocking("audio", decode_audio, source_path, info.get('duration'))
+        encode_task = asyncio.ensure_future(
+            run_blocking("audio", encode_mp3, decoded.pcm, filepath, audio_bitrate)
+        )
+        try:
+            # Split into vocals + instrumental in the persistent separation worker
+            last_update = 0.0
             
-            # Find the output files
-            track_name = os.path.splitext(filename)[0]
-            model_name = "htdemucs"
-            base_path = os.path.join(DOWNLOAD_DIR, model_name, track_name)
+            def on_separation_progress(fraction: float):
+                nonlocal last_update
+                now = time.monotonic()
+                if now - last_update >= PROGRESS_MIN_INTERVAL:
+                    last_update = now
+                    schedule_task_update(task_id, {"progress": 50 + int(40 * fraction), "stage": "separating"})
             
-            # Identify files
-            vocals_src = os.path.join(base_path, "vocals.mp3")
-            instr_src = os.path.join(base_path, "no_vocals.mp3")
+            async def separate(vocals_path: str, instrumental_path: str):
+                separation = await separator.separate(
+                    source_path,
+                    vocals_path,
+                    instrumental_path,
+                    bitrate=STEM_BITRATE,
+                    duration=info.get('duration'),
+                    on_progress=on_separation_progress,
+                    audio=decoded.spec
+                )
+                print(f"Separation timings for {task_id}: {separation.timings}")
+                await asyncio.to_thread(charge_task_usage, task_id, "cpu_seconds", separation.cpu_seconds)
             
-            # Move vocals
-            if os.path.exists(vocals_src):
-                vocals_filename = f"{task_id}_vocals.mp3"
-                vocals_dest = os.path.join(DOWNLOAD_DIR, vocals_filename)
-                os.rename(vocals_src, vocals_dest)
+            vocals_dest = task_file_path(f"{task_id}_vocals.mp3")
+            instr_dest = task_file_path(f"{task_id}_instrumental.mp3")
+            try:
+                # Same audio separated before: link the cached stems instead
+                fingerprint = await run_blocking("audio", pcm_fingerprint, decoded.pcm)
+                key = stem_key(fingerprint, separator.model_name, STEM_BITRATE)
+                stems, cached = await stem_cache.fetch(key, separate)
+                if cached:
+                    print(f"Stem cache hit for {task_id} ({key})")
+                download_store.link(stems.vocals, vocals_dest)
+                download_store.link(stems.instrumental, instr_dest)
+            except SeparationError as e:
+                print(f"Demucs warning: {e} - Continuing with just full audio")
+            else:
+                vocals_filename = os.path.basename(vocals_dest)
+                await asyncio.to_thread(file_index.register, task_id, vocals_dest)
                 vocals_url = f"{API_BASE_URL}/api/files/{vocals_filename}"
                 
-            # Move instrumental
-            if os.path.exists(instr_src):
-                instrumental_filename = f"{task_id}_instrumental.mp3"
-                instr_dest = os.path.join(DOWNLOAD_DIR, instrumental_filename)
-                os.rename(instr_src, instr_dest)
+                instrumental_filename = os.path.basename(instr_dest)
+                await asyncio.to_thread(file_index.register, task_id, instr_dest)
                 instrumental_url = f"{API_BASE_URL}/api/files/{instrumental_filename}"
+            
+            await encode_task
+        finally:
+            if not encode_task.done():
+                await asyncio.wait({encode_task})
+            decoded.close()
         
-        await update_task_progress(task_id, 95)
-        
-        # Helper to strict sanitize filename
-        def sanitize_filename(name):
-            # Replace invalid chars with underscore
-            clean = re.sub(r'[\\/*?:"<>|]', "", name)
-            # Replace spaces with underscores
-            clean = re.sub(r'\s+', "_", clean)
-            return clean[:50]  # Limit length
-
-        # Get title and builder platform-aware filename
-        title = info.get('title', 'audio')
-        extractor = info.get('extractor', 'unknown').replace(':', '').title()
-        
-        # Clean up platform name
-        if 'youtube' in extractor.lower(): extractor = 'YouTube'
-        elif 'tiktok' in extractor.lower(): extractor = 'TikTok'
-        elif 'instagram' in extractor.lower(): extractor = 'Instagram'
-        elif 'facebook' in extractor.lower(): extractor = 'Facebook'
+        await update_task_progress(task_id, 90)
+        await asyncio.to_thread(file_index.register, task_id, filepath)
+        file_size = os.path.getsize(filepath)
+        # The native stream stays in the download store; the task only serves MP3s
+        await asyncio.to_thread(file_index.remove, source_path)
         
-        clean_title = sanitize_filename(title)
+        await update_task_progress(task_id, 95)
         
-        # Base display name: My_Song_YouTube.mp3
-        display_base = f"{clean_title}_{extractor}"
-        display_full = f"{display_base}.mp3"
-        display_vocals = f"{display_base}_Vocals.mp3"
-        display_instr = f"{display_base}_Instrumental.mp3"
+        # Display names: My_Song_YouTube.mp3, My_Song_YouTube_Vocals.mp3, ...
+        display_full = display_filename(info, ".mp3", default_title="audio")
+        display_vocals = display_filename(info, "_Vocals.mp3", default_title="audio")
+        display_instr = display_filename(info, "_Instrumental.mp3", default_title="audio")
 
         result = AudioResult(
             download_url=f"{API_BASE_URL}/api/files/{filename}?download_name={display_full}",
@@ -629,26 +1037,6 @@ async def process_audio(task_id: str, url: str, options: dict = None):
         await fail_task(task_id, str(e))
 
 
-async def process_task(task_id: str, type: TaskType, url: str, options: dict = None):
-    """Route task to appropriate processor"""
-    try:
-        if type == "download":
-            await process_download(task_id, url, options)
-        elif type == "summary":
-            await process_summary(task_id, url)
-        elif type == "spy":
-            await process_spy(task_id, url)
-        elif type == "slideshow":
-            await process_slideshow(task_id, url)
-        elif type == "audio":
-            await process_audio(task_id, url, options)
-        else:
-            raise Exception(f"Unknown task type: {type}")
-            
-    except Exception as e:
-        await fail_task(task_id, str(e))
-
-
 # Task processor mapping
 PROCESSORS = {
     "download": process_download,
@@ -659,15 +1047,47 @@ PROCESSORS = {
 }
 
 
-async def process_task(task_id: str, task_type: TaskType, url: str, options: dict = None):
-    """Main task processor that routes to specific handlers"""
+async def refund_failed_task(task_id: str):
+    """Give the client back the rate limit unit of a failed task"""
+    task = await asyncio.to_thread(task_store.get, task_id)
+    if task and task.get("status") == "failed" and task.get("rate_limit"):
+        await asyncio.to_thread(rate_limiter.refund, task["rate_limit"]["identifier"], task["rate_limit"]["endpoint"])
+
+
+async def process_task(
+    task_id: str,
+    task_type: TaskType,
+    url: str,
+    options: dict = None,
+    retry: bool = False
+) -> Optional[str]:
+    """
+    Main task processor that routes to specific handlers.
+    
+    With retry=True a failure leaves the task pending for another attempt.
+    
+    Returns:
+        The error of a failed attempt that is to be retried, else None
+    """
     options = options or {}
     processor = PROCESSORS.get(task_type)
-    if processor:
-        # Pass options to download processor
-        if task_type == 'download':
-            await processor(task_id, url, options)
+    retry_state = {} if retry else None
+    token = _retry_on_failure.set(retry_state)
+    try:
+        if processor:
+            # Pass options to the processors that take them
+            if task_type in ('download', 'audio'):
+                await processor(task_id, url, options)
+            else:
+                await processor(task_id, url)
         else:
-            await processor(task_id, url)
-    else:
-        await fail_task(task_id, f"Unknown task type: {task_type}")
+            await fail_task(task_id, f"Unknown task type: {task_type}")
+    finally:
+        _retry_on_failure.reset(token)
+    
+    if retry_state and "error" in retry_state:
+        return retry_state["error"]
+    
+    # Failed tasks don't count against the client's quota
+    await refund_failed_task(task_id)
+    return None
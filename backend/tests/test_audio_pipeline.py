@@ -0,0 +1,76 @@
+"""ffmpeg decode into memory-mapped PCM: the input file is read, the PCM file grows and is removed on close."""
+
+import array
+import math
+import os
+import shutil
+import sys
+import tempfile
+import wave
+
+os.environ.setdefault("PCM_DIR", tempfile.mkdtemp(prefix="vtool-pcm-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from audio_pipeline import PCM_SAMPLE_RATE, PCM_CHANNELS, decode_audio
+
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+
+def write_wav(path: str, seconds: float, sample_rate: int = 8000, frequency: float = 440.0):
+    """Stereo 16-bit sine tone at half scale (stereo, so ffmpeg does not remix it)."""
+    samples = array.array("h")
+    for i in range(int(seconds * sample_rate)):
+        sample = int(16384 * math.sin(2 * math.pi * frequency * i / sample_rate))
+        samples.extend((sample, sample))
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+
+
+def peak(pcm: memoryview) -> float:
+    return max(abs(sample) for sample in pcm.cast("f"))
+
+
+def test_decode_reads_input_file(tmp_path):
+    source = str(tmp_path / "tone.wav")
+    write_wav(source, seconds=1.0)
+
+    with decode_audio(source, expected_seconds=1.0) as decoded:
+        spec = decoded.spec
+        assert spec.pcm_path != source
+        assert os.path.exists(spec.pcm_path)
+        assert spec.channels == PCM_CHANNELS and spec.sample_rate == PCM_SAMPLE_RATE
+        assert abs(spec.duration - 1.0) < 0.05
+        assert len(decoded.pcm) == spec.nbytes
+        assert peak(decoded.pcm) == pytest.approx(0.5, abs=0.02)
+        pcm_path = spec.pcm_path
+
+    assert not os.path.exists(pcm_path)
+    assert os.path.exists(source)
+
+
+def test_decode_grows_past_duration_hint(tmp_path):
+    source = str(tmp_path / "long.wav")
+    # Hint of 0 s sizes the file for 5 s of audio
+    write_wav(source, seconds=7.0)
+
+    with decode_audio(source, expected_seconds=0) as decoded:
+        assert abs(decoded.spec.duration - 7.0) < 0.05
+        assert peak(decoded.pcm[-PCM_SAMPLE_RATE * 8:]) == pytest.approx(0.5, abs=0.02)
+
+
+def test_decode_failure_removes_pcm_file(tmp_path):
+    source = str(tmp_path / "broken.wav")
+    with open(source, "wb") as f:
+        f.write(b"not audio")
+    before = set(os.listdir(os.environ["PCM_DIR"]))
+
+    with pytest.raises(Exception, match="Audio decode failed"):
+        decode_audio(source)
+
+    assert set(os.listdir(os.environ["PCM_DIR"])) == before
@@ -0,0 +1,71 @@
+"""Job queue claim order: weighted fair queuing between tiers, not strict priority."""
+
+import os
+import sys
+import tempfile
+from collections import Counter
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="vtool-data-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import JobQueue
+
+
+def make_queue(tmp_path) -> JobQueue:
+    return JobQueue(path=str(tmp_path / "jobs.db"))
+
+
+def enqueue(queue: JobQueue, job_id: str, tier: str, task_type: str = "download", cost: float = 1.0) -> float:
+    return queue.enqueue(job_id, {"task_id": job_id, "type": task_type, "tier": tier}, cost=cost)
+
+
+def claim_tiers(queue: JobQueue, count: int) -> Counter:
+    tiers = Counter()
+    for _ in range(count):
+        job = queue.claim("w1", ["download", "slideshow"])
+        tiers[job.payload["tier"]] += 1
+        queue.complete(job.id, "w1")
+    return tiers
+
+
+def test_claims_follow_tier_weights(tmp_path):
+    queue = make_queue(tmp_path)
+    for i in range(20):
+        enqueue(queue, f"anon-{i}", "anonymous")
+        enqueue(queue, f"prem-{i}", "premium")
+    # premium weight 4, anonymous 1
+    assert claim_tiers(queue, 10) == Counter(premium=8, anonymous=2)
+
+
+def test_anonymous_not_starved_by_premium_backlog(tmp_path):
+    queue = make_queue(tmp_path)
+    enqueue(queue, "anon-0", "anonymous")
+    for i in range(50):
+        enqueue(queue, f"prem-{i}", "premium")
+    assert claim_tiers(queue, 5)["anonymous"] == 1
+
+
+def test_idle_tier_does_not_build_up_credit(tmp_path):
+    queue = make_queue(tmp_path)
+    for i in range(10):
+        enqueue(queue, f"prem-{i}", "premium")
+    claim_tiers(queue, 10)
+    # Anonymous starts from the class virtual time, not from zero
+    for i in range(4):
+        enqueue(queue, f"anon-{i}", "anonymous")
+        enqueue(queue, f"prem-late-{i}", "premium")
+    assert claim_tiers(queue, 4)["premium"] >= 3
+
+
+def test_backlog_counts_jobs_claimed_first(tmp_path):
+    queue = make_queue(tmp_path)
+    for i in range(8):
+        enqueue(queue, f"anon-{i}", "anonymous")
+    # A premium newcomer overtakes the anonymous backlog
+    tag = enqueue(queue, "prem", "premium")
+    ahead, running, workers = queue.backlog(["download", "slideshow"], tag)
+    assert ahead == {}
+    assert (running, workers) == (0, 0)
+    tag = enqueue(queue, "anon-late", "anonymous", task_type="slideshow")
+    ahead, _, _ = queue.backlog(["download", "slideshow"], tag)
+    assert ahead == {"download": 9}
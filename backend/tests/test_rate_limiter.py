@@ -0,0 +1,65 @@
+"""Sliding window math of the rate limiter: reset times must match when a request is allowed again."""
+
+import os
+import sys
+
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from rate_limiter import HOUR_SECONDS, DAY_SECONDS, UsageRecord, WindowCounter
+
+
+HOUR_START = 100 * DAY_SECONDS
+
+
+def make_record(previous: float, current: float, now: float) -> UsageRecord:
+    return UsageRecord(
+        now,
+        hourly=WindowCounter(HOUR_SECONDS, now, HOUR_START, current, previous),
+        daily=WindowCounter(DAY_SECONDS, now, HOUR_START, 0.0, 0.0)
+    )
+
+
+def retry_after(previous: float, current: float, now: float, limit: float, cost: float = 1) -> int:
+    decision = make_record(previous, current, now).consume(limit, 1000, cost, now)
+    assert not decision.allowed
+    return decision.reset_seconds
+
+
+def allowed_at(previous: float, current: float, now: float, limit: float, cost: float = 1) -> bool:
+    return make_record(previous, current, now).consume(limit, 1000, cost, now).allowed
+
+
+def test_estimate_weights_previous_window_by_overlap():
+    counter = WindowCounter(HOUR_SECONDS, HOUR_START + 1800, HOUR_START, 1.0, 2.0)
+    assert counter.estimate(HOUR_START + 1800) == pytest.approx(2.0)
+
+
+def test_retry_after_waits_for_previous_window_to_drain():
+    # limit 2, previous=2, current=1, halfway: estimate 2, allowed once 2 * (1 - t) + 1 <= 1
+    now = HOUR_START + 1800
+    reset = retry_after(previous=2, current=1, now=now, limit=2)
+    assert 1800 <= reset <= 1801
+    assert not allowed_at(2, 1, now + reset - 2, limit=2)
+
+
+@pytest.mark.parametrize("previous,current,offset,limit,cost", [
+    (2, 1, 1800, 2, 1),
+    (5, 0, 600, 3, 1),
+    (4, 2, 900, 5, 2),
+    (0, 3, 1200, 2, 1),   # current window alone is over the limit
+    (3, 2, 300, 2, 1),
+])
+def test_request_allowed_when_retry_after_elapses(previous, current, offset, limit, cost):
+    now = HOUR_START + offset
+    reset = retry_after(previous, current, now, limit, cost)
+    # Counters roll if the wait crosses into the next window
+    assert allowed_at(previous, current, now + reset, limit, cost)
+    assert not allowed_at(previous, current, now + reset - 2, limit, cost)
+
+
+def test_cost_above_limit_is_never_allowed():
+    now = HOUR_START + 10
+    assert not allowed_at(0, 0, now, limit=5, cost=6)
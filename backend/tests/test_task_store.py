@@ -0,0 +1,50 @@
+"""Task records served by the API must not carry client identities; stream fetches are capped atomically."""
+
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="vtool-data-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from task_store import PRIVATE_FIELDS, MemoryTaskStore, SQLiteTaskStore, public_task
+
+
+def test_public_task_drops_private_fields():
+    task = {
+        "id": "t1",
+        "user_id": "u1",
+        "type": "download",
+        "status": "completed",
+        "rate_limit": {"identifier": "ip:203.0.113.9", "endpoint": "download", "is_premium": False},
+        "stream": {"format_id": "140"},
+        "stream_opens": 2,
+        "result": {"download_url": "/api/stream/t1"},
+    }
+    public = public_task(task)
+    assert not set(PRIVATE_FIELDS) & set(public)
+    assert "203.0.113.9" not in repr(public)
+    assert public["result"] == task["result"]
+    assert task["rate_limit"]  # the stored record is untouched
+
+
+def _claims_under_contention(store):
+    store.create({"id": "t1", "type": "download", "status": "completed"})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        granted = list(pool.map(lambda _: store.claim_stream("t1", 3), range(16)))
+    assert granted.count(True) == 3
+    assert store.get("t1")["stream_opens"] == 3
+
+    store.release_stream("t1")
+    assert store.claim_stream("t1", 3)
+    assert not store.claim_stream("t1", 3)
+    assert not store.claim_stream("missing", 3)
+
+
+def test_memory_store_claims_stream_atomically():
+    _claims_under_contention(MemoryTaskStore())
+
+
+def test_sqlite_store_claims_stream_atomically():
+    _claims_under_contention(SQLiteTaskStore(os.path.join(tempfile.mkdtemp(), "tasks.db")))
@@ -0,0 +1,34 @@
+"""TikTok page parser against the saved page fixtures in benchmarks/fixtures."""
+
+import glob
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from tiktok_parser import parse_slideshow_page
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "fixtures")
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+
+
+def test_fixtures_present():
+    assert FIXTURES
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=os.path.basename)
+def test_parser_matches_sidecar(path):
+    with open(path, encoding="utf-8") as f:
+        page = parse_slideshow_page(f.read())
+    with open(os.path.splitext(path)[0] + ".json") as f:
+        expected = json.load(f)
+    assert page is not None
+    assert {"item_id": page.item_id, "images": page.image_urls, "audio_url": page.audio_url} == expected
+
+
+def test_page_without_state_block():
+    assert parse_slideshow_page("<html><body>Please wait...</body></html>") is None
@@ -0,0 +1,148 @@
+"""
+TikTok page parser for V-Tool API.
+Extracts slideshow data from the JSON rehydration block TikTok embeds in its
+HTML (<script id="__UNIVERSAL_DATA_FOR_REHYDRATION__">, older pages use
+SIGI_STATE). The block is located with plain string searches and parsed
+once with json.loads, instead of regex-scanning the whole document.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional
+
+
+# Script blocks carrying page state, newest layout first
+_STATE_SCRIPT_IDS = ("__UNIVERSAL_DATA_FOR_REHYDRATION__", "SIGI_STATE")
+
+
+@dataclass
+class SlideshowImage:
+    """One slideshow image with every CDN/format variant TikTok lists."""
+    urls: List[str]
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+    @property
+    def best_url(self) -> str:
+        """Preferred variant (TikTok CDN first, as the ZIP fetcher expects)."""
+        for url in self.urls:
+            if 'tiktokcdn' in url:
+                return url
+        return self.urls[0]
+
+
+@dataclass
+class SlideshowPage:
+    """Slideshow data parsed from a TikTok photo post."""
+    item_id: Optional[str]
+    images: List[SlideshowImage] = field(default_factory=list)
+    audio_url: Optional[str] = None
+
+    @property
+    def image_urls(self) -> List[str]:
+        """Best URL of each image, in slideshow order."""
+        return [image.best_url for image in self.images]
+
+
+def extract_script_json(html: str, script_id: str) -> Optional[Any]:
+    """Parse the JSON content of <script id="script_id">, or None."""
+    marker = html.find(f'id="{script_id}"')
+    if marker == -1:
+        return None
+    start = html.find('>', marker)
+    end = html.find('</script>', start)
+    if start == -1 or end == -1:
+        return None
+    try:
+        return json.loads(html[start + 1:end])
+    except ValueError as e:
+        print(f"TikTok parser: invalid JSON in {script_id}: {e}")
+        return None
+
+
+def _find_item_struct(state: Any) -> Optional[dict]:
+    """Locate the post's item dict in a rehydration/SIGI state object."""
+    if not isinstance(state, dict):
+        return None
+
+    # __UNIVERSAL_DATA_FOR_REHYDRATION__
+    detail = state.get("__DEFAULT_SCOPE__", {}).get("webapp.video-detail", {})
+    item = detail.get("itemInfo", {}).get("itemStruct")
+    if isinstance(item, dict):
+        return item
+
+    # SIGI_STATE
+    items = state.get("ItemModule")
+    if isinstance(items, dict):
+        for item in items.values():
+            if isinstance(item, dict) and "imagePost" in item:
+                return item
+
+    # Unknown layout: look for the first dict carrying an imagePost
+    for candidate in _walk_dicts(state):
+        if "imagePost" in candidate:
+            return candidate
+    return None
+
+
+def _walk_dicts(value: Any) -> Iterator[dict]:
+    stack = [value]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+
+
+def _url_list(value: Any) -> List[str]:
+    """URLs from TikTok's {"urlList": [...]} / {"UrlList": [...]} / str shapes."""
+    if isinstance(value, str):
+        return [value] if value else []
+    if isinstance(value, dict):
+        urls = value.get("urlList") or value.get("UrlList") or []
+        return [u for u in urls if isinstance(u, str) and u]
+    return []
+
+
+def parse_item(item: dict) -> SlideshowPage:
+    """Build a SlideshowPage from a TikTok item dict."""
+    images = []
+    seen = set()
+    for image in (item.get("imagePost") or {}).get("images") or []:
+        urls = _url_list(image.get("imageURL"))
+        if not urls or urls[0] in seen:
+            continue
+        seen.add(urls[0])
+        images.append(SlideshowImage(
+            urls=urls,
+            width=image.get("imageWidth"),
+            height=image.get("imageHeight")
+        ))
+
+    audio_urls = _url_list((item.get("music") or {}).get("playUrl"))
+    return SlideshowPage(
+        item_id=item.get("id"),
+        images=images,
+        audio_url=audio_urls[0] if audio_urls else None
+    )
+
+
+def parse_slideshow_page(html: str) -> Optional[SlideshowPage]:
+    """
+    Parse a TikTok photo post page.
+
+    Returns:
+        SlideshowPage (possibly with no images if the post is a video),
+        or None if no known state block was found
+    """
+    for script_id in _STATE_SCRIPT_IDS:
+        state = extract_script_json(html, script_id)
+        if state is None:
+            continue
+        item = _find_item_struct(state)
+        if item is not None:
+            return parse_item(item)
+        print(f"TikTok parser: no item found in {script_id}")
+    return None
@@ -0,0 +1,222 @@
+"""
+Video metadata cache for V-Tool API.
+Caches yt-dlp extraction results keyed by normalized URL / extractor video id.
+Bounded LRU with a per-platform TTL; concurrent misses for the same key are
+served by a single in-flight extraction.
+"""
+
+import copy
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import (
+    VIDEO_INFO_CACHE_MAX_ENTRIES,
+    VIDEO_INFO_CACHE_DEFAULT_TTL,
+    VIDEO_INFO_CACHE_TTLS,
+)
+from singleflight import SingleFlight
+
+
+# Query parameters that never change which video a URL points to
+_TRACKING_PARAMS = {
+    "si", "feature", "pp", "fbclid", "gclid", "igsh", "igshid",
+    "is_from_webapp", "sender_device", "sender_web_id", "_r", "_t",
+    "share_app_id", "share_link_id", "social_sharing", "mibextid",
+}
+
+_VIDEO_ID_PATTERNS = [
+    ("youtube", re.compile(r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([\w-]{11})")),
+    ("tiktok", re.compile(r"tiktok\.com/(?:@[\w.-]+/(?:video|photo)|v|embed(?:/v2)?)/(\d+)")),
+    ("instagram", re.compile(r"instagram\.com/(?:[\w.]+/)?(?:p|reels?|tv)/([\w-]+)")),
+    ("facebook", re.compile(r"facebook\.com/(?:.*/videos/|reel/|watch/?\?v=)(\d+)")),
+]
+
+
+def normalize_url(url: str) -> str:
+    """
+    Build a cache key for a video URL.
+
+    Known platforms map to "platform:video_id" so every URL form of the same
+    video (short links, mobile hosts, share parameters) hits one entry.
+    Other URLs are canonicalized: lowercase host, no "www."/"m." prefix,
+    no fragment, tracking parameters removed, query sorted.
+    """
+    url = url.strip()
+    for platform, pattern in _VIDEO_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return f"{platform}:{match.group(1)}"
+
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def info_key(info: dict) -> Optional[str]:
+    """Cache key derived from an extracted info dict ("platform:video_id")."""
+    video_id = info.get("id")
+    extractor = (info.get("extractor_key") or info.get("extractor") or "").lower()
+    if not video_id or not extractor:
+        return None
+    for platform, _ in _VIDEO_ID_PATTERNS:
+        if platform in extractor:
+            return f"{platform}:{video_id}"
+    return f"{extractor}:{video_id}"
+
+
+def _platform_of(key: str) -> str:
+    """Platform name for TTL lookup ("youtube", "tiktok", ... or host)."""
+    if "://" not in key:
+        return key.split(":", 1)[0]
+    host = urlsplit(key).netloc
+    for platform in VIDEO_INFO_CACHE_TTLS:
+        if platform in host:
+            return platform
+    return host
+
+
+@dataclass
+class CacheEntry:
+    """A cached info dict and its expiry time."""
+    info: dict
+    expires_at: float
+
+
+class VideoInfoCache:
+    """Thread-safe LRU + TTL cache of yt-dlp info dicts."""
+
+    def __init__(
+        self,
+        max_entries: int = VIDEO_INFO_CACHE_MAX_ENTRIES,
+        default_ttl: int = VIDEO_INFO_CACHE_DEFAULT_TTL,
+        ttls: Optional[Dict[str, int]] = None
+    ):
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = Lock()
+        self._flight = SingleFlight()
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = ttls if ttls is not None else VIDEO_INFO_CACHE_TTLS
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def ttl_for(self, key: str) -> int:
+        """TTL in seconds for a cache key, based on its platform."""
+        return self.ttls.get(_platform_of(key), self.default_ttl)
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached info dict, or None on miss/expiry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            info = entry.info
+        # Callers (and yt-dlp's process_ie_result) mutate info dicts
+        return copy.deepcopy(info)
+
+    def put(self, key: str, info: dict):
+        """Store an info dict under its URL key and its video id key."""
+        keys = {key}
+        id_key = info_key(info)
+        if id_key:
+            keys.add(id_key)
+
+        expires_at = time.monotonic() + self.ttl_for(id_key or key)
+        entry = CacheEntry(info=copy.deepcopy(info), expires_at=expires_at)
+
+        with self._lock:
+            for k in keys:
+                self._entries[k] = entry
+                self._entries.move_to_end(k)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_extract(self, url: str, extract: Callable[[str], dict]) -> dict:
+        """
+        Return cached info for url, extracting it on a miss.
+
+        Concurrent misses for the same key share one call to extract.
+        """
+        key = normalize_url(url)
+
+        info = self.get(key)
+        if info is not None:
+            with self._lock:
+                self.hits += 1
+            return info
+
+        def _load() -> dict:
+            # Another flight may have filled the entry while we queued
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+            extracted = extract(url)
+            self.put(key, extracted)
+            return extracted
+
+        info, shared = self._flight.do(key, _load)
+        with self._lock:
+            if shared:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+        # The flight result is shared between waiters, so each gets its own copy
+        return copy.deepcopy(info)
+
+    def invalidate(self, url: str):
+        """Drop the entry for a URL (e.g. after its media URLs expired)."""
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                id_key = info_key(entry.info)
+                if id_key:
+                    self._entries.pop(id_key, None)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Cache counters for health/debug endpoints."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "in_flight": self._flight.in_flight(),
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Global video info cache instance
+video_info_cache = VideoInfoCache()
@@ -0,0 +1,146 @@
+"""
+Task worker for V-Tool API.
+Claims jobs from the job queue and runs them with process_task, so
+downloads, demucs and rembg run outside the API processes. Start one or
+more with TASK_EXECUTION=queue:
+
+    python worker.py
+
+Each worker holds up to WORKER_CONCURRENCY jobs, heartbeats their leases
+and runs them through the task scheduler. It only claims jobs of resource
+classes with a free slot, so a burst of audio jobs can't fill the worker
+ahead of queued lookups; on SIGTERM it stops claiming and finishes what it has.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+
+from config import (
+    SEPARATOR_MODE,
+    WORKER_CONCURRENCY,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_POLL_INTERVAL,
+)
+from http_clients import http_clients
+from job_queue import job_queue, Job
+from scheduler import scheduler, Ticket
+from separator import separator
+from tasks import process_task, fail_task, refund_failed_task, is_transient_error
+from workers import worker_pool
+
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def _heartbeat(job: Job):
+    """Keep the job's lease alive while it runs; returns once the lease is lost"""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        try:
+            if not await asyncio.to_thread(job_queue.heartbeat, job.id, WORKER_ID):
+                print(f"⚠️ Lost lease on job {job.id}")
+                return
+        except Exception as e:
+            # Still leased until it expires - try again next beat
+            print(f"Heartbeat error for job {job.id}: {e}")
+
+
+async def run_job(job: Job, ticket: Ticket):
+    """Run one claimed (and admitted) job and record the outcome"""
+    payload = job.payload
+    print(f"▶️ Job {job.id} ({payload['type']}), attempt {job.attempts}/{job.max_attempts}")
+    # Processors catch their own errors and fail the task; while attempts are
+    # left process_task leaves it pending instead and returns the error
+    retry = job.attempts < job.max_attempts
+    work = asyncio.create_task(scheduler.run(
+        ticket, process_task, payload["task_id"], payload["type"], payload["url"], payload.get("options"), retry
+    ))
+    heartbeat = asyncio.create_task(_heartbeat(job))
+    try:
+        await asyncio.wait({work, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            # Another worker may have claimed the job already - don't run it twice
+            work.cancel()
+            await asyncio.wait({work})
+            print(f"⏹️ Abandoned job {job.id} after losing its lease")
+            return
+        try:
+            error = work.result()
+        except Exception as e:
+            retrying = await asyncio.to_thread(job_queue.fail, job.id, WORKER_ID, repr(e), is_transient_error(e))
+            print(f"❌ Job {job.id} failed: {e}{' - will retry' if retrying else ''}")
+            if not retrying:
+                await fail_task(payload["task_id"], str(e))
+                await refund_failed_task(payload["task_id"])
+        else:
+            if error:
+                retrying = await asyncio.to_thread(job_queue.fail, job.id, WORKER_ID, error)
+                print(f"❌ Job {job.id} failed: {error}{' - will retry' if retrying else ''}")
+            else:
+                await asyncio.to_thread(job_queue.complete, job.id, WORKER_ID)
+    finally:
+        heartbeat.cancel()
+        work.cancel()
+
+
+async def _reap_lost_jobs():
+    """Fail the tasks of jobs whose worker died on their last attempt"""
+    for job_id in await asyncio.to_thread(job_queue.reap):
+        # Job ids are task ids
+        await fail_task(job_id, "Processing was interrupted")
+        await refund_failed_task(job_id)
+
+
+async def main():
+    print(f"🛠️ Starting V-Tool worker {WORKER_ID} ({WORKER_CONCURRENCY} slots)")
+    http_clients.start()
+    if SEPARATOR_MODE == "worker":
+        separator.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    running = set()
+    try:
+        while not stop.is_set():
+            claimed = 0
+            if len(running) < WORKER_CONCURRENCY:
+                try:
+                    await _reap_lost_jobs()
+                    # One job per class with a free slot - admitted right away, so it never waits here
+                    for class_name in scheduler.free_classes():
+                        if len(running) >= WORKER_CONCURRENCY:
+                            break
+                        job = await asyncio.to_thread(job_queue.claim, WORKER_ID, scheduler.task_types(class_name))
+                        if job is None:
+                            continue
+                        payload = job.payload
+                        ticket = scheduler.admit(payload["task_id"], payload["type"], payload.get("tier", "anonymous"))
+                        task = asyncio.create_task(run_job(job, ticket))
+                        running.add(task)
+                        task.add_done_callback(running.discard)
+                        claimed += 1
+                except Exception as e:
+                    print(f"Job claim error: {e}")
+            if not claimed:
+                # Full, or nothing to claim
+                try:
+                    await asyncio.wait_for(stop.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+        print(f"👋 Stopping worker - waiting for {len(running)} running jobs")
+        if running:
+            await asyncio.wait(running)
+    finally:
+        worker_pool.shutdown()
+        separator.shutdown()
+        await http_clients.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Blocking work pool for V-Tool API.
+Runs synchronous yt-dlp extraction/download (and other blocking calls) on a
+dedicated thread pool so the asyncio event loop keeps serving requests.
+Each task type has its own concurrency limit; excess work waits in a queue
+whose depth is reported for monitoring.
+"""
+
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import WORKER_POOL_SIZE, TASK_CONCURRENCY_LIMITS
+
+
+class BlockingWorkPool:
+    """Thread pool with per-kind concurrency limits and queue accounting."""
+
+    def __init__(
+        self,
+        max_workers: int = WORKER_POOL_SIZE,
+        limits: Optional[Dict[str, int]] = None
+    ):
+        self.max_workers = max_workers
+        self.limits = limits if limits is not None else TASK_CONCURRENCY_LIMITS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._queued: Dict[str, int] = defaultdict(int)
+        self._running: Dict[str, int] = defaultdict(int)
+        self._completed: Dict[str, int] = defaultdict(int)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="vtool-worker"
+            )
+        return self._executor
+
+    def _get_semaphore(self, kind: str) -> asyncio.Semaphore:
+        if kind not in self._semaphores:
+            limit = self.limits.get(kind, self.max_workers)
+            self._semaphores[kind] = asyncio.Semaphore(max(1, limit))
+        return self._semaphores[kind]
+
+    def _release(self, kind: str, semaphore: asyncio.Semaphore):
+        self._running[kind] -= 1
+        self._completed[kind] += 1
+        semaphore.release()
+
+    async def run(self, kind: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking callable in the pool and await its result.
+
+        Args:
+            kind: Concurrency class (task type, e.g. 'download', 'spy')
+            fn: Blocking callable
+
+        Returns:
+            Whatever fn returns (exceptions are re-raised)
+        """
+        semaphore = self._get_semaphore(kind)
+
+        self._queued[kind] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._queued[kind] -= 1
+
+        self._running[kind] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(kind, semaphore)
+            raise
+
+        def _on_done(_):
+            # The slot is held until the thread really finishes, even if the
+            # awaiting coroutine was cancelled in the meantime
+            try:
+                loop.call_soon_threadsafe(self._release, kind, semaphore)
+            except RuntimeError:
+                pass  # Event loop already closed
+
+        future.add_done_callback(_on_done)
+        return await asyncio.wrap_future(future)
+
+    def get_stats(self) -> Dict:
+        """Queue depth and running counts per kind."""
+        kinds = set(self.limits) | set(self._queued) | set(self._running)
+        per_kind = {
+            kind: {
+                "limit": self.limits.get(kind, self.max_workers),
+                "running": self._running[kind],
+                "queued": self._queued[kind],
+                "completed": self._completed[kind],
+            }
+            for kind in sorted(kinds)
+        }
+        return {
+            "max_workers": self.max_workers,
+            "running": sum(self._running.values()),
+            "queued": sum(self._queued.values()),
+            "kinds": per_kind,
+        }
+
+    def shutdown(self):
+        """Stop accepting work; queued jobs that have not started are dropped."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Global work pool instance
+worker_pool = BlockingWorkPool()
+
+
+async def run_blocking(kind: str, fn: Callable, *args, **kwargs) -> Any:
+    """Shortcut for worker_pool.run()."""
+    return await worker_pool.run(kind, fn, *args, **kwargs)
+
+
+def timed(fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    """
+    Call fn and return (result, seconds it ran). Submit this to the executor
+    rather than timing around the await, so time spent queued for a thread
+    isn't counted (e.g. when billing cpu_seconds). Wall time, not thread
+    time: ONNX/torch inference runs on their own thread pools.
+    """
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
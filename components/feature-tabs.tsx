@@ -15,6 +15,7 @@ import {
 import { ProcessorForm } from '@/components/processor-form';
 import { TaskProgress } from '@/components/task-progress';
 import { ResultDisplay } from '@/components/result-display';
+import ReactMarkdown from 'react-markdown';
 import { FormatSelector, FormatOption } from '@/components/format-selector';
 import { BackgroundRemoval } from '@/components/background-removal';
 import { useTaskStatus } from '@/hooks/useTaskStatus';
@@ -88,7 +89,7 @@ function FeaturePanel({ feature, onStateChange }: FeaturePanelProps) {
     const [lastUrl, setLastUrl] = useState<string>('');
     const [showFormatModal, setShowFormatModal] = useState(false);
     const [isReprocessing, setIsReprocessing] = useState(false);
-    const { status, progress, result, error, isConnected } = useTaskStatus(taskId);
+    const { status, progress, result, error, isConnected, partialMarkdown } = useTaskStatus(taskId);
 
     // Notify parent about state change (result presence)
     useEffect(() => {
@@ -182,6 +183,12 @@ function FeaturePanel({ feature, onStateChange }: FeaturePanelProps) {
         return (
             <div className="space-y-4">
                 <TaskProgress status={status} progress={progress} isConnected={isConnected} />
+                {partialMarkdown && (
+                    <div className="prose prose-invert prose-sm max-w-none break-words overflow-hidden
+                          prose-headings:text-foreground prose-p:text-muted-foreground">
+                        <ReactMarkdown>{partialMarkdown}</ReactMarkdown>
+                    </div>
+                )}
                 <Button variant="outline" onClick={handleReset} className="w-full">
                     <ArrowLeft className="w-4 h-4 mr-2" />
                     {t.task.cancel}
@@ -290,6 +290,7 @@ function AudioResultDisplay({ result }: { result: AudioResult }) {
             title: "Full Audio",
             url: result.download_url,
             filename: result.filename,
+            streamed: result.streamed,
             icon: FileAudio,
             color: "text-emerald-400",
             bg: "bg-emerald-500/20",
@@ -301,6 +302,7 @@ function AudioResultDisplay({ result }: { result: AudioResult }) {
             title: "Vocals Only", // TODO: Add to dictionary if needed, or keep generic English for technical terms
             url: result.vocals_url,
             filename: result.vocals_filename || "vocals.mp3",
+            streamed: false,
             icon: Mic,
             color: "text-blue-400",
             bg: "bg-blue-500/20",
@@ -312,6 +314,7 @@ function AudioResultDisplay({ result }: { result: AudioResult }) {
             title: "Instrumental (Beat)",
             url: result.instrumental_url,
             filename: result.instrumental_filename || "instrumental.mp3",
+            streamed: false,
             icon: Music,
             color: "text-violet-400",
             bg: "bg-violet-500/20",
@@ -344,6 +347,8 @@ function AudioResultDisplay({ result }: { result: AudioResult }) {
                             controls
                             className="w-full mb-4 h-10"
                             src={track.url}
+                            // A streamed URL starts a new download per request: fetch only on play
+                            preload={track.streamed ? 'none' : undefined}
                         >
                             Your browser does not support the audio element.
                         </audio>
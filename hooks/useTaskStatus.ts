@@ -2,17 +2,33 @@
 
 import { useEffect, useState, useCallback, useRef } from 'react';
 import { Task, UseTaskStatusReturn } from '@/types';
-import { getTask } from '@/lib/api';
+import { getTask, getTaskEventsUrl } from '@/lib/api';
 
-// Polling interval in milliseconds
+// Polling interval in milliseconds (fallback when the event stream is unavailable)
 const POLL_INTERVAL = 1000;
 
+function isFinished(task: Task) {
+    return task.status === 'completed' || task.status === 'failed';
+}
+
 export function useTaskStatus(taskId: string | null): UseTaskStatusReturn {
     const [task, setTask] = useState<Task | null>(null);
     const [isLoading, setIsLoading] = useState(false);
     const [isConnected, setIsConnected] = useState(false);
     const [error, setError] = useState<string | null>(null);
     const pollingRef = useRef<NodeJS.Timeout | null>(null);
+    const eventSourceRef = useRef<EventSource | null>(null);
+
+    const stopUpdates = useCallback(() => {
+        if (pollingRef.current) {
+            clearInterval(pollingRef.current);
+            pollingRef.current = null;
+        }
+        if (eventSourceRef.current) {
+            eventSourceRef.current.close();
+            eventSourceRef.current = null;
+        }
+    }, []);
 
     // Fetch task data from API
     const fetchTask = useCallback(async (id: string) => {
@@ -23,27 +39,28 @@ export function useTaskStatus(taskId: string | null): UseTaskStatusReturn {
             setIsConnected(true);
 
             // Stop polling if task is completed or failed
-            if (data.status === 'completed' || data.status === 'failed') {
-                if (pollingRef.current) {
-                    clearInterval(pollingRef.current);
-                    pollingRef.current = null;
-                }
+            if (isFinished(data as Task)) {
+                stopUpdates();
             }
         } catch (err) {
             setError(err instanceof Error ? err.message : 'Failed to fetch task');
             setIsConnected(false);
         }
-    }, []);
+    }, [stopUpdates]);
+
+    const startPolling = useCallback((id: string) => {
+        if (pollingRef.current) return;
+        pollingRef.current = setInterval(() => {
+            fetchTask(id);
+        }, POLL_INTERVAL);
+    }, [fetchTask]);
 
     useEffect(() => {
         if (!taskId) {
             setTask(null);
             setIsConnected(false);
             setError(null);
-            if (pollingRef.current) {
-                clearInterval(pollingRef.current);
-                pollingRef.current = null;
-            }
+            stopUpdates();
             return;
         }
 
@@ -51,24 +68,45 @@ export function useTaskStatus(taskId: string | null): UseTaskStatusReturn {
         setIsLoading(true);
         fetchTask(taskId).finally(() => setIsLoading(false));
 
-        // Start polling for updates
-        pollingRef.current = setInterval(() => {
-            fetchTask(taskId);
-        }, POLL_INTERVAL);
+        // Subscribe to pushed updates; fall back to polling if unsupported
+        if (typeof EventSource === 'undefined') {
+            startPolling(taskId);
+        } else {
+            const source = new EventSource(getTaskEventsUrl(taskId));
+            eventSourceRef.current = source;
+
+            source.addEventListener('open', () => setIsConnected(true));
+            source.addEventListener('task', (event) => {
+                const data = JSON.parse((event as MessageEvent).data) as Task;
+                setTask(data);
+                setError(null);
+                setIsConnected(true);
+                if (isFinished(data)) {
+                    stopUpdates();
+                }
+            });
+            source.addEventListener('error', () => {
+                // Stream closed by the server or the network - keep updating by polling
+                source.close();
+                if (eventSourceRef.current === source) {
+                    eventSourceRef.current = null;
+                    fetchTask(taskId);
+                    startPolling(taskId);
+                }
+            });
+        }
 
         // Cleanup on unmount or taskId change
-        return () => {
-            if (pollingRef.current) {
-                clearInterval(pollingRef.current);
-                pollingRef.current = null;
-            }
-        };
-    }, [taskId, fetchTask]);
+        return stopUpdates;
+    }, [taskId, fetchTask, startPolling, stopUpdates]);
 
     return {
         task,
         status: task?.status ?? null,
         progress: task?.progress ?? 0,
+        stage: task?.stage ?? null,
+        transfer: task?.transfer ?? null,
+        partialMarkdown: task?.partial_markdown ?? null,
         result: task?.result ?? null,
         error: error || task?.error_message || null,
         isLoading,
@@ -48,3 +48,7 @@ export async function getTask(taskId: string) {
 
     return response.json();
 }
+
+export function getTaskEventsUrl(taskId: string) {
+    return `${API_URL}/api/tasks/${taskId}/events`;
+}
@@ -67,6 +67,8 @@ export interface AudioResult {
   duration: number;
   format: string;
   file_size: number;
+  // download_url is piped from the source on every fetch: no seeking, no preloading
+  streamed?: boolean;
   vocals_url?: string;
   vocals_filename?: string;
   instrumental_url?: string;
@@ -81,6 +83,14 @@ export type TaskResult =
   | SlideshowResult
   | AudioResult;
 
+// Byte-level download progress reported by the backend
+export interface TransferProgress {
+  downloaded_bytes: number;
+  total_bytes?: number | null;
+  speed?: number | null;
+  eta?: number | null;
+}
+
 // Task record from Supabase
 export interface Task {
   id: string;
@@ -88,6 +98,9 @@ export interface Task {
   type: TaskType;
   status: TaskStatus;
   progress: number;
+  stage?: string;
+  transfer?: TransferProgress | null;
+  partial_markdown?: string | null; // summary text streamed so far
   input_url: string;
   result: TaskResult | null;
   error_message: string | null;
@@ -99,6 +112,8 @@ export interface Task {
 export interface CreateTaskResponse {
   task_id: string;
   message: string;
+  queue_position: number;
+  estimated_wait_seconds: number | null;
 }
 
 export interface ApiError {
@@ -111,6 +126,9 @@ export interface UseTaskStatusReturn {
   task: Task | null;
   status: TaskStatus | null;
   progress: number;
+  stage: string | null;
+  transfer: TransferProgress | null;
+  partialMarkdown: string | null;
   result: TaskResult | null;
   error: string | null;
   isLoading: boolean;